@@ -6,6 +6,7 @@ from datetime import datetime, timedelta
 import logging
 import time
 import threading
+from collections import deque
 from typing import Dict, List
 import sys
 import os
@@ -15,11 +16,12 @@ if sys.platform == "win32":
     os.environ['PYTHONIOENCODING'] = 'utf-8'
 
 # Importar módulos locales
-from utils.config import ConfigManager
 from utils.excel_manager import ExcelManager
-from scraper.idealista import IdealistaScraper
-from scraper.fotocasa import FotocasaScraper
-from scraper.habitaclia import HabitacliaScraper
+from utils.checkpoint import list_checkpoints, search_key
+from utils.crawl_worker import CrawlWorker
+from utils.progress_log import ProgressLog
+from utils.crawl_runner import (create_managers, create_scheduler, build_search_jobs, build_portal_params,
+                                run_crawl, run_scheduled, start_metrics)
 
 # Configuración de la página
 st.set_page_config(
@@ -43,16 +45,21 @@ logging.basicConfig(
 @st.cache_resource
 def initialize_managers():
     """Inicializar managers y scrapers"""
-    config_manager = ConfigManager()
-    excel_manager = ExcelManager()
-    
-    scrapers = {
-        'Idealista': IdealistaScraper(),
-        'Fotocasa': FotocasaScraper(),
-        'Habitaclia': HabitacliaScraper()
-    }
-    
-    return config_manager, excel_manager, scrapers
+    return create_managers()
+
+# Trabajador de rastreo compartido por todas las sesiones (sobrevive a recargas de la página)
+@st.cache_resource
+def get_crawl_worker():
+    """Obtener el trabajador de rastreo en segundo plano (y exportar sus métricas si están activadas)"""
+    worker = CrawlWorker()
+    config_manager, _, _ = initialize_managers()
+    start_metrics(config_manager, worker)
+    return worker
+
+# Segundos entre sondeos del progreso mientras hay un rastreo en marcha
+POLL_INTERVAL = 2
+# Líneas de actividad que conserva cada sesión (se leen solo los eventos nuevos del trabajador)
+LOG_LINES = 50
 
 # Cargar datos con cache
 @st.cache_data(ttl=300)  # Cache por 5 minutos
@@ -67,9 +74,9 @@ def initialize_session_state():
     if 'first_run' not in st.session_state:
         st.session_state.first_run = True
         st.session_state.busqueda_activa = False
-        st.session_state.stop_search = False  # Nueva variable para controlar la interrupción
         st.session_state.resultados = pd.DataFrame()
-        st.session_state.log_messages = []
+        st.session_state.log_messages = deque(maxlen=LOG_LINES)
+        st.session_state.log_seq = 0  # Último evento de progreso ya leído
         st.session_state.progress = 0
         st.session_state.stats = {}
         st.session_state.current_portal = ""  # Portal actual
@@ -190,6 +197,13 @@ def render_sidebar():
         )
     
     # Opciones avanzadas
+    two_phase = st.sidebar.checkbox(
+        "🗺️ Rastreo en dos fases",
+        value=False,
+        help="Recorre primero todas las páginas de resultados y después revisa las fichas: "
+             "nuevas, con cambio de precio y sin revisar recientemente. Se reanuda si se interrumpe."
+    )
+    
     # Botones de acción
     st.sidebar.markdown("---")
     
@@ -198,12 +212,39 @@ def render_sidebar():
     operation = "Venta"  # Solo inmuebles en venta
     
     # Botón principal de búsqueda
+    reanudar_button = False
+    programado_button = False
     if not st.session_state.busqueda_activa:
         buscar_button = st.sidebar.button(
             "🔍 Iniciar Búsqueda",
             type="primary",
             width="stretch"
         )
+        
+        # Reanudar la búsqueda configurada desde su último checkpoint (si se interrumpió)
+        current_params = build_portal_params({
+            'location': location, 'min_price': min_price, 'max_price': max_price,
+            'min_rooms': rooms_range[0], 'max_rooms': rooms_range[1], 'min_surface': min_surface,
+            'max_pages': max_pages, 'operation': operation.lower(), 'two_phase': two_phase
+        })
+        current_keys = {search_key(portal, current_params) for portal, active in portales_activos.items() if active}
+        pending_checkpoints = [c for c in list_checkpoints() if c['key'] in current_keys]
+        if pending_checkpoints:
+            reanudar_button = st.sidebar.button(
+                "▶️ Reanudar",
+                width="stretch",
+                help="Continúa esta búsqueda donde se interrumpió: " + ", ".join(
+                    f"{c['portal']} ({c['search_params'].get('location', '')}, página {c['page']}, "
+                    f"{c['results']} particulares)" for c in pending_checkpoints
+                )
+            )
+        
+        # Pasada del calendario de zonas (scheduler_settings) dentro de su presupuesto de tiempo
+        programado_button = st.sidebar.button(
+            "🗓️ Rastreo Programado",
+            width="stretch",
+            help="Rastrea las zonas del calendario que más tiempo llevan sin revisarse o que más particulares nuevos aportan"
+        )
     else:
         buscar_button = False
         # Botón de parar búsqueda cuando está activa
@@ -213,7 +254,7 @@ def render_sidebar():
             width="stretch",
             help="Detiene la búsqueda y guarda los inmuebles encontrados hasta el momento"
         ):
-            st.session_state.stop_search = True
+            get_crawl_worker().cancel()
             st.sidebar.warning("🛑 Deteniendo búsqueda... Se guardarán los resultados encontrados hasta ahora.")
     
     # Botones secundarios
@@ -236,7 +277,10 @@ def render_sidebar():
         'portales_activos': portales_activos,
         'max_pages': max_pages,
         'operation': operation.lower(),  # Siempre será "venta"
-        'buscar': buscar_button
+        'two_phase': two_phase,
+        'buscar': buscar_button,
+        'reanudar': reanudar_button,
+        'programado': programado_button
     }
 
 def save_configuration(config_data):
@@ -256,111 +300,112 @@ def load_configuration():
     except Exception as e:
         st.sidebar.error(f"Error cargando configuración: {e}")
 
-def execute_search(search_params):
-    """Ejecutar búsqueda con progreso indefinido simple"""
-    _, excel_manager, scrapers = initialize_managers()
+def execute_search(search_params, resume=False):
+    """Lanzar la búsqueda en el trabajador en segundo plano (no bloquea la interfaz)"""
+    config_manager, excel_manager, scrapers = initialize_managers()
+    worker = get_crawl_worker()
     
-    # Inicializar estado de búsqueda
-    st.session_state.log_messages = []
+    # Reiniciar el estado visible de la búsqueda
     st.session_state.progress = 0
     st.session_state.current_portal = ""
     st.session_state.current_page = 0
     st.session_state.listings_found = 0
+    st.session_state.stats = {}
     
-    all_results = []
-    total_portales = sum(1 for activo in search_params['portales_activos'].values() if activo)
-    
-    # Mostrar mensaje simple de progreso
-    st.write("## � Búsqueda en Progreso")
-    st.info("🚀 Procesando búsqueda en todos los portales seleccionados...")
+    jobs = build_search_jobs(search_params, scrapers, resume)
     
-    # Barra de progreso indefinida
-    progress_bar = st.progress(0, text="Trabajando...")
+    # Micro-lotes: volcar al Excel cada N particulares o cada pocos segundos
+    file_settings = config_manager.get_file_settings()
+    return worker.start(run_crawl, jobs, scrapers, excel_manager,
+                        batch_size=file_settings.get('stream_batch_size', 5),
+                        flush_interval=file_settings.get('stream_flush_seconds', 10))
+
+def execute_scheduled():
+    """Lanzar una pasada del calendario de zonas en el trabajador en segundo plano"""
+    config_manager, excel_manager, scrapers = initialize_managers()
+    settings = config_manager.get_scheduler_settings()
+    
+    st.session_state.stats = {}
+    
+    file_settings = config_manager.get_file_settings()
+    return get_crawl_worker().start(run_scheduled, create_scheduler(config_manager), scrapers, excel_manager,
+                                    {'operation': 'venta', **settings.get('search_params', {})},
+                                    settings.get('budget_minutes', 60),
+                                    batch_size=file_settings.get('stream_batch_size', 5),
+                                    flush_interval=file_settings.get('stream_flush_seconds', 10))
+
+def sync_crawl_state(worker, snapshot):
+    """Copiar el estado del trabajador en la sesión y refrescar resultados si hay datos nuevos"""
+    st.session_state.busqueda_activa = snapshot['status'] in ('running', 'cancelling')
+    if snapshot['status'] == 'idle':
+        return
     
-    for portal_name, scraper in scrapers.items():
-        # Verificar si se solicitó parar la búsqueda
-        if st.session_state.stop_search:
-            break
-            
-        if not search_params['portales_activos'].get(portal_name.lower(), False):
-            continue
-        
-        # Actualizar mensaje de progreso
-        progress_bar.progress(50, text=f"Procesando {portal_name}...")
-        
-        try:
-            # Construir parámetros específicos del portal
-            portal_params = {
-                'location': search_params['location'],
-                'min_price': search_params['min_price'],
-                'max_price': search_params['max_price'],
-                'min_rooms': search_params['min_rooms'],
-                'max_rooms': search_params['max_rooms'],
-                'min_surface': search_params['min_surface'],
-                'max_pages': search_params['max_pages'],
-                'operation': search_params['operation']
-            }
-            
-            # Ejecutar búsqueda
-            results = scraper.search_listings(portal_params)
-            
-            # Verificar si se solicitó parar durante la búsqueda del portal
-            if st.session_state.stop_search:
-                if results:
-                    particulares = [r for r in results if r]
-                    all_results.extend(particulares)
-                break
-            
-            # Filtrar solo particulares
-            particulares = [r for r in results if r]
-            all_results.extend(particulares)
-            
-        except Exception as e:
-            # Solo log interno, no mostrar al usuario
-            pass
-    
-    # Actualizar progreso a guardado
-    progress_bar.progress(75, text="Guardando resultados...")
-    
-    # Guardar resultados (incluso si fueron interrumpidos)
-    if all_results:
-        try:
-            stats = excel_manager.add_listings(all_results)
-            st.session_state.stats = stats
-            st.session_state.resultados = excel_manager.load_data()
-        except Exception as e:
-            # Error silencioso
-            pass
-    
-    # Finalizar
-    progress_bar.progress(100, text="Completado")
-    
-    # Limpiar flags
-    st.session_state.busqueda_activa = False
-    st.session_state.stop_search = False
-    
-    # Limpiar progreso y mostrar resultado
-    progress_bar.empty()
-    
-    # Mensaje final simple
-    if st.session_state.stop_search:
-        st.warning("🛑 Proceso detenido por el usuario.")
+    st.session_state.current_portal = snapshot['portal']
+    st.session_state.current_page = snapshot['page']
+    st.session_state.listings_found = snapshot['found']
+    
+    # Solo los eventos de progreso posteriores al último leído por esta sesión
+    if st.session_state.get('log_job') != snapshot['job_id']:
+        st.session_state.log_job = snapshot['job_id']
+        st.session_state.log_messages = deque(maxlen=LOG_LINES)
+        st.session_state.log_seq = 0
+    for event in worker.progress.since(st.session_state.log_seq, limit=LOG_LINES):
+        st.session_state.log_messages.append(ProgressLog.format(event))
+        st.session_state.log_seq = event['seq']
+    if snapshot['totals']:
+        st.session_state.stats = snapshot['totals']
+    
+    # Nuevo micro-lote guardado por el rastreo: recargar los resultados
+    persisted = (snapshot['job_id'], snapshot['persisted'])
+    if st.session_state.get('last_persisted') != persisted:
+        st.session_state.last_persisted = persisted
+        if snapshot['persisted']:
+            load_data.clear()
+            st.session_state.resultados = load_data()
+
+def render_crawl_progress(snapshot):
+    """Progreso del rastreo en segundo plano (se refresca por sondeo)"""
+    st.write("## 🔄 Búsqueda en Progreso")
+    
+    if snapshot['status'] == 'cancelling':
+        st.warning("🛑 Deteniendo búsqueda... Se guardarán los resultados encontrados hasta ahora.")
+    elif snapshot['portal']:
+        st.info(f"🚀 Procesando {snapshot['portal']} - página {snapshot['page'] or 1}")
     else:
-        st.success("✅ Proceso finalizado exitosamente.")
+        st.info("🚀 Procesando búsqueda en todos los portales seleccionados...")
     
-    if all_results and hasattr(st.session_state, 'stats'):
-        st.info(f"� Resultados: {st.session_state.stats.get('nuevos', 0)} nuevos inmuebles encontrados.")
+    totals = snapshot['totals']
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("🏠 Particulares encontrados", snapshot['found'])
+    with col2:
+        st.metric("✨ Nuevos guardados", totals.get('nuevos', 0))
+    with col3:
+        st.metric("🔄 Actualizados", totals.get('actualizados', 0))
+    
+    if st.session_state.log_messages:
+        with st.expander("📋 Actividad reciente", expanded=False):
+            st.text("\n".join(list(st.session_state.log_messages)[-15:]))
 
-def render_search_tab():
+def render_search_tab(snapshot):
     """Renderizar tab de búsqueda simplificado"""
     st.header("🔍 Búsqueda de Viviendas")
     
     # Mostrar estado de búsqueda si está activa
     if st.session_state.busqueda_activa:
         st.warning("🟡 Búsqueda en progreso... Usa el botón 'Parar Búsqueda' en el panel lateral para detener.")
-        st.info("⏳ Por favor, espera mientras procesamos tu búsqueda...")
+        render_crawl_progress(snapshot)
     
     else:
+        # Resultado del último rastreo en segundo plano
+        if snapshot['status'] == 'cancelled':
+            st.warning("🛑 Proceso detenido por el usuario.")
+        elif snapshot['status'] == 'failed':
+            st.error("❌ La búsqueda terminó con errores. Puedes reanudarla desde el panel lateral.")
+        elif snapshot['status'] == 'finished':
+            st.success("✅ Proceso finalizado exitosamente.")
+        
+
         # Panel cuando no hay búsqueda activa
         st.subheader("💡 Panel de Control")
         
@@ -644,32 +689,42 @@ def main():
         show_welcome_message()
         st.session_state.first_run = False
     
+    # Estado del rastreo en segundo plano (compartido entre sesiones y recargas)
+    worker = get_crawl_worker()
+    sync_crawl_state(worker, worker.poll())
+    
     # Renderizar sidebar y obtener parámetros
     search_params = render_sidebar()
     
     # Crear tabs principales
     tab1, tab2, tab3 = st.tabs(["🔍 Búsqueda", "📊 Resultados", "📈 Estadísticas"])
     
-    # Manejar inicio de búsqueda sin threading
-    if search_params['buscar'] and not st.session_state.busqueda_activa:
-        st.session_state.busqueda_activa = True
-        st.session_state.stop_search = False
-        
-        # Ejecutar búsqueda directamente con interfaz en tiempo real
-        execute_search(search_params)
-        
-        # Forzar actualización para mostrar resultados
+    # Lanzar la búsqueda (o reanudación) en el trabajador; la interfaz sigue respondiendo
+    if (search_params['buscar'] or search_params['reanudar']) and not st.session_state.busqueda_activa:
+        execute_search(search_params, resume=search_params['reanudar'])
+        st.rerun()
+    
+    if search_params['programado'] and not st.session_state.busqueda_activa:
+        execute_scheduled()
         st.rerun()
     
+    snapshot = worker.poll()
+    sync_crawl_state(worker, snapshot)
+    
     # Renderizar contenido de tabs
     with tab1:
-        render_search_tab()
+        render_search_tab(snapshot)
     
     with tab2:
         render_results_tab()
     
     with tab3:
         render_statistics_tab()
+    
+    # Sondeo barato del progreso mientras el rastreo siga en marcha
+    if st.session_state.busqueda_activa:
+        time.sleep(POLL_INTERVAL)
+        st.rerun()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,4 @@
+"""
+Captador de viviendas de particulares - punto de entrada sin Streamlit
+Uso: python -m inmocapt crawl --location barcelona/anoia --portals idealista,fotocasa
+"""
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+CLI para rastreos programados (cron, tareas nocturnas) sin Streamlit ni plotly
+Reutiliza los scrapers, los checkpoints y el ExcelManager de la app y termina
+imprimiendo en stdout un resumen JSON (nuevos, actualizados, duplicados y tiempos).
+Ejecutar desde la raíz del proyecto para que se encuentren config/ y data/.
+
+    python -m inmocapt crawl --location barcelona/anoia --portals idealista,fotocasa
+    python -m inmocapt batch --locations provincia:barcelona --price-bands 100000-250000,250000-400000
+    python -m inmocapt schedule --budget-minutes 45
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+
+PORTALS = ('idealista', 'fotocasa', 'habitaclia')
+
+# Códigos de salida según el estado final del rastreo
+EXIT_CODES = {'finished': 0, 'failed': 1, 'cancelled': 130}
+
+
+def setup_logging(verbose: bool = False):
+    """Logs a stderr (stdout queda libre para el resumen JSON) y al log de la app"""
+    handlers = [logging.StreamHandler(sys.stderr)]
+    if os.path.isdir('logs'):
+        handlers.append(logging.FileHandler(os.path.join('logs', 'captador.log'), encoding='utf-8', errors='replace'))
+    logging.basicConfig(
+        level=logging.DEBUG if verbose else logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=handlers
+    )
+
+
+def parse_portals(value: str) -> list:
+    portals = [p.strip().lower() for p in value.split(',') if p.strip()]
+    unknown = [p for p in portals if p not in PORTALS]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"Portal desconocido: {', '.join(unknown)} (válidos: {', '.join(PORTALS)})")
+    return portals
+
+
+def parse_price_bands(value: str) -> list:
+    """'100000-200000,200000-350000' -> [(100000, 200000), (200000, 350000)]"""
+    bands = []
+    for band in value.split(','):
+        try:
+            min_price, max_price = (int(part) for part in band.strip().split('-'))
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"Franja de precio no válida: '{band}' (formato MIN-MAX)")
+        bands.append((min_price, max_price))
+    return bands
+
+
+def add_filter_arguments(parser: argparse.ArgumentParser):
+    """Filtros comunes a 'crawl' y 'batch'"""
+    parser.add_argument('--portals', type=parse_portals, default=list(PORTALS),
+                        help='Portales separados por comas (por defecto: todos)')
+    parser.add_argument('--min-rooms', type=int, default=1)
+    parser.add_argument('--max-rooms', type=int, default=4)
+    parser.add_argument('--min-surface', type=int, default=50)
+    parser.add_argument('--max-pages', type=int, default=999, help='Páginas de resultados por portal')
+    parser.add_argument('--two-phase', action='store_true', help='Rastreo en dos fases con frontera priorizada')
+    parser.add_argument('--resume', action='store_true',
+                        help='Continuar la misma búsqueda desde su último checkpoint (sin checkpoint empieza de cero)')
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='inmocapt', description='Captador de viviendas de particulares')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Logs de depuración')
+    parser.add_argument('--metrics-file', help='Fichero .prom con las métricas de Prometheus (textfile collector)')
+    parser.add_argument('--metrics-port', type=int, help='Servir las métricas en http://127.0.0.1:<puerto>/metrics')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    crawl = subparsers.add_parser('crawl', help='Rastrear los portales y guardar los particulares en el Excel')
+    crawl.add_argument('--location', required=True, help='Ciudad o comarca (p. ej. madrid-madrid, barcelona/anoia)')
+    crawl.add_argument('--min-price', type=int, default=100000)
+    crawl.add_argument('--max-price', type=int, default=500000)
+    add_filter_arguments(crawl)
+    crawl.set_defaults(handler=cmd_crawl)
+
+    batch = subparsers.add_parser('batch', help='Rastrear varias ubicaciones y franjas de precio sin repetir fichas')
+    batch.add_argument('--locations', type=lambda v: [l for l in v.split(',') if l.strip()],
+                       help="Ubicaciones separadas por comas; admite 'all' y 'provincia:<nombre>' "
+                            "(por defecto: batch_settings.locations)")
+    batch.add_argument('--price-bands', type=parse_price_bands,
+                       help='Franjas MIN-MAX separadas por comas (por defecto: batch_settings.price_bands)')
+    add_filter_arguments(batch)
+    batch.set_defaults(handler=cmd_batch)
+
+    schedule = subparsers.add_parser('schedule', help='Rastrear las zonas del calendario que tocan, dentro de un presupuesto')
+    schedule.add_argument('--budget-minutes', type=float,
+                          help='Minutos de rastreo de esta pasada (por defecto: scheduler_settings.budget_minutes)')
+    schedule.add_argument('--plan', action='store_true', help='Mostrar el plan y el estado de las zonas sin rastrear')
+    schedule.set_defaults(handler=cmd_schedule)
+    return parser
+
+
+def base_params(args) -> dict:
+    """Parámetros de búsqueda comunes a partir de los filtros de la línea de comandos"""
+    return {
+        'min_rooms': args.min_rooms,
+        'max_rooms': args.max_rooms,
+        'min_surface': args.min_surface,
+        'max_pages': args.max_pages,
+        'operation': 'venta',
+        'two_phase': args.two_phase,
+    }
+
+
+def run_jobs(config_manager, excel_manager, scrapers, jobs, summary: dict, target=None, args=None) -> int:
+    """
+    Ejecutar los trabajos en primer plano (Ctrl+C detiene guardando lo encontrado) e imprimir el resumen
+
+    Args:
+        target: Rastreo alternativo target(worker, batch_size=..., flush_interval=...) en lugar de run_crawl(jobs)
+        args: Argumentos de la línea de comandos (--metrics-file/--metrics-port)
+    """
+    from utils.crawl_worker import CrawlWorker
+    from utils.crawl_runner import run_crawl, start_metrics
+    from utils.metrics import metrics
+
+    logger = logging.getLogger('inmocapt')
+    started = time.time()
+
+    file_settings = config_manager.get_file_settings()
+    stream = {'batch_size': file_settings.get('stream_batch_size', 5),
+              'flush_interval': file_settings.get('stream_flush_seconds', 10)}
+    worker = CrawlWorker()
+    start_metrics(config_manager, worker, getattr(args, 'metrics_file', None), getattr(args, 'metrics_port', None))
+    if target:
+        worker.start(target, **stream)
+    else:
+        worker.start(run_crawl, jobs, scrapers, excel_manager, **stream)
+
+    try:
+        while not worker.join(timeout=1.0):
+            pass
+    except KeyboardInterrupt:
+        logger.warning("🛑 Interrupción recibida: deteniendo el rastreo y guardando lo encontrado...")
+        worker.cancel()
+        worker.join()
+    finally:
+        for scraper in scrapers.values():
+            if hasattr(scraper, 'close_session'):
+                try:
+                    scraper.close_session()
+                except Exception as e:
+                    logger.debug(f"Error cerrando {scraper.name}: {e}")
+        # Dejar el fichero de métricas con los valores finales
+        metrics.stop()
+
+    snapshot = worker.poll()
+    totals = snapshot['totals']
+    summary = {
+        'status': snapshot['status'],
+        **summary,
+        'nuevos': totals.get('nuevos', 0),
+        'actualizados': totals.get('actualizados', 0),
+        'duplicados': totals.get('duplicados', 0),
+        'particulares': snapshot['found'],
+        'timings': snapshot['timings'],
+        'stage_report': snapshot['stage_report'],
+        'elapsed_seconds': round(time.time() - started, 1),
+        'error': snapshot['error'],
+    }
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+    return EXIT_CODES.get(snapshot['status'], 1)
+
+
+def cmd_crawl(args) -> int:
+    """Rastrear una ubicación en los portales indicados"""
+    # Importaciones aquí para que --help responda sin cargar scrapers ni Selenium
+    from utils.crawl_runner import create_managers, build_search_jobs
+
+    config_manager, excel_manager, scrapers = create_managers()
+    search_params = {
+        **base_params(args),
+        'location': args.location,
+        'min_price': args.min_price,
+        'max_price': args.max_price,
+        'portales_activos': {portal: portal in args.portals for portal in PORTALS},
+    }
+    jobs = build_search_jobs(search_params, scrapers, resume=args.resume)
+
+    return run_jobs(config_manager, excel_manager, scrapers, jobs, {
+        'location': args.location,
+        'portals': [job[0] for job in jobs],
+    }, args=args)
+
+
+def cmd_batch(args) -> int:
+    """Rastrear ubicaciones x franjas de precio con deduplicación global de fichas"""
+    from utils.crawl_runner import create_managers, build_batch_jobs
+
+    config_manager, excel_manager, scrapers = create_managers()
+    batch_settings = config_manager.get_batch_settings()
+    locations = args.locations or batch_settings.get('locations', [])
+    price_bands = args.price_bands or [tuple(band) for band in batch_settings.get('price_bands', [])]
+    if not locations or not price_bands:
+        logging.getLogger('inmocapt').error("❌ Indica --locations/--price-bands o configura batch_settings")
+        return 2
+
+    jobs = build_batch_jobs(locations, price_bands, base_params(args), args.portals, scrapers, resume=args.resume)
+    return run_jobs(config_manager, excel_manager, scrapers, jobs, {
+        'locations': sorted({job[1]['location'] for job in jobs}),
+        'price_bands': [list(band) for band in price_bands],
+        'searches': len(jobs),
+    }, args=args)
+
+
+def cmd_schedule(args) -> int:
+    """Pasada del calendario: zonas más atrasadas o productivas dentro del presupuesto de minutos"""
+    from utils.crawl_runner import create_managers, create_scheduler, run_scheduled
+
+    config_manager, excel_manager, scrapers = create_managers()
+    settings = config_manager.get_scheduler_settings()
+    budget = args.budget_minutes or settings.get('budget_minutes', 60)
+    scheduler = create_scheduler(config_manager)
+
+    if args.plan:
+        print(json.dumps({
+            'budget_minutes': budget,
+            'plan': [f"{entry['portal']}:{entry['location']}" for entry in scheduler.plan(budget)],
+            'zones': scheduler.get_stats(),
+        }, ensure_ascii=False, indent=2))
+        return 0
+
+    base = {'operation': 'venta', **settings.get('search_params', {})}
+    return run_jobs(config_manager, excel_manager, scrapers, None, {'budget_minutes': budget},
+                    target=lambda worker, **kwargs: run_scheduled(worker, scheduler, scrapers, excel_manager,
+                                                                 base, budget, **kwargs),
+                    args=args)
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    setup_logging(args.verbose)
+    return args.handler(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
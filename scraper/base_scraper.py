@@ -4,24 +4,33 @@ import requests
 import logging
 from abc import ABC, abstractmethod
 from bs4 import BeautifulSoup
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, Optional
 from utils.antibot import antibot_manager
-
-try:
-    import streamlit as st
-    STREAMLIT_AVAILABLE = True
-except ImportError:
-    st = None
-    STREAMLIT_AVAILABLE = False
+from utils.embedded_state import embedded_state_extractor
+from utils.browser_handoff import browser_handoff
+from utils.circuit_breaker import circuit_breakers
+from utils.http_pool import connection_layer
+from utils.page_prefetch import ResultPagePrefetcher
+from utils.frontier import UrlFrontier, TwoPhaseCrawler
+from utils.checkpoint import CrawlCheckpoint
+from utils.crawl_context import CrawlContext
+from utils.instrumentation import instrumentation
+from utils.metrics import metrics
 
 
 class BaseScraper(ABC):
     """Clase base abstracta para todos los scrapers de portales inmobiliarios"""
     
+    # Técnicas ante un 403, cada una con su circuit breaker por portal
+    BLOCK_TECHNIQUES = ('retry_new_ua', 'homepage_referer', 'selenium')
+    # Técnicas de bloqueo que reintentan por HTTP (inútiles mientras el portal está en pausa)
+    HTTP_BLOCK_TECHNIQUES = ('retry_new_ua', 'homepage_referer')
+    
     def __init__(self, name: str, delay: float = 2.0):
         self.name = name
         self.delay = delay
-        self.session = requests.Session()
+        # Sesión HTTP compartida por todos los scrapers (pool de conexiones común)
+        self.session = antibot_manager.create_session()
         self.logger = logging.getLogger(f'{__name__}.{self.name}')
         
         # Headers comunes para simular navegador real
@@ -33,25 +42,61 @@ class BaseScraper(ABC):
             'Connection': 'keep-alive',
             'Upgrade-Insecure-Requests': '1',
         }
-        self.session.headers.update(self.headers)
+        
+        # Ruta rápida de estado JSON embebido (activada por cada portal que la soporte)
+        self.use_embedded_state = False
+        # Si no hay JSON, reutilizar el HTML ya descargado en lugar de volver a pedir la página
+        self.embedded_state_reuse_html = False
+        self.embedded_state_stats = {'hits': 0, 'misses': 0}
+        
+        # Páginas de resultados descargadas por adelantado mientras se procesan las fichas (0 = desactivado)
+        self.prefetch_pages = 1
+        
+        # Contexto del rastreo en curso (cancelación, progreso y log); se fija en cada búsqueda
+        self.context = CrawlContext()
     
     def _update_current_page(self, page: int):
-        """Actualizar la página actual en el session state"""
-        if STREAMLIT_AVAILABLE and st and hasattr(st.session_state, 'current_page'):
-            st.session_state.current_page = page
-            # También añadir log de progreso de página
-            if hasattr(st.session_state, 'log_messages'):
-                st.session_state.log_messages.append(f"📄 {self.name} - Procesando página {page}")
+        """Notificar la página de resultados en curso"""
+        self.context.progress(self.name, page)
+    
+    def _add_log_message(self, message: str, **fields):
+        """Añadir mensaje al log de progreso del rastreo (fields: portal, page, url)"""
+        self.context.log(message, **fields)
+    
+    def _is_end_of_results(self, soup: BeautifulSoup, url: str) -> bool:
+        """Detectar que la página solicitada ya no tiene resultados propios (sobrescribir por portal)"""
+        return False
     
-    def _add_log_message(self, message: str):
-        """Añadir mensaje al log si Streamlit está disponible"""
-        if STREAMLIT_AVAILABLE and st and hasattr(st.session_state, 'log_messages'):
-            st.session_state.log_messages.append(message)
+    def _is_last_results_page(self, soup: BeautifulSoup, url: str) -> bool:
+        """Página que termina la búsqueda: fin de resultados o sin enlaces de listados"""
+        return self._is_end_of_results(soup, url) or not self._extract_listing_links(soup)
+    
+    def _prefetch_fetch(self, url: str) -> Optional[BeautifulSoup]:
+        """Descargar una página de resultados desde el hilo de precarga (solo HTTP, sin escalar a Selenium)"""
+        response = browser_handoff.get(url) or antibot_manager.make_request(url)
+        if response is not None and response.status_code == 200:
+            return BeautifulSoup(response.content, 'html.parser')
+        return None
+    
+    def _create_page_prefetcher(self, search_params: Dict) -> ResultPagePrefetcher:
+        """Lookahead de páginas de resultados para una búsqueda"""
+        return ResultPagePrefetcher(
+            self._prefetch_fetch,
+            lambda page: self.build_search_url({**search_params, 'page': page}),
+            self._is_last_results_page,
+            depth=self.prefetch_pages,
+            logger=self.logger
+        )
     
     def _make_request(self, url: str, retries: int = 3) -> Optional[BeautifulSoup]:
         """Realizar petición HTTP con técnicas anti-bot avanzadas"""
         self.logger.info(f"Realizando petición con anti-bot a: {url}")
         
+        # Clearance traspasada desde Selenium: petición HTTP con sus cookies y User-Agent
+        response = browser_handoff.get(url)
+        if response is not None:
+            return BeautifulSoup(response.content, 'html.parser')
+        
         # Usar el sistema anti-bot
         response = antibot_manager.make_request(url)
         
@@ -65,6 +110,10 @@ class BaseScraper(ABC):
             if response.status_code == 403:
                 self.logger.info("🛡️ Detectado bloqueo 403, aplicando técnicas avanzadas...")
                 return self._handle_403_block(url)
+        elif circuit_breakers.paused_for(url, antibot_manager.HTTP_TECHNIQUES) > 0:
+            # Técnicas HTTP en pausa para este portal: pasar directamente a la escalera de bloqueo
+            self.logger.info("🔌 Técnicas HTTP en pausa, aplicando técnicas avanzadas...")
+            return self._handle_403_block(url)
         else:
             self.logger.error(f"❌ No se pudo obtener respuesta de: {url}")
             
@@ -72,8 +121,31 @@ class BaseScraper(ABC):
     
     def _handle_403_block(self, url: str) -> Optional[BeautifulSoup]:
         """Manejar específicamente bloqueos 403 con técnicas adicionales"""
+        techniques = {
+            'retry_new_ua': self._retry_with_new_user_agent,
+            'homepage_referer': self._retry_from_homepage,
+            'selenium': self._try_selenium_fallback,
+        }
         
-        # Técnica 1: Delay más largo y nuevo User-Agent
+        # Empezar por la técnica que funcionó la última vez y omitir las de circuito abierto
+        # Con las técnicas HTTP en pausa, make_request devolvería None tras la espera de cada técnica
+        candidates = self.BLOCK_TECHNIQUES
+        if circuit_breakers.paused_for(url, antibot_manager.HTTP_TECHNIQUES) > 0:
+            self.logger.debug("🔌 Técnicas HTTP en pausa: solo se prueba Selenium")
+            candidates = tuple(t for t in candidates if t not in self.HTTP_BLOCK_TECHNIQUES)
+        
+        for technique in circuit_breakers.plan(url, candidates):
+            if not circuit_breakers.allow(url, technique):
+                continue
+            soup = techniques[technique](url)
+            circuit_breakers.record(url, technique, soup is not None)
+            if soup is not None:
+                return soup
+        
+        return None
+    
+    def _retry_with_new_user_agent(self, url: str) -> Optional[BeautifulSoup]:
+        """Técnica 1: Delay más largo y nuevo User-Agent"""
         self.logger.info("Técnica 1: Delay extendido + nuevo User-Agent")
         time.sleep(random.uniform(5, 10))
         
@@ -86,8 +158,10 @@ class BaseScraper(ABC):
         
         if response and response.status_code == 200:
             return BeautifulSoup(response.content, 'html.parser')
-        
-        # Técnica 2: Simular navegación desde la página principal
+        return None
+    
+    def _retry_from_homepage(self, url: str) -> Optional[BeautifulSoup]:
+        """Técnica 2: Simular navegación desde la página principal"""
         self.logger.info("Técnica 2: Navegación desde página principal")
         base_domain = '/'.join(url.split('/')[:3])
         
@@ -102,13 +176,11 @@ class BaseScraper(ABC):
         
         if response and response.status_code == 200:
             return BeautifulSoup(response.content, 'html.parser')
-        
-        # Técnica 3: SELENIUM FALLBACK para casos extremos
-        self.logger.info("🤖 Técnica 3: Selenium Stealth Fallback")
-        return self._try_selenium_fallback(url)
+        return None
     
     def _try_selenium_fallback(self, url: str) -> Optional[BeautifulSoup]:
-        """Usar Selenium como último recurso para casos extremos"""
+        """Técnica 3: usar Selenium como último recurso para casos extremos"""
+        self.logger.info("🤖 Técnica 3: Selenium Stealth Fallback")
         try:
             from utils.selenium_stealth import selenium_stealth
             
@@ -119,6 +191,8 @@ class BaseScraper(ABC):
             
             if soup:
                 self.logger.info("✅ Selenium Stealth exitoso - página obtenida")
+                # Las siguientes páginas del portal irán por HTTP con esta clearance
+                browser_handoff.transplant(url)
                 return soup
             else:
                 self.logger.error("❌ Selenium Stealth falló")
@@ -132,6 +206,54 @@ class BaseScraper(ABC):
             self.logger.error(f"❌ Error con Selenium: {str(e)}")
             return None
     
+    def _scrape_embedded_state(self, url: str):
+        """
+        Intentar extraer el anuncio desde el estado JSON embebido (sin navegador ni soup completo)
+        
+        Returns:
+            Tupla (data, html):
+            - data: dict con los datos del anuncio, {} si el anuncio no es de particular,
+              o None si no hay estado embebido utilizable (se debe usar la ruta normal)
+            - html: HTML crudo descargado (o None si la petición falló)
+        """
+        response = browser_handoff.get(url) or antibot_manager.make_request(url)
+        if not response or response.status_code != 200:
+            return None, None
+        
+        html = response.text
+        state = embedded_state_extractor.extract(html)
+        
+        data = self._map_embedded_state(state, html) if state else None
+        if not data or (not data.get('titulo') and not data.get('precio')):
+            self.embedded_state_stats['misses'] += 1
+            self.logger.debug(f"Sin estado embebido utilizable, usando ruta normal: {url}")
+            return None, html
+        
+        self.embedded_state_stats['hits'] += 1
+        
+        # Verificar particular con los datos del JSON; si no se puede decidir, usar soup del mismo HTML
+        is_particular = self._is_particular_embedded(state)
+        if is_particular is None:
+            is_particular = self._is_particular(BeautifulSoup(html, 'html.parser'))
+        
+        if not is_particular:
+            self.logger.debug(f"❌ No es particular (estado embebido), saltando: {url}")
+            return {}, html
+        
+        data['url'] = url
+        data['portal'] = self.name
+        data['method'] = 'embedded_state'
+        self.logger.debug(f"⚡ Datos obtenidos de estado embebido: {url}")
+        return data, html
+    
+    def _map_embedded_state(self, state: Dict, html: str) -> Optional[Dict]:
+        """Mapear el estado embebido al formato de _extract_listing_data (implementar en cada portal)"""
+        return None
+    
+    def _is_particular_embedded(self, state: Dict) -> Optional[bool]:
+        """Determinar si es particular a partir del estado embebido (None = no se puede decidir)"""
+        return None
+    
     def _extract_text(self, element, selector: str, default: str = "") -> str:
         """Extraer texto de un elemento usando selector CSS"""
         try:
@@ -171,191 +293,165 @@ class BaseScraper(ABC):
         """Método abstracto para construir URL de búsqueda específica"""
         pass
     
-    def search_listings_realtime(self, search_params: Dict) -> List[Dict]:
-        """Buscar listados con actualizaciones en tiempo real para la interfaz web"""
-        try:
-            # Intentar importar streamlit para actualizaciones en tiempo real
-            import streamlit as st
-            realtime_updates = True
-        except (ImportError, RuntimeError):
-            # Si no está disponible, usar método normal
-            return self.search_listings(search_params)
-        
-        results = []
-        page = 1
+    def search_listings_realtime(self, search_params: Dict, checkpoint: Optional[CrawlCheckpoint] = None,
+                                 context: Optional[CrawlContext] = None) -> List[Dict]:
+        """Compatibilidad: las actualizaciones en tiempo real llegan ahora por el CrawlContext"""
+        return self.search_listings(search_params, checkpoint, context)
+    
+    def search_listings(self, search_params: Dict, checkpoint: Optional[CrawlCheckpoint] = None,
+                        context: Optional[CrawlContext] = None) -> List[Dict]:
+        """Buscar listados basándose en parámetros de búsqueda con capacidad de interrupción"""
+        # Checkpoint de la búsqueda (solo en memoria si no se pidió uno persistente)
+        checkpoint = checkpoint or CrawlCheckpoint(self.name, search_params, persist=False)
+        results = list(checkpoint.results)
+        results.extend(self.iter_listings(search_params, checkpoint, context))
+        return results
+    
+    def iter_listings(self, search_params: Dict, checkpoint: Optional[CrawlCheckpoint] = None,
+                      context: Optional[CrawlContext] = None) -> Iterator[Dict]:
+        """
+        Iterar los anuncios de particulares a medida que se encuentran
+        
+        Cada ficha queda registrada en el checkpoint antes de emitirse, de modo que el
+        consumidor puede persistir en micro-lotes sin esperar al final del portal.
+        """
+        # Checkpoint de la búsqueda (solo en memoria si no se pidió uno persistente)
+        checkpoint = checkpoint or CrawlCheckpoint(self.name, search_params, persist=False)
+        # Contexto de este rastreo (sin contexto: nunca se cancela y el progreso solo va al logger)
+        self.context = context or CrawlContext()
+        page = checkpoint.page
         max_pages = search_params.get('max_pages', 10)
         total_processed = 0
         total_particulares = 0
+        prefetcher = self._create_page_prefetcher(search_params)
         
-        self.logger.info(f"Iniciando búsqueda en tiempo real en {self.name} - Máximo {max_pages} páginas")
+        self.logger.info(f"Iniciando búsqueda en {self.name} - Máximo {max_pages} páginas")
         
-        while page <= max_pages:
-            # Verificar si se solicitó parar la búsqueda
-            if self._should_stop_search():
-                self.logger.info(f"🛑 Búsqueda interrumpida por el usuario en {self.name} (página {page})")
-                break
-            
-            # Actualizar página actual en tiempo real
-            if realtime_updates:
-                st.session_state.current_page = page
-                st.session_state.log_messages.append(f"📄 Procesando página {page} de {self.name}")
-                
-            self.logger.info(f"Procesando página {page} de {self.name}")
-            
-            # Construir URL de la página actual
-            url = self.build_search_url({**search_params, 'page': page})
-            soup = self._make_request(url)
-            
-            if not soup:
-                self.logger.error(f"No se pudo obtener la página {page}")
-                if realtime_updates:
-                    st.session_state.log_messages.append(f"❌ Error cargando página {page}")
-                break
-            
-            # Extraer enlaces de listados de esta página
-            listings = self._extract_listing_links(soup)
-            
-            if not listings:
-                self.logger.info(f"No se encontraron más listados en página {page}")
-                if realtime_updates:
-                    st.session_state.log_messages.append(f"🏁 Fin de resultados en página {page}")
-                break
-            
-            self.logger.info(f"Encontrados {len(listings)} listados en página {page}")
-            if realtime_updates:
-                st.session_state.log_messages.append(f"🔍 Encontrados {len(listings)} anuncios en página {page}")
-            
-            # Procesar cada listado individual
-            page_particulares = 0
-            for i, listing_url in enumerate(listings, 1):
-                # Verificar interrupción antes de procesar cada listado
+        try:
+            while page <= max_pages and not checkpoint.completed:
+                # Verificar si se solicitó parar la búsqueda (token de cancelación del contexto)
                 if self._should_stop_search():
-                    self.logger.info(f"🛑 Búsqueda interrumpida durante procesamiento de listado {i} en página {page}")
-                    return results  # Retornar resultados obtenidos hasta ahora
-                
-                progress_msg = f"Procesando listado {i}/{len(listings)} de página {page}"
-                self.logger.debug(f"{progress_msg}: {listing_url}")
+                    self.logger.info(f"🛑 Búsqueda interrumpida por el usuario en {self.name} (página {page})")
+                    break
                 
-                listing_data = self.scrape_listing(listing_url)
-                if listing_data:
-                    results.append(listing_data)
-                    page_particulares += 1
-                    total_particulares += 1
-                    
-                    # Actualización en tiempo real
-                    if realtime_updates:
-                        st.session_state.listings_found = total_particulares
-                        st.session_state.log_messages.append(f"✅ Particular #{total_particulares}: {listing_data.get('titulo', 'Sin título')[:50]}...")
+                # Actualizar página actual en session state
+                self._update_current_page(page)
                     
-                    self.logger.info(f"✅ Particular encontrado ({total_particulares} total): {listing_data.get('titulo', 'Sin título')}")
-                else:
-                    self.logger.debug(f"❌ Descartado (no particular): {listing_url}")
+                self.logger.info(f"Procesando página {page} de {self.name}")
                 
-                total_processed += 1
-            
-            self.logger.info(f"Página {page} completada: {page_particulares} particulares de {len(listings)} listados")
-            if realtime_updates:
-                st.session_state.log_messages.append(f"📊 Página {page}: {page_particulares} particulares de {len(listings)} anuncios")
-            
-            page += 1
-        
-        if not self._should_stop_search():
-            self.logger.info(f"Búsqueda completada en {self.name}: {total_particulares} particulares de {total_processed} listados procesados")
-            if realtime_updates:
-                st.session_state.log_messages.append(f"🎯 {self.name} completado: {total_particulares} particulares encontrados")
-        else:
-            self.logger.info(f"Búsqueda interrumpida en {self.name}: {total_particulares} particulares de {total_processed} listados procesados hasta la interrupción")
-            if realtime_updates:
-                st.session_state.log_messages.append(f"🛑 {self.name} interrumpido: {total_particulares} particulares guardados")
-        
-        return results
-    
-    def search_listings(self, search_params: Dict) -> List[Dict]:
-        """Buscar listados basándose en parámetros de búsqueda con capacidad de interrupción"""
-        results = []
-        page = 1
-        max_pages = search_params.get('max_pages', 10)
-        total_processed = 0
-        total_particulares = 0
-        
-        self.logger.info(f"Iniciando búsqueda en {self.name} - Máximo {max_pages} páginas")
-        
-        while page <= max_pages:
-            # Verificar si se solicitó parar la búsqueda (desde Streamlit session_state)
-            if self._should_stop_search():
-                self.logger.info(f"🛑 Búsqueda interrumpida por el usuario en {self.name} (página {page})")
-                break
-            
-            # Actualizar página actual en session state
-            self._update_current_page(page)
+                # Construir URL de la página actual
+                url = self.build_search_url({**search_params, 'page': page})
+                soup = prefetcher.get(page) or self._make_request(url)
                 
-            self.logger.info(f"Procesando página {page} de {self.name}")
-            
-            # Construir URL de la página actual
-            url = self.build_search_url({**search_params, 'page': page})
-            soup = self._make_request(url)
-            
-            if not soup:
-                self.logger.error(f"No se pudo obtener la página {page}")
-                break
-            
-            # Extraer enlaces de listados de esta página
-            listings = self._extract_listing_links(soup)
-            
-            if not listings:
-                self.logger.info(f"No se encontraron más listados en página {page}")
-                break
-            
-            self.logger.info(f"Encontrados {len(listings)} listados en página {page}")
-            
-            # Procesar cada listado individual
-            page_particulares = 0
-            for i, listing_url in enumerate(listings, 1):
-                # Verificar interrupción antes de procesar cada listado
-                if self._should_stop_search():
-                    self.logger.info(f"🛑 Búsqueda interrumpida durante procesamiento de listado {i} en página {page}")
-                    return results  # Retornar resultados obtenidos hasta ahora
+                if not soup:
+                    self.logger.error(f"No se pudo obtener la página {page}")
+                    break
+                
+                if self._is_end_of_results(soup, url):
+                    self.logger.info(f"Fin de resultados en página {page}")
+                    checkpoint.complete()
+                    break
                 
-                progress_msg = f"Procesando listado {i}/{len(listings)} de página {page}"
-                self.logger.debug(f"{progress_msg}: {listing_url}")
+                # Extraer enlaces de listados de esta página
+                listings = self._extract_listing_links(soup)
                 
-                # Añadir log cada 5 listados procesados para no saturar
-                if i % 5 == 0:
-                    self._add_log_message(f"📋 {self.name} - Procesando {i}/{len(listings)} listados de página {page}")
+                if not listings:
+                    self.logger.info(f"No se encontraron más listados en página {page}")
+                    checkpoint.complete()
+                    break
                 
-                listing_data = self.scrape_listing(listing_url)
-                if listing_data:
-                    results.append(listing_data)
-                    page_particulares += 1
-                    total_particulares += 1
-                    self.logger.info(f"✅ Particular encontrado ({total_particulares} total): {listing_data.get('titulo', 'Sin título')}")
+                # Descargar en segundo plano la(s) página(s) siguiente(s) mientras se procesan las fichas
+                prefetcher.schedule_after(page, max_pages)
+                
+                self.logger.info(f"Encontrados {len(listings)} listados en página {page}")
+                
+                # Procesar cada listado individual
+                page_particulares = 0
+                for i, listing_url in enumerate(listings, 1):
+                    # Verificar interrupción antes de procesar cada listado
+                    if self._should_stop_search():
+                        self.logger.info(f"🛑 Búsqueda interrumpida durante procesamiento de listado {i} en página {page}")
+                        return
+                    
+                    # Ficha ya procesada antes de reanudar desde el checkpoint
+                    if checkpoint.is_processed(listing_url):
+                        continue
+                    
+                    progress_msg = f"Procesando listado {i}/{len(listings)} de página {page}"
+                    self.logger.debug(f"{progress_msg}: {listing_url}")
                     
-                    # Añadir log al session state cuando se encuentre un particular
-                    self._add_log_message(f"🏠 {self.name} - Particular #{total_particulares}: {listing_data.get('titulo', 'Sin título')[:50]}...")
-                else:
-                    self.logger.debug(f"❌ Descartado (no particular): {listing_url}")
+                    # Añadir log cada 5 listados procesados para no saturar
+                    if i % 5 == 0:
+                        self._add_log_message(f"📋 Procesando {i}/{len(listings)} listados", portal=self.name, page=page)
+                    
+                    listing_data = self.scrape_listing(listing_url)
+                    checkpoint.record_listing(listing_url, listing_data)
+                    if listing_data:
+                        yield listing_data
+                        page_particulares += 1
+                        total_particulares += 1
+                        self.logger.info(f"✅ Particular encontrado ({total_particulares} total): {listing_data.get('titulo', 'Sin título')}")
+                    else:
+                        self.logger.debug(f"❌ Descartado (no particular): {listing_url}")
+                    
+                    total_processed += 1
                 
-                total_processed += 1
-            
-            self.logger.info(f"Página {page} completada: {page_particulares} particulares de {len(listings)} listados")
-            page += 1
+                self.logger.info(f"Página {page} completada: {page_particulares} particulares de {len(listings)} listados")
+                page += 1
+                checkpoint.advance(page)
+        finally:
+            prefetcher.close()
         
         if not self._should_stop_search():
             self.logger.info(f"Búsqueda completada en {self.name}: {total_particulares} particulares de {total_processed} listados procesados")
         else:
             self.logger.info(f"Búsqueda interrumpida en {self.name}: {total_particulares} particulares de {total_processed} listados procesados hasta la interrupción")
-        
+        self.logger.info(f"🔗 Conexiones HTTP {self.name}: {connection_layer.get_stats()} - "
+                         f"precarga de páginas: {prefetcher.stats}")
+    
+    def _extract_listing_summaries(self, soup: BeautifulSoup) -> List[Dict]:
+        """Enlaces de la página de resultados con el precio mostrado en el listado si el portal lo permite"""
+        return [{'url': url, 'price': None} for url in self._extract_listing_links(soup)]
+    
+    def search_listings_two_phase(self, search_params: Dict, known_listings: Optional[Dict[str, Dict]] = None,
+                                  stale_after_days: float = 7.0,
+                                  checkpoint: Optional[CrawlCheckpoint] = None,
+                                  context: Optional[CrawlContext] = None) -> List[Dict]:
+        """Rastreo en dos fases devolviendo la lista completa (ver iter_listings_two_phase)"""
+        checkpoint = checkpoint or CrawlCheckpoint(self.name, search_params, persist=False)
+        results = list(checkpoint.results)
+        results.extend(self.iter_listings_two_phase(search_params, known_listings, stale_after_days, checkpoint,
+                                                    context))
         return results
     
+    def iter_listings_two_phase(self, search_params: Dict, known_listings: Optional[Dict[str, Dict]] = None,
+                                stale_after_days: float = 7.0,
+                                checkpoint: Optional[CrawlCheckpoint] = None,
+                                context: Optional[CrawlContext] = None) -> Iterator[Dict]:
+        """
+        Rastreo en dos fases: descubrir todas las páginas y después descargar fichas por prioridad
+        
+        Args:
+            search_params: Parámetros de búsqueda (max_pages limita la fase de descubrimiento)
+            known_listings: Anuncios ya guardados {url: {'price', 'updated'}} (ExcelManager.get_known_listings)
+            stale_after_days: Días tras los que un anuncio conocido vuelve a revisarse
+            checkpoint: Checkpoint de la búsqueda; uno nuevo (no reanudado) descarta la frontera anterior
+            context: Cancelación, progreso y log del rastreo
+        """
+        self.context = context or CrawlContext()
+        if checkpoint and checkpoint.completed:
+            return
+        
+        frontier_path = UrlFrontier.path_for(self.name, search_params)
+        if checkpoint and not checkpoint.resumed:
+            UrlFrontier(frontier_path).clear()
+        frontier = UrlFrontier.load(frontier_path, known_listings, stale_after_days)
+        crawler = TwoPhaseCrawler(self, frontier, checkpoint=checkpoint, listing_pause=None)
+        yield from crawler.iter_run(search_params, search_params.get('max_pages', 10))
+    
     def _should_stop_search(self) -> bool:
-        """Verificar si se debe parar la búsqueda (desde Streamlit session_state)"""
-        try:
-            # Intentar importar streamlit y verificar session_state
-            import streamlit as st
-            return st.session_state.get('stop_search', False)
-        except (ImportError, RuntimeError, AttributeError):
-            # Si no está disponible streamlit o session_state, continuar normalmente
-            return False
+        """Verificar si se solicitó parar la búsqueda (token de cancelación del contexto)"""
+        return self.context.cancelled()
     
     @abstractmethod
     def _extract_listing_links(self, soup: BeautifulSoup) -> List[str]:
@@ -373,10 +469,25 @@ class BaseScraper(ABC):
         """
         self.logger.debug(f"Analizando detalle: {url}")
         
-        soup = self._make_request(url)
+        soup = None
+        
+        # PASO 0: Ruta rápida - estado JSON embebido en el HTML inicial
+        if self.use_embedded_state:
+            data, html = self._scrape_embedded_state(url)
+            if data is not None:
+                metrics.inc('listings_parsed_total', portal=self.name.lower())
+                return data or None
+            
+            # Sin JSON: reutilizar el HTML descargado si el portal no necesita navegador
+            if html and self.embedded_state_reuse_html:
+                soup = BeautifulSoup(html, 'html.parser')
+        
+        if soup is None:
+            soup = self._make_request(url)
         if not soup:
             self.logger.warning(f"No se pudo cargar la página: {url}")
             return None
+        metrics.inc('listings_parsed_total', portal=self.name.lower())
         
         # PASO 1: Verificar si es particular antes de extraer datos
         if not self._is_particular(soup):
@@ -387,7 +498,8 @@ class BaseScraper(ABC):
         self.logger.debug(f"✅ Es particular, extrayendo datos: {url}")
         
         try:
-            data = self._extract_listing_data(soup)
+            with instrumentation.span('extraction', self.name):
+                data = self._extract_listing_data(soup)
             data['url'] = url
             data['portal'] = self.name
             
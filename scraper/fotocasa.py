@@ -1,18 +1,126 @@
 import re
-import time
 from typing import Dict, List, Optional
 from bs4 import BeautifulSoup
 from .base_scraper import BaseScraper
+from utils.embedded_state import embedded_state_extractor
 from utils.locations import location_manager, LocationType
 from utils.selenium_stealth import selenium_stealth
+from utils.browser_handoff import browser_handoff
+from utils.politeness import politeness
+from utils.instrumentation import instrumentation
+
+
+def _feature_value(features, *keys) -> int:
+    """Obtener una característica de Fotocasa (dict o lista de {key, value})"""
+    if isinstance(features, dict):
+        for key in keys:
+            if features.get(key) is not None:
+                return int(embedded_state_extractor.to_number(features[key]) or 0)
+    elif isinstance(features, list):
+        for feature in features:
+            if isinstance(feature, dict) and feature.get('key') in keys:
+                return int(embedded_state_extractor.to_number(feature.get('value')) or 0)
+    return 0
+
+
+def map_fotocasa_real_estate(real_estate: Dict, base_url: str = "https://www.fotocasa.es") -> Dict:
+    """
+    Mapear un objeto realEstate de Fotocasa (estado embebido o API de búsqueda)
+    al mismo formato que devuelve _extract_listing_data
+    """
+    data = {}
+    
+    # Título
+    title = real_estate.get('title') or real_estate.get('propertyTitle') or ''
+    data['titulo'] = str(title).strip()
+    
+    # Precio: numérico o texto formateado
+    price = real_estate.get('rawPrice') or real_estate.get('price')
+    if isinstance(price, dict):
+        price = price.get('amount') or price.get('value')
+    data['precio'] = embedded_state_extractor.to_number(price) if price else None
+    
+    # Ubicación
+    location = real_estate.get('location') or real_estate.get('address') or ''
+    if isinstance(location, dict):
+        parts = [location.get('street') or location.get('ubication'),
+                 location.get('district'), location.get('municipality') or location.get('city')]
+        location = ', '.join(str(p) for p in parts if p)
+    data['ubicacion'] = str(location)
+    
+    # Características
+    features = real_estate.get('features') or {}
+    data['superficie'] = _feature_value(features, 'surface', 'size')
+    data['habitaciones'] = _feature_value(features, 'rooms', 'bedrooms')
+    data['banos'] = _feature_value(features, 'bathrooms')
+    
+    # Contacto
+    advertiser = real_estate.get('advertiser') or {}
+    data['telefono'] = str(real_estate.get('phone') or advertiser.get('phone') or '')
+    data['nombre_contacto'] = str(advertiser.get('clientAlias') or advertiser.get('name') or '')
+    data['requiere_formulario'] = not data['telefono']
+    data['fecha_publicacion'] = str(real_estate.get('publicationDate') or real_estate.get('date') or '')
+    
+    # URL del anuncio si viene incluida (API de búsqueda)
+    detail = real_estate.get('detail') or real_estate.get('url') or ''
+    if isinstance(detail, dict):
+        detail = detail.get('es-ES') or next(iter(detail.values()), '')
+    if detail:
+        data['url'] = base_url + detail if str(detail).startswith('/') else str(detail)
+    
+    return data
+
+
+def harvest_fotocasa_search_listings(payloads: List[Dict], clean_url, portal: str = "Fotocasa",
+                                     base_url: str = "https://www.fotocasa.es") -> Dict[str, Dict]:
+    """
+    Listados de las respuestas JSON de la API de búsqueda (capturadas por CDP)
+    
+    Args:
+        payloads: Respuestas {'url': ..., 'data': ...} de get_captured_json_responses
+        clean_url: Función que limpia los parámetros de galería de una URL
+        
+    Returns:
+        Dict url -> datos mapeados, en el orden de la página
+    """
+    listings = {}
+    
+    for payload in payloads:
+        for real_estate in embedded_state_extractor.find_key(payload['data'], 'realEstates') or []:
+            if not isinstance(real_estate, dict):
+                continue
+            
+            data = map_fotocasa_real_estate(real_estate, base_url)
+            url = clean_url(data.get('url', ''))
+            if not url or '/vivienda/' not in url or url in listings:
+                continue
+            
+            data['url'] = url
+            data['portal'] = portal
+            data['method'] = 'network_capture'
+            listings[url] = data
+    
+    return listings
 
 
 class FotocasaScraper(BaseScraper):
     """Scraper específico para Fotocasa"""
     
-    def __init__(self):
+    # Endpoint de la API de búsqueda que solicita la propia página de resultados
+    SEARCH_API_PATTERN = '/propertysearch/search'
+    
+    def __init__(self, network_capture: bool = False):
         super().__init__(name="Fotocasa", delay=1.5)
         self.base_url = "https://www.fotocasa.es"
+        
+        # Modo captura de red: leer los listados de las respuestas XHR de la API de búsqueda
+        self.network_capture = network_capture
+        self._captured_listings = {}  # url -> datos mapeados desde la API (página de resultados actual)
+        self._page_links = []  # Enlaces capturados de la API para la página de resultados actual
+        
+        # Ruta rápida: el HTML inicial incluye window.__INITIAL_PROPS__ / JSON-LD,
+        # solo se usa Selenium cuando falta el estado embebido
+        self.use_embedded_state = True
     
     def _check_particular_indicators(self, soup: BeautifulSoup) -> bool:
         """
@@ -115,6 +223,25 @@ class FotocasaScraper(BaseScraper):
         
         return data
     
+    def _map_embedded_state(self, state: Dict, html: str) -> Optional[Dict]:
+        """Mapear estado embebido de Fotocasa (__INITIAL_PROPS__ / __NEXT_DATA__ / JSON-LD)"""
+        for key in ('window_state', 'next_data'):
+            real_estate = embedded_state_extractor.find_key(state.get(key), 'realEstate')
+            if isinstance(real_estate, dict):
+                data = map_fotocasa_real_estate(real_estate, self.base_url)
+                data.pop('url', None)  # La URL canónica es la solicitada
+                if data.get('titulo') or data.get('precio'):
+                    return data
+        
+        if state.get('json_ld'):
+            return embedded_state_extractor.map_json_ld_listing(state['json_ld']) or None
+        
+        return None
+    
+    def _is_particular_embedded(self, state: Dict) -> Optional[bool]:
+        """Fotocasa extrae todos los anuncios, igual que _check_particular_indicators"""
+        return True
+    
     def _extract_surface(self, text: str) -> int:
         """Extraer superficie en m²"""
         try:
@@ -139,6 +266,7 @@ class FotocasaScraper(BaseScraper):
         except:
             return 0
     
+    @instrumentation.timed('phone')
     def _extract_phone(self, soup: BeautifulSoup) -> str:
         """Extraer teléfono de contacto"""
         # Buscar teléfono en diferentes ubicaciones
@@ -239,7 +367,7 @@ class FotocasaScraper(BaseScraper):
         try:
             # Configurar driver si es necesario
             if not selenium_stealth.driver:
-                if not selenium_stealth.setup_driver(headless=False):
+                if not selenium_stealth.setup_driver(headless=False, capture_network=self.network_capture):
                     self.logger.error("ERROR: No se pudo configurar Selenium WebDriver")
                     return super()._make_request(url, retries)  # Fallback a HTTP
             
@@ -248,16 +376,26 @@ class FotocasaScraper(BaseScraper):
                 self.logger.error("ERROR: Driver no disponible")
                 return super()._make_request(url, retries)  # Fallback a HTTP
             
-            # Navegar a la URL
+            # Navegar a la URL respetando el intervalo adaptativo del portal
+            politeness.get(url).wait()
             self.logger.info(f"🌐 Navegando con Selenium a: {url}")
             driver.get(url)
             
-            # Esperar a que el contenido se cargue
+            # Esperar a que el contenido se cargue (resultados: hasta que aparezcan enlaces de vivienda)
             self.logger.info("⏳ Esperando carga de contenido dinámico...")
-            time.sleep(8)
+            from selenium.webdriver.common.by import By
+            from selenium.webdriver.support.ui import WebDriverWait
+            from selenium.common.exceptions import TimeoutException
+            is_detail = '/vivienda/' in url
+            try:
+                WebDriverWait(driver, 15).until(
+                    lambda d: d.execute_script("return document.readyState") == 'complete' and
+                    (is_detail or d.find_elements(By.CSS_SELECTOR, "a[href*='/vivienda/']"))
+                )
+            except TimeoutException:
+                self.logger.warning("⚠️ Timeout esperando el contenido dinámico - continuando con lo disponible")
             
             # Verificar que haya contenido
-            from selenium.webdriver.common.by import By
             try:
                 # Esperar a que aparezcan enlaces de vivienda
                 elements = driver.find_elements(By.CSS_SELECTOR, "a[href*='/vivienda/']")
@@ -265,10 +403,18 @@ class FotocasaScraper(BaseScraper):
             except:
                 self.logger.warning("⚠️ No se detectaron enlaces de vivienda")
             
+            # Modo captura de red: recoger los listados de la API de búsqueda solicitada por la página
+            # (solo en páginas de resultados; las fichas no deben descartar lo capturado)
+            if self.network_capture and '/vivienda/' not in url:
+                self._page_links = self._harvest_search_payloads()
+            
             # Obtener HTML y crear BeautifulSoup
             html_content = driver.page_source
             soup = BeautifulSoup(html_content, 'html.parser')
             
+            # Las fichas (estado embebido por HTTP) reutilizan la clearance de esta carga
+            browser_handoff.transplant(url)
+            
             self.logger.debug(f"✅ Petición Selenium exitosa")
             return soup
             
@@ -276,6 +422,41 @@ class FotocasaScraper(BaseScraper):
             self.logger.error(f"❌ Error con Selenium: {e}")
             self.logger.info("🔄 Intentando fallback con HTTP tradicional...")
             return super()._make_request(url, retries)  # Fallback a HTTP tradicional
+    
+    def _prefetch_fetch(self, url: str) -> Optional[BeautifulSoup]:
+        """Sin precarga: los listados de Fotocasa se renderizan con JavaScript y el driver no admite otro hilo"""
+        return None
+    
+    def _harvest_search_payloads(self) -> List[str]:
+        """
+        Extraer listados de las respuestas JSON de la API de búsqueda capturadas por CDP
+        
+        Sustituye los datos capturados de la página anterior: los que no llegaron a
+        consumirse no deben reaparecer en las siguientes páginas.
+        
+        Returns:
+            Lista de URLs de anuncios encontradas en las respuestas capturadas
+        """
+        self._captured_listings = harvest_fotocasa_search_listings(
+            selenium_stealth.get_captured_json_responses(self.SEARCH_API_PATTERN),
+            self._clean_gallery_params, self.name, self.base_url
+        )
+        links = list(self._captured_listings)
+        
+        if links:
+            self.logger.info(f"📡 {len(links)} listados obtenidos de la API de búsqueda")
+        
+        return links
+    
+    def scrape_listing(self, url: str) -> Optional[Dict]:
+        """Usar los datos de la API de búsqueda si ya están completos; si no, visitar el detalle"""
+        captured = self._captured_listings.pop(url, None)
+        if captured and (captured.get('titulo') or captured.get('precio')):
+            self.logger.debug(f"📡 Datos de la API de búsqueda, sin visitar detalle: {url}")
+            return captured
+        
+        return super().scrape_listing(url)
+    
     def _extract_listing_links(self, soup: BeautifulSoup) -> List[str]:
         """Extraer enlaces de listados de la página de resultados"""
         links = []
@@ -288,8 +469,9 @@ class FotocasaScraper(BaseScraper):
             'article a[href*="/vivienda/"]'
         ]
         
-        # Usar un set para evitar duplicados
-        unique_links = set()
+        # Usar un set para evitar duplicados (incluye los capturados de la API para esta página)
+        unique_links = set(self._page_links)
+        self._page_links = []
         
         for selector in link_selectors:
             for link in soup.select(selector):
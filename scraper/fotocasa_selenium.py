@@ -4,24 +4,47 @@
 Scraper de Fotocasa usando Selenium para contenido dinámico
 """
 
-import time
 import re
-from typing import Dict, List
+from typing import Dict, Iterator, List, Optional
 from bs4 import BeautifulSoup
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
 from .selenium_base_scraper import SeleniumBaseScraper
+from .fotocasa import FotocasaScraper, harvest_fotocasa_search_listings
 from utils.locations import location_manager, LocationType
+from utils.selenium_stealth import selenium_stealth
+from utils.politeness import politeness
+from utils.checkpoint import CrawlCheckpoint
+from utils.crawl_context import CrawlContext
 
 
 class FotocasaSeleniumScraper(SeleniumBaseScraper):
     """Scraper de Fotocasa usando Selenium para contenido dinámico"""
     
-    def __init__(self):
+    def __init__(self, network_capture: bool = False):
         super().__init__(name="Fotocasa", delay=2.0)
         self.base_url = "https://www.fotocasa.es"
+        
+        # Modo captura de red: listados desde las respuestas XHR de la API de búsqueda
+        self.network_capture = network_capture
+        self._captured_listings = {}  # url -> datos mapeados desde la API
+    
+    def _init_driver(self):
+        """Inicializar el driver compartido, con captura de red si el modo está activo"""
+        if not selenium_stealth.driver:
+            if not selenium_stealth.setup_driver(headless=self.headless, capture_network=self.network_capture):
+                raise RuntimeError("No se pudo configurar Selenium WebDriver")
+        return selenium_stealth.driver
+    
+    def _extract_listing_links_network(self) -> List[str]:
+        """Extraer enlaces y datos desde las respuestas de la API de búsqueda capturadas por CDP"""
+        self._captured_listings = harvest_fotocasa_search_listings(
+            selenium_stealth.get_captured_json_responses(FotocasaScraper.SEARCH_API_PATTERN),
+            self._clean_gallery_params, self.name, self.base_url
+        )
+        return list(self._captured_listings)
     
     def _wait_for_content_load(self, driver, timeout=20):
         """Esperar a que el contenido se cargue completamente"""
@@ -36,12 +59,18 @@ class FotocasaSeleniumScraper(SeleniumBaseScraper):
                 EC.presence_of_element_located((By.CSS_SELECTOR, "a[href*='/vivienda/']"))
             )
             
-            # Delay adicional para asegurar que todo esté cargado
-            time.sleep(3)
-            
         except TimeoutException:
             self.logger.warning("Timeout esperando contenido - continuando con lo que está disponible")
     
+    def _wait_for_document_ready(self, driver, timeout=15):
+        """Esperar a que el navegador termine de cargar la ficha (en lugar de una pausa fija)"""
+        try:
+            WebDriverWait(driver, timeout).until(
+                lambda d: d.execute_script("return document.readyState") == 'complete'
+            )
+        except TimeoutException:
+            self.logger.warning("Timeout esperando la carga de la ficha - continuando con lo disponible")
+    
     def _extract_listing_links_selenium(self, driver) -> List[str]:
         """Extraer enlaces usando Selenium directamente"""
         links = []
@@ -50,6 +79,13 @@ class FotocasaSeleniumScraper(SeleniumBaseScraper):
             # Esperar a que el contenido se cargue
             self._wait_for_content_load(driver)
             
+            # Modo captura de red: una sola respuesta de la API contiene todos los listados de la página
+            if self.network_capture:
+                links = self._extract_listing_links_network()
+                if links:
+                    self.logger.info(f"📡 {len(links)} enlaces obtenidos de la API de búsqueda")
+                    return links
+            
             # Buscar todos los enlaces que contengan '/vivienda/'
             elements = driver.find_elements(By.CSS_SELECTOR, "a[href*='/vivienda/']")
             
@@ -108,17 +144,46 @@ class FotocasaSeleniumScraper(SeleniumBaseScraper):
         # Este método se mantiene para compatibilidad pero preferimos el método Selenium
         return []
     
-    def search_listings(self, search_params: Dict) -> List[Dict]:
-        """Buscar listados usando Selenium para manejar contenido dinámico"""
-        all_results = []
+    def _scrape_detail(self, driver, link: str) -> Optional[Dict]:
+        """Visitar la ficha en el driver y extraer sus datos si es de particular"""
+        # Turno del controlador de cortesía y espera a que cargue
+        politeness.get(self.name).wait()
+        driver.get(link)
+        self._wait_for_document_ready(driver)
+        
+        soup = BeautifulSoup(driver.page_source, 'html.parser')
+        
+        # Verificar si es de particular
+        if not self._check_particular_indicators(soup):
+            self.logger.info(f"⏭️ Inmueble no es de particular - omitiendo: {link}")
+            return None
+        
+        data = self._extract_listing_data(soup)
+        data['url'] = link
+        data['portal'] = self.name
+        
+        # Validar que se extrajeron datos mínimos
+        if not data.get('titulo') and not data.get('precio'):
+            self.logger.warning(f"⚠️ Datos insuficientes extraídos de: {link}")
+            return None
+        return data
+    
+    def iter_listings(self, search_params: Dict, checkpoint: Optional[CrawlCheckpoint] = None,
+                      context: Optional[CrawlContext] = None) -> Iterator[Dict]:
+        """Iterar los anuncios de particulares usando Selenium para manejar contenido dinámico"""
+        # Checkpoint de la búsqueda (solo en memoria si no se pidió uno persistente)
+        checkpoint = checkpoint or CrawlCheckpoint(self.name, search_params, persist=False)
+        # Contexto de este rastreo (sin contexto: nunca se cancela y el progreso solo va al logger)
+        self.context = context or CrawlContext()
         
         # Validar parámetros
         location = search_params.get('location', '').strip()
         if not location:
             self.logger.error("❌ Ubicación requerida para la búsqueda")
-            return []
+            return
         
         max_pages = search_params.get('max_pages', 3)
+        total_particulares = 0
         
         self.logger.info(f"🔍 Iniciando búsqueda en {self.name}")
         self.logger.info(f"📍 Ubicación: {location}")
@@ -129,91 +194,84 @@ class FotocasaSeleniumScraper(SeleniumBaseScraper):
             # Inicializar driver
             driver = self._init_driver()
             
-            for page in range(1, max_pages + 1):
+            page = checkpoint.page
+            while page <= max_pages and not checkpoint.completed:
+                if self._should_stop_search():
+                    self.logger.info(f"🛑 Búsqueda interrumpida por el usuario en {self.name} (página {page})")
+                    break
+                
                 self.logger.info(f"📄 Procesando página {page}/{max_pages}")
-                self._update_current_page(page)
+                self.context.progress(self.name, page)
                 
                 # Construir URL de búsqueda para la página actual
-                search_params_page = search_params.copy()
-                search_params_page['page'] = page
-                search_url = self.build_search_url(search_params_page)
-                
+                search_url = self.build_search_url({**search_params, 'page': page})
                 self.logger.info(f"🌐 URL: {search_url}")
                 
                 try:
-                    # Navegar a la página
+                    # Navegar a la página respetando el intervalo adaptativo del portal
+                    politeness.get(self.name).wait()
                     driver.get(search_url)
                     
                     # Extraer enlaces usando Selenium
                     page_links = self._extract_listing_links_selenium(driver)
+                except Exception as e:
+                    self.logger.error(f"❌ Error procesando página {page}: {e}")
+                    page += 1
+                    checkpoint.advance(page)
+                    continue
+                
+                if not page_links:
+                    if page == 1:
+                        # Si no hay enlaces ni en la primera página, hay un problema
+                        self.logger.error("❌ No se encontraron enlaces en la primera página - posible bloqueo")
+                    else:
+                        # Fin de los resultados
+                        self.logger.info(f"🏁 No se encontraron más enlaces en página {page}")
+                        checkpoint.complete()
+                    break
+                
+                politeness.get(self.name).record_success()
+                self.logger.info(f"✅ Encontrados {len(page_links)} enlaces en página {page}")
+                
+                # Fichas ya procesadas (checkpoint o, en un lote, otra ubicación) no se vuelven a visitar
+                page_links = [link for link in page_links if not checkpoint.is_processed(link)]
+                
+                # Procesar cada enlace
+                for i, link in enumerate(page_links, 1):
+                    if self._should_stop_search():
+                        self.logger.info(f"🛑 Búsqueda interrumpida durante procesamiento de inmueble {i} en página {page}")
+                        return
                     
-                    if not page_links:
-                        self.logger.warning(f"⚠️ No se encontraron enlaces en página {page}")
-                        if page == 1:
-                            # Si no hay enlaces ni en la primera página, hay un problema
-                            self.logger.error("❌ No se encontraron enlaces en la primera página - posible bloqueo")
-                            break
-                        else:
-                            # Podríamos haber llegado al final
-                            break
-                    
-                    self.logger.info(f"✅ Encontrados {len(page_links)} enlaces en página {page}")
+                    self.logger.info(f"🏠 Procesando inmueble {i}/{len(page_links)} de página {page}")
                     
-                    # Procesar cada enlace
-                    for i, link in enumerate(page_links, 1):
+                    # Datos ya presentes en la API de búsqueda: no hace falta visitar el detalle
+                    data = self._captured_listings.pop(link, None)
+                    if not (data and (data.get('titulo') or data.get('precio'))):
                         try:
-                            self.logger.info(f"🏠 Procesando inmueble {i}/{len(page_links)} de página {page}")
-                            
-                            # Visitar el enlace
-                            driver.get(link)
-                            time.sleep(2)  # Esperar carga
-                            
-                            # Obtener HTML y crear BeautifulSoup
-                            html = driver.page_source
-                            soup = BeautifulSoup(html, 'html.parser')
-                            
-                            # Verificar si es de particular
-                            if not self._check_particular_indicators(soup):
-                                self.logger.info(f"⏭️ Inmueble {i} no es de particular - omitiendo")
-                                continue
-                            
-                            # Extraer datos
-                            data = self._extract_listing_data(soup)
-                            data['url'] = link
-                            data['portal'] = self.name
-                            
-                            # Validar datos
-                            if self._validate_listing_data(data):
-                                all_results.append(data)
-                                self.logger.info(f"✅ Inmueble {i} añadido: {data.get('titulo', 'Sin título')[:50]}...")
-                            else:
-                                self.logger.warning(f"⚠️ Inmueble {i} falló validación")
-                                
+                            data = self._scrape_detail(driver, link)
                         except Exception as e:
                             self.logger.error(f"❌ Error procesando inmueble {i}: {e}")
                             continue
                     
-                    # Delay entre páginas
-                    if page < max_pages:
-                        delay = self._calculate_delay()
-                        self.logger.info(f"⏳ Esperando {delay:.1f}s antes de la siguiente página...")
-                        time.sleep(delay)
-                        
-                except Exception as e:
-                    self.logger.error(f"❌ Error procesando página {page}: {e}")
-                    continue
+                    checkpoint.record_listing(link, data)
+                    if data:
+                        total_particulares += 1
+                        self.logger.info(f"✅ Inmueble {i} añadido: {data.get('titulo', 'Sin título')[:50]}...")
+                        yield data
+                
+                page += 1
+                checkpoint.advance(page)
                     
         except Exception as e:
             self.logger.error(f"❌ Error en búsqueda: {e}")
         finally:
             if driver:
                 try:
-                    driver.quit()
+                    self.close_session()
                 except:
                     pass
         
-        self.logger.info(f"🎯 Búsqueda completada: {len(all_results)} inmuebles encontrados")
-        return all_results
+        self.logger.info(f"🎯 Búsqueda completada: {total_particulares} inmuebles encontrados")
     
     def _check_particular_indicators(self, soup: BeautifulSoup) -> bool:
         """Verificar si el anuncio es de un particular en Fotocasa"""
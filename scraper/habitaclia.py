@@ -1,8 +1,10 @@
 import re
-from typing import Dict, List
+from typing import Dict, List, Optional
 from bs4 import BeautifulSoup
 from .base_scraper import BaseScraper
+from utils.embedded_state import embedded_state_extractor
 from utils.locations import location_manager, LocationType
+from utils.instrumentation import instrumentation
 
 
 class HabitacliaScraper(BaseScraper):
@@ -11,6 +13,10 @@ class HabitacliaScraper(BaseScraper):
     def __init__(self):
         super().__init__(name="Habitaclia", delay=1.0)
         self.base_url = "https://www.habitaclia.com"
+        
+        # Ruta rápida por JSON-LD; si falta, se reutiliza el mismo HTML (no hace falta navegador)
+        self.use_embedded_state = True
+        self.embedded_state_reuse_html = True
     
     def _check_particular_indicators(self, soup: BeautifulSoup) -> bool:
         """Verificar si el anuncio es de un particular en Habitaclia"""
@@ -160,6 +166,24 @@ class HabitacliaScraper(BaseScraper):
         
         return data
     
+    def _map_embedded_state(self, state: Dict, html: str) -> Optional[Dict]:
+        """Mapear estado embebido de Habitaclia (principalmente JSON-LD del anuncio)"""
+        if state.get('json_ld'):
+            data = embedded_state_extractor.map_json_ld_listing(state['json_ld'])
+            if data:
+                return data
+        return None
+    
+    def _is_particular_embedded(self, state: Dict) -> Optional[bool]:
+        """Determinar tipo de anunciante desde el estado embebido si está disponible"""
+        for key in ('advertiserType', 'tipoAnunciante', 'publisherType'):
+            value = embedded_state_extractor.find_key(state, key)
+            if isinstance(value, str):
+                return value.lower() == 'particular'
+        
+        # Sin dato explícito: se decide con _check_particular_indicators sobre el mismo HTML
+        return None
+    
     def _extract_surface(self, text: str) -> int:
         """Extraer superficie en m²"""
         try:
@@ -193,6 +217,7 @@ class HabitacliaScraper(BaseScraper):
         except:
             return 0
     
+    @instrumentation.timed('phone')
     def _extract_phone(self, soup: BeautifulSoup) -> str:
         """Extraer teléfono de contacto"""
         # Buscar teléfono en diferentes ubicaciones
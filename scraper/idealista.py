@@ -1,16 +1,34 @@
 import re
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, Optional
 from bs4 import BeautifulSoup
 from .selenium_base_scraper import SeleniumBaseScraper
 from utils.locations import location_manager, LocationType
+from utils.selenium_stealth import selenium_stealth
+from utils.phone_reveal import phone_reveal_queue
+from utils.checkpoint import CrawlCheckpoint
+from utils.crawl_context import CrawlContext
+from utils.instrumentation import instrumentation
 
 
 class IdealistaScraper(SeleniumBaseScraper):
     """Scraper específico para Idealista usando Selenium como método principal"""
     
-    def __init__(self):
-        super().__init__(name="Idealista", delay=5.0, headless=False)  # Modo visible para evadir DataDome
+    PHONE_BUTTON_SELECTOR = 'a.see-phones-btn.icon-phone-outline.hidden-contact-phones_link'
+    PHONE_RESULT_SELECTOR = 'a.icon-phone-outline.hidden-contact-phones_formatted-phone._mobilePhone .hidden-contact-phones_text'
+    
+    def __init__(self, phone_reveal: str = 'inline', max_tabs: int = 1):
+        """
+        Args:
+            phone_reveal: 'inline' = clic en la página ya cargada por el driver principal (las fichas
+                que no cargó el driver se difieren igualmente); 'deferred' = encolar siempre el
+                clic para un navegador dedicado en segundo plano
+            max_tabs: Pestañas simultáneas para descargar fichas (1 = una a una)
+        """
+        super().__init__(name="Idealista", delay=5.0, headless=False, max_tabs=max_tabs)  # Modo visible para evadir DataDome
         self.base_url = "https://www.idealista.com"
+        self.phone_reveal = phone_reveal
+        self._pending_reveal = False
+        self._deferred_records = []  # Anuncios de la búsqueda con teléfono pendiente de revelado diferido
         
         self.logger.info("IdealistaScraper inicializado con Selenium como metodo principal")
         self.logger.info("Modo visible activado - mejor para evadir DataDome")
@@ -68,6 +86,10 @@ class IdealistaScraper(SeleniumBaseScraper):
             self.logger.error(f"Error en validación de contenido: {e}")
             return False
     
+    def _is_end_of_results(self, soup: BeautifulSoup, url: str) -> bool:
+        """Idealista no devuelve páginas vacías: redirige a la primera cuando se acaban los resultados"""
+        return self._is_redirected_to_first_page(soup, url)
+    
     def _is_redirected_to_first_page(self, soup: BeautifulSoup, url: str) -> bool:
         """Detectar si Idealista ha redirigido a la primera página por falta de resultados"""
         try:
@@ -236,21 +258,82 @@ class IdealistaScraper(SeleniumBaseScraper):
         
         return data
     
-    def scrape_listing(self, url: str) -> Optional[Dict]:
+    def scrape_listing(self, url: str, soup: Optional[BeautifulSoup] = None) -> Optional[Dict]:
         """
         Sobrescribir método para almacenar URL actual (necesaria para Selenium)
         """
         # Almacenar URL actual para uso en _extract_phone
         self._current_url = url
+        self._pending_reveal = False
         
         # Llamar al método padre
-        result = super().scrape_listing(url)
+        result = super().scrape_listing(url, soup=soup)
+        
+        # Revelado diferido: el teléfono se completará en el dict cuando termine el navegador dedicado
+        if result and self._pending_reveal:
+            phone_reveal_queue.submit(url, result, self.PHONE_BUTTON_SELECTOR, self.PHONE_RESULT_SELECTOR)
+            self._deferred_records.append(result)
         
         # Limpiar URL tras el procesamiento
         self._current_url = ''
+        self._pending_reveal = False
         
         return result
     
+    def iter_listings(self, search_params: Dict, checkpoint: Optional[CrawlCheckpoint] = None,
+                      context: Optional[CrawlContext] = None) -> Iterator[Dict]:
+        """Iterar anuncios; al final se notifican (context.update) los que recibieron el teléfono en diferido"""
+        self._deferred_records = []
+        try:
+            yield from super().iter_listings(search_params, checkpoint, context)
+        finally:
+            self._cancel_deferred_reveals()
+        self._wait_deferred_reveals()
+    
+    def iter_listings_two_phase(self, search_params: Dict, known_listings: Optional[Dict[str, Dict]] = None,
+                                stale_after_days: float = 7.0,
+                                checkpoint: Optional[CrawlCheckpoint] = None,
+                                context: Optional[CrawlContext] = None) -> Iterator[Dict]:
+        """Rastreo en dos fases notificando al final los anuncios con teléfono diferido"""
+        self._deferred_records = []
+        try:
+            yield from super().iter_listings_two_phase(search_params, known_listings, stale_after_days, checkpoint,
+                                                       context)
+        finally:
+            self._cancel_deferred_reveals()
+        self._wait_deferred_reveals()
+    
+    def _cancel_deferred_reveals(self):
+        """Rastreo cancelado (o cerrado por quien lo consume): no seguir revelando teléfonos"""
+        if self.context.cancelled() and phone_reveal_queue.pending():
+            dropped = phone_reveal_queue.cancel()
+            self.logger.info(f"🛑 Rastreo cancelado: {dropped} revelados diferidos descartados")
+    
+    def _wait_deferred_reveals(self) -> List[Dict]:
+        """
+        Esperar a que el navegador dedicado complete los teléfonos pendientes
+        
+        Los anuncios ya se emitieron sin teléfono: los completados se notifican con
+        context.update para guardarlos como actualización. Si se cancela el rastreo,
+        se descartan los revelados que sigan en cola en lugar de esperarlos.
+        
+        Returns:
+            Anuncios de la búsqueda cuyo teléfono se completó en diferido
+        """
+        if phone_reveal_queue.pending():
+            self.logger.info(f"📞 Esperando {phone_reveal_queue.pending()} revelados de teléfono diferidos")
+            while not phone_reveal_queue.join(timeout=1.0):
+                if self.context.cancelled():
+                    self._cancel_deferred_reveals()
+                    break
+            self.logger.info(f"📞 Revelados diferidos: {phone_reveal_queue.get_stats()}")
+        
+        revealed = [record for record in self._deferred_records if record.get('telefono')]
+        self._deferred_records = []
+        for record in revealed:
+            self.context.update(record)
+        return revealed
+    
     def _extract_surface(self, text: str) -> int:
         """Extraer superficie en m²"""
         try:
@@ -275,6 +358,7 @@ class IdealistaScraper(SeleniumBaseScraper):
         except:
             return 0
     
+    @instrumentation.timed('phone')
     def _extract_phone(self, soup: BeautifulSoup) -> str:
         """Extraer teléfono de contacto - con clic en botón si es necesario"""
         try:
@@ -302,16 +386,23 @@ class IdealistaScraper(SeleniumBaseScraper):
                             return phone_text
             
             # Si no hay teléfono visible, verificar si hay botón "Ver teléfono"
-            button_selector = 'a.see-phones-btn.icon-phone-outline.hidden-contact-phones_link'
+            button_selector = self.PHONE_BUTTON_SELECTOR
             button_element = soup.select_one(button_selector)
             
+            # Si la ficha no está abierta en el driver (traspaso HTTP, pestaña ya cerrada o fallback),
+            # revelar en línea obligaría a volver a cargarla: se difiere al navegador dedicado
+            deferred = self.phone_reveal == 'deferred' or self._page_source != 'driver'
+            if button_element and deferred and getattr(self, '_current_url', ''):
+                # El clic lo hará el navegador dedicado; el rastreo principal continúa
+                self.logger.info("🔘 Botón 'Ver teléfono' encontrado - revelado diferido")
+                self._pending_reveal = True
+                return ''
+            
             if button_element:
                 self.logger.info("🔘 Botón 'Ver teléfono' encontrado - usando Selenium para hacer clic")
                 
                 # Usar Selenium para hacer clic en el botón
                 try:
-                    from utils.selenium_stealth import selenium_stealth
-                    
                     # Obtener la URL actual (necesaria para la navegación)
                     current_url = getattr(self, '_current_url', '')
                     self.logger.info(f"🔍 DEBUG: URL actual para Selenium: '{current_url}'")
@@ -320,9 +411,9 @@ class IdealistaScraper(SeleniumBaseScraper):
                         return ''
                     
                     # Selectores para el botón y el resultado
-                    result_selector = 'a.icon-phone-outline.hidden-contact-phones_formatted-phone._mobilePhone .hidden-contact-phones_text'
+                    result_selector = self.PHONE_RESULT_SELECTOR
                     
-                    # Hacer clic y obtener el teléfono
+                    # Hacer clic y obtener el teléfono (sin renavegar si la ficha ya está cargada)
                     self.logger.info("🔍 DEBUG: Llamando a selenium_stealth.click_button_and_get_content")
                     phone_text = selenium_stealth.click_button_and_get_content(
                         url=current_url,
@@ -441,6 +532,19 @@ class IdealistaScraper(SeleniumBaseScraper):
             
         return url
     
+    def _extract_listing_summaries(self, soup: BeautifulSoup) -> List[Dict]:
+        """Enlaces de la página de resultados con el precio de cada tarjeta (para detectar cambios de precio)"""
+        prices = {}
+        for article in soup.select('article[data-element-id]'):
+            link = article.select_one('a.item-link')
+            price = article.select_one('.item-price')
+            if link and link.get('href') and price:
+                href = str(link.get('href'))
+                full_url = self.base_url + href if href.startswith('/') else href
+                prices[full_url] = self._extract_price(price.get_text()) or None
+        
+        return [{'url': url, 'price': prices.get(url)} for url in self._extract_listing_links(soup)]
+    
     def _extract_listing_links(self, soup: BeautifulSoup) -> List[str]:
         """Extraer enlaces de listados de la página de resultados de Idealista"""
         links = []
@@ -8,10 +8,22 @@ import time
 import random
 import logging
 import re
+from functools import partial
 from abc import ABC, abstractmethod
 from bs4 import BeautifulSoup
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, Optional
 from utils.selenium_stealth import selenium_stealth
+from utils.driver_lifecycle import driver_lifecycle
+from utils.browser_handoff import browser_handoff
+from utils.behavior_policy import behavior_policies
+from utils.politeness import politeness
+from utils.antibot import antibot_manager
+from utils.page_prefetch import ResultPagePrefetcher
+from utils.frontier import UrlFrontier, TwoPhaseCrawler
+from utils.checkpoint import CrawlCheckpoint
+from utils.crawl_context import CrawlContext
+from utils.instrumentation import instrumentation
+from utils.metrics import metrics
 
 # Configurar logging silencioso para librerías de Selenium
 logging.getLogger('selenium').setLevel(logging.CRITICAL)
@@ -21,26 +33,130 @@ logging.getLogger('webdriver_manager').setLevel(logging.CRITICAL)
 class SeleniumBaseScraper(ABC):
     """Clase base para scrapers que usan Selenium como método principal"""
     
-    def __init__(self, name: str, delay: float = 5.0, headless: bool = False):  # Cambiar a False para mejor evasión DataDome
+    def __init__(self, name: str, delay: float = 5.0, headless: bool = False,
+                 max_tabs: int = 1, tab_timeout: float = 30.0):  # Cambiar a False para mejor evasión DataDome
         self.name = name
         self.delay = delay
         self.headless = headless
         self.logger = logging.getLogger(f"selenium.{name}")
         self.session_pages = 0  # Contador de páginas por sesión
-        self.max_session_pages = 999999  # Desactivar reinicio automático - mantener sesión activa
+        # El reciclado del driver (páginas, memoria, errores, crashes) lo gestiona driver_lifecycle
         
+        # Fichas descargadas en varias pestañas del mismo Chrome (1 = desactivado)
+        self.max_tabs = max_tabs
+        self.tab_timeout = tab_timeout
+        
+        # Páginas de resultados descargadas por adelantado (por la clearance HTTP) mientras se procesan las fichas
+        self.prefetch_pages = 1
+        
+        # Origen de la última página obtenida: 'handoff' (HTTP con la clearance del navegador),
+        # 'tab' (pestaña ya cerrada), 'driver' (cargada y abierta en Chrome) o 'http' (fallback)
+        self._page_source = None
+        
+        # Contexto del rastreo en curso (cancelación, progreso y log); se fija en cada búsqueda
+        self.context = CrawlContext()
+    
+    @property
+    def behavior(self):
+        """Presupuesto de simulación humana y pausas del portal (scraper_settings.<portal>.behavior)"""
+        return behavior_policies.get(self.name)
+    
+    def _prefetch_listings(self, urls: List[str]) -> Dict[str, BeautifulSoup]:
+        """Descargar un lote de fichas en pestañas paralelas, devolviendo solo las válidas"""
+        if not selenium_stealth.driver:
+            if not selenium_stealth.setup_driver(headless=self.headless):
+                return {}
+        
+        # Separación entre pestañas del mismo portal según el intervalo adaptativo actual
+        controller = politeness.get(self.name)
+        controller.wait()
+        soups = selenium_stealth.fetch_many(urls, max_tabs=self.max_tabs, per_tab_timeout=self.tab_timeout,
+                                            domain_delay=(controller.delay, controller.delay * 1.3))
+        
+        valid = {}
+        for url, soup in soups.items():
+            ok = soup is not None and self._validate_selenium_content(soup, url)
+            driver_lifecycle.record_result(ok)
+            if ok:
+                valid[url] = soup
+                self.session_pages += 1
+                controller.record_success()
+            elif soup is not None:
+                block = antibot_manager.detect_block(200, str(soup))
+                if block:
+                    controller.record_block(block)
+        return valid
+    
+    def _get_prefetched_soup(self, listings: List[str], index: int, cache: Dict) -> Optional[BeautifulSoup]:
+        """
+        Obtener la ficha precargada en pestañas, lanzando el siguiente lote cuando haga falta
+        
+        Args:
+            listings: Enlaces de la página de resultados
+            index: Posición (0-based) del listado actual
+            cache: Estado del lote {'soups': {...}, 'attempted': set()} compartido en la página
+        """
+        if self.max_tabs <= 1:
+            return None
+        
+        url = listings[index]
+        if url not in cache['attempted']:
+            batch = [u for u in listings[index:index + self.max_tabs * 2] if u not in cache['attempted']]
+            cache['attempted'].update(batch)
+            cache['soups'].update(self._prefetch_listings(batch))
+        
+        return cache['soups'].pop(url, None)
+        
+    def _is_end_of_results(self, soup: BeautifulSoup, url: str) -> bool:
+        """Detectar que la página solicitada ya no tiene resultados propios (sobrescribir por portal)"""
+        return False
+    
+    def _is_last_results_page(self, soup: BeautifulSoup, url: str) -> bool:
+        """Página que termina la búsqueda: fin de resultados o sin enlaces de listados"""
+        return self._is_end_of_results(soup, url) or not self._extract_listing_links(soup)
+    
+    def _prefetch_fetch(self, url: str) -> Optional[BeautifulSoup]:
+        """
+        Descargar una página de resultados desde el hilo de precarga
+        
+        El driver no admite uso concurrente: solo se precarga con la clearance HTTP traspasada
+        desde el navegador; sin ella la página se carga después en Chrome de forma síncrona.
+        """
+        response = browser_handoff.get(url)
+        if response is None:
+            return None
+        
+        soup = BeautifulSoup(response.content, 'html.parser')
+        if self._is_valid_page(soup, url):
+            return soup
+        browser_handoff.invalidate(url, 'invalid_content')
+        return None
+    
+    def _create_page_prefetcher(self, search_params: Dict) -> ResultPagePrefetcher:
+        """Lookahead de páginas de resultados para una búsqueda"""
+        return ResultPagePrefetcher(
+            self._prefetch_fetch,
+            lambda page: self.build_search_url({**search_params, 'page': page}),
+            self._is_last_results_page,
+            depth=self.prefetch_pages,
+            logger=self.logger
+        )
+    
     def _make_request(self, url: str) -> Optional[BeautifulSoup]:
         """Realizar petición usando Selenium como método principal"""
         # Logging más silencioso - solo para URLs importantes
         if "venta-viviendas" in url and "pagina" not in url:
             self.logger.info(f"Selenium: {url}")
         
-        # Gestión de sesión - NO reiniciar automáticamente
-        # Comentado para mantener sesión activa sin interrupciones
-        # if self.session_pages >= self.max_session_pages:
-        #     self.logger.info("🔄 Reiniciando sesión Selenium para evitar detección")
-        #     selenium_stealth.close()
-        #     self.session_pages = 0
+        # Traspaso navegador → HTTP: con clearance vigente no hace falta cargar la página en Chrome
+        self._page_source = None
+        response = browser_handoff.get(url)
+        if response is not None:
+            soup = BeautifulSoup(response.content, 'html.parser')
+            if self._is_valid_page(soup, url):
+                self._page_source = 'handoff'
+                return soup
+            browser_handoff.invalidate(url, 'invalid_content')
         
         # Configurar driver si es necesario
         if not selenium_stealth.driver:
@@ -49,16 +165,30 @@ class SeleniumBaseScraper(ABC):
                 return self._fallback_http_request(url)
         
         try:
-            # Usar navegación humana optimizada
-            soup = selenium_stealth.human_navigation(url, wait_time=(3, 6))
+            # Respetar el intervalo adaptativo del portal
+            politeness.get(self.name).wait()
             
-            if soup and self._validate_selenium_content(soup, url):
+            # Navegación humana con reciclado proactivo y recuperación tras crash
+            # (el resultado para la tasa de reciclado se registra una vez, tras validar)
+            soup, valid = driver_lifecycle.navigate(url, wait_time=(3, 6),
+                                                    validate=lambda page: self._is_valid_page(page, url))
+            
+            if soup and valid:
+                politeness.get(self.name).record_success()
                 self.session_pages += 1
+                browser_handoff.transplant(url)
                 # Solo log cada 10 páginas para reducir ruido
                 if self.session_pages % 10 == 0:
-                    self.logger.info(f"Progreso: {self.session_pages} paginas procesadas")
+                    self.logger.info(f"Progreso: {self.session_pages} paginas procesadas - driver: {driver_lifecycle.get_stats()} - "
+                                     f"traspaso HTTP: {browser_handoff.get_stats()}")
+                self._page_source = 'driver'
                 return soup
             else:
+                # Contenido bloqueado/inválido (ya contado como error para la tasa de reciclado)
+                if soup:
+                    block = antibot_manager.detect_block(200, str(soup))
+                    if block:
+                        politeness.get(self.name).record_block(block)
                 self.logger.warning("AVISO: Contenido Selenium invalido, intentando HTTP fallback")
                 return self._fallback_http_request(url)
                 
@@ -66,6 +196,10 @@ class SeleniumBaseScraper(ABC):
             self.logger.error(f"ERROR: Error Selenium: {str(e)}")
             return self._fallback_http_request(url)
     
+    def _is_valid_page(self, soup: BeautifulSoup, url: str) -> bool:
+        """Página utilizable: contenido válido o fin de resultados (no es un bloqueo ni un error del driver)"""
+        return self._is_end_of_results(soup, url) or self._validate_selenium_content(soup, url)
+    
     def _validate_selenium_content(self, soup: BeautifulSoup, url: str) -> bool:
         """Validar que el contenido obtenido por Selenium es válido"""
         
@@ -99,6 +233,7 @@ class SeleniumBaseScraper(ABC):
             from utils.antibot import antibot_manager
             
             self.logger.info("🔄 Fallback a HTTP tradicional")
+            self._page_source = 'http'
             response = antibot_manager.make_request(url)
             
             if response and response.status_code == 200:
@@ -110,206 +245,190 @@ class SeleniumBaseScraper(ABC):
             self.logger.error(f"❌ Fallback HTTP también falló: {str(e)}")
             return None
     
-    def search_listings(self, search_params: Dict) -> List[Dict]:
+    def search_listings(self, search_params: Dict, checkpoint: Optional[CrawlCheckpoint] = None,
+                        context: Optional[CrawlContext] = None) -> List[Dict]:
         """Buscar listados usando Selenium como método principal con capacidad de interrupción"""
-        results = []
-        page = 1
+        # Checkpoint de la búsqueda (solo en memoria si no se pidió uno persistente)
+        checkpoint = checkpoint or CrawlCheckpoint(self.name, search_params, persist=False)
+        results = list(checkpoint.results)
+        results.extend(self.iter_listings(search_params, checkpoint, context))
+        return results
+    
+    def iter_listings(self, search_params: Dict, checkpoint: Optional[CrawlCheckpoint] = None,
+                      context: Optional[CrawlContext] = None) -> Iterator[Dict]:
+        """
+        Iterar los anuncios de particulares a medida que se encuentran
+        
+        Cada ficha queda registrada en el checkpoint antes de emitirse, de modo que el
+        consumidor puede persistir en micro-lotes sin esperar al final del portal.
+        """
+        # Checkpoint de la búsqueda (solo en memoria si no se pidió uno persistente)
+        checkpoint = checkpoint or CrawlCheckpoint(self.name, search_params, persist=False)
+        # Contexto de este rastreo (sin contexto: nunca se cancela y el progreso solo va al logger)
+        self.context = context or CrawlContext()
+        page = checkpoint.page
         max_pages = 999  # Revisar todas las páginas disponibles
         total_processed = 0
         total_particulares = 0
+        prefetcher = self._create_page_prefetcher(search_params)
         
         self.logger.info(f"INICIO: Iniciando busqueda Selenium en {self.name} - Revisando todas las paginas")
         
-        while page <= max_pages:
-            # Verificar si se solicitó parar la búsqueda
-            if self._should_stop_search():
-                self.logger.info(f"🛑 Búsqueda interrumpida por el usuario en {self.name} (página {page})")
-                break
-                
-            # Solo mostrar progreso cada 5 páginas
-            if page % 5 == 1 or page <= 3:
-                self.logger.info(f"Procesando pagina {page} de {self.name}")
-            
-            # Construir URL de la página actual
-            url = self.build_search_url({**search_params, 'page': page})
-            soup = self._make_request(url)
-            
-            if not soup:
-                self.logger.error(f"❌ No se pudo obtener la página {page}")
-                break
-            
-            # Extraer enlaces de listados de esta página
-            listings = self._extract_listing_links(soup)
-            
-            if not listings:
-                self.logger.info(f"🏁 No se encontraron más listados en página {page}")
-                break
-            
-            self.logger.info(f"🔍 Encontrados {len(listings)} listados en página {page}")
-            
-            # Procesar cada listado individual
-            page_particulares = 0
-            for i, listing_url in enumerate(listings, 1):
-                # Verificar interrupción antes de procesar cada listado
+        try:
+            while page <= max_pages and not checkpoint.completed:
+                # Verificar si se solicitó parar la búsqueda
                 if self._should_stop_search():
-                    self.logger.info(f"🛑 Búsqueda interrumpida durante procesamiento de listado {i} en página {page}")
-                    return results  # Retornar resultados obtenidos hasta ahora
+                    self.logger.info(f"🛑 Búsqueda interrumpida por el usuario en {self.name} (página {page})")
+                    break
                 
-                progress_msg = f"Procesando listado {i}/{len(listings)} de página {page}"
-                self.logger.debug(f"{progress_msg}: {listing_url}")
+                self._update_current_page(page)
+                    
+                # Solo mostrar progreso cada 5 páginas
+                if page % 5 == 1 or page <= 3:
+                    self.logger.info(f"Procesando pagina {page} de {self.name}")
                 
-                listing_data = self.scrape_listing(listing_url)
-                if listing_data:
-                    results.append(listing_data)
-                    page_particulares += 1
-                    total_particulares += 1
-                    self.logger.info(f"✅ Particular encontrado ({total_particulares} total): {listing_data.get('titulo', 'Sin título')}")
-                else:
-                    self.logger.debug(f"❌ Descartado (no particular): {listing_url}")
+                # Construir URL de la página actual
+                url = self.build_search_url({**search_params, 'page': page})
+                soup = prefetcher.get(page) or self._make_request(url)
                 
-                total_processed += 1
+                if not soup:
+                    self.logger.error(f"❌ No se pudo obtener la página {page}")
+                    break
                 
-                # Delay entre listados para evitar detección
-                time.sleep(random.uniform(1, 3))
-            
-            self.logger.info(f"📊 Página {page} completada: {page_particulares} particulares de {len(listings)} listados")
-            page += 1
-            
-            # Delay entre páginas
-            time.sleep(random.uniform(3, 6))
-        
-        if not self._should_stop_search():
-            self.logger.info(f"🎯 Búsqueda completada en {self.name}: {total_particulares} particulares de {total_processed} listados procesados")
-        else:
-            self.logger.info(f"🛑 Búsqueda interrumpida en {self.name}: {total_particulares} particulares de {total_processed} listados procesados hasta la interrupción")
-        
-        return results
-    
-    def search_listings_realtime(self, search_params: Dict) -> List[Dict]:
-        """Buscar listados usando Selenium con actualizaciones en tiempo real"""
-        try:
-            # Intentar importar streamlit para actualizaciones en tiempo real
-            import streamlit as st
-            realtime_updates = True
-        except (ImportError, RuntimeError):
-            # Si no está disponible, usar método normal
-            return self.search_listings(search_params)
-        
-        results = []
-        page = 1
-        max_pages = 999  # Revisar todas las páginas disponibles
-        total_processed = 0
-        total_particulares = 0
-        
-        self.logger.info(f"INICIO: Iniciando busqueda Selenium en tiempo real en {self.name}")
-        
-        while page <= max_pages:
-            # Verificar si se solicitó parar la búsqueda
-            if self._should_stop_search():
-                self.logger.info(f"🛑 Búsqueda interrumpida por el usuario en {self.name} (página {page})")
-                break
+                if self._is_end_of_results(soup, url):
+                    self.logger.info(f"🏁 Fin de resultados en página {page}")
+                    checkpoint.complete()
+                    break
                 
-            # Actualizar página actual en tiempo real
-            if realtime_updates:
-                st.session_state.current_page = page
-                st.session_state.log_messages.append(f"📄 Procesando página {page} con Selenium")
+                # Extraer enlaces de listados de esta página
+                listings = self._extract_listing_links(soup)
                 
-            # Solo mostrar progreso cada 5 páginas
-            if page % 5 == 1 or page <= 3:
-                self.logger.info(f"Procesando pagina {page} de {self.name}")
-            
-            # Construir URL de la página actual
-            url = self.build_search_url({**search_params, 'page': page})
-            soup = self._make_request(url)
-            
-            if not soup:
-                self.logger.error(f"❌ No se pudo obtener la página {page}")
-                if realtime_updates:
-                    st.session_state.log_messages.append(f"❌ Error cargando página {page}")
-                break
-            
-            # Extraer enlaces de listados de esta página
-            listings = self._extract_listing_links(soup)
-            
-            if not listings:
-                self.logger.info(f"🏁 No se encontraron más listados en página {page}")
-                if realtime_updates:
-                    st.session_state.log_messages.append(f"🏁 Fin de resultados en página {page}")
-                break
-            
-            self.logger.info(f"🔍 Encontrados {len(listings)} listados en página {page}")
-            if realtime_updates:
-                st.session_state.log_messages.append(f"🔍 Encontrados {len(listings)} anuncios en página {page}")
-            
-            # Procesar cada listado individual
-            page_particulares = 0
-            for i, listing_url in enumerate(listings, 1):
-                # Verificar interrupción antes de procesar cada listado
-                if self._should_stop_search():
-                    self.logger.info(f"🛑 Búsqueda interrumpida durante procesamiento de listado {i} en página {page}")
-                    return results  # Retornar resultados obtenidos hasta ahora
+                if not listings:
+                    self.logger.info(f"🏁 No se encontraron más listados en página {page}")
+                    checkpoint.complete()
+                    break
+                
+                # Descargar en segundo plano la(s) página(s) siguiente(s) mientras se procesan las fichas
+                prefetcher.schedule_after(page, max_pages)
+                
+                self.logger.info(f"🔍 Encontrados {len(listings)} listados en página {page}")
                 
-                progress_msg = f"Procesando listado {i}/{len(listings)} de página {page}"
-                self.logger.debug(f"{progress_msg}: {listing_url}")
+                # Fichas ya procesadas (checkpoint o, en un lote, otra ubicación) ni se descargan ni se precargan en pestañas
+                listings = [listing_url for listing_url in listings if not checkpoint.is_processed(listing_url)]
                 
-                listing_data = self.scrape_listing(listing_url)
-                if listing_data:
-                    results.append(listing_data)
-                    page_particulares += 1
-                    total_particulares += 1
+                # Procesar cada listado individual
+                page_particulares = 0
+                prefetch_cache = {'soups': {}, 'attempted': set()}
+                for i, listing_url in enumerate(listings, 1):
+                    # Verificar interrupción antes de procesar cada listado
+                    if self._should_stop_search():
+                        self.logger.info(f"🛑 Búsqueda interrumpida durante procesamiento de listado {i} en página {page}")
+                        return
                     
-                    # Actualización en tiempo real
-                    if realtime_updates:
-                        st.session_state.listings_found = total_particulares
-                        st.session_state.log_messages.append(f"✅ Particular #{total_particulares}: {listing_data.get('titulo', 'Sin título')[:50]}...")
+                    progress_msg = f"Procesando listado {i}/{len(listings)} de página {page}"
+                    self.logger.debug(f"{progress_msg}: {listing_url}")
                     
-                    self.logger.info(f"✅ Particular encontrado ({total_particulares} total): {listing_data.get('titulo', 'Sin título')}")
-                else:
-                    self.logger.debug(f"❌ Descartado (no particular): {listing_url}")
+                    prefetched = self._get_prefetched_soup(listings, i - 1, prefetch_cache)
+                    listing_data = self.scrape_listing(listing_url, soup=prefetched)
+                    checkpoint.record_listing(listing_url, listing_data)
+                    if listing_data:
+                        yield listing_data
+                        page_particulares += 1
+                        total_particulares += 1
+                        self.logger.info(f"✅ Particular encontrado ({total_particulares} total): {listing_data.get('titulo', 'Sin título')}")
+                    else:
+                        self.logger.debug(f"❌ Descartado (no particular): {listing_url}")
+                    
+                    total_processed += 1
+                    
+                    # Delay entre listados para evitar detección (las pestañas ya respetan su propia cortesía)
+                    if prefetched is None:
+                        self.behavior.listing_pause(selenium_stealth)
                 
-                total_processed += 1
+                self.logger.info(f"📊 Página {page} completada: {page_particulares} particulares de {len(listings)} listados")
+                page += 1
+                checkpoint.advance(page)
                 
-                # Delay entre listados para evitar detección
-                time.sleep(random.uniform(1, 3))
-            
-            self.logger.info(f"📊 Página {page} completada: {page_particulares} particulares de {len(listings)} listados")
-            if realtime_updates:
-                st.session_state.log_messages.append(f"📊 Página {page}: {page_particulares} particulares de {len(listings)} anuncios")
-            
-            page += 1
-            
-            # Delay entre páginas
-            time.sleep(random.uniform(3, 6))
+                # Delay entre páginas
+                self.behavior.page_pause(selenium_stealth)
+        finally:
+            prefetcher.close()
+        
+        self.logger.info(f"⏱️ Tiempos {self.name}: {self.behavior.get_stats(selenium_stealth)} - "
+                         f"cortesía: {politeness.get(self.name).get_metrics()} - "
+                         f"precarga de páginas: {prefetcher.stats}")
         
         if not self._should_stop_search():
             self.logger.info(f"🎯 Búsqueda completada en {self.name}: {total_particulares} particulares de {total_processed} listados procesados")
-            if realtime_updates:
-                st.session_state.log_messages.append(f"🎯 {self.name} completado: {total_particulares} particulares encontrados")
         else:
             self.logger.info(f"🛑 Búsqueda interrumpida en {self.name}: {total_particulares} particulares de {total_processed} listados procesados hasta la interrupción")
-            if realtime_updates:
-                st.session_state.log_messages.append(f"🛑 {self.name} interrumpido: {total_particulares} particulares guardados")
-        
+    
+    def search_listings_realtime(self, search_params: Dict, checkpoint: Optional[CrawlCheckpoint] = None,
+                                 context: Optional[CrawlContext] = None) -> List[Dict]:
+        """Compatibilidad: las actualizaciones en tiempo real llegan ahora por el CrawlContext"""
+        return self.search_listings(search_params, checkpoint, context)
+    
+    def _extract_listing_summaries(self, soup: BeautifulSoup) -> List[Dict]:
+        """Enlaces de la página de resultados con el precio mostrado en el listado si el portal lo permite"""
+        return [{'url': url, 'price': None} for url in self._extract_listing_links(soup)]
+    
+    def search_listings_two_phase(self, search_params: Dict, known_listings: Optional[Dict[str, Dict]] = None,
+                                  stale_after_days: float = 7.0,
+                                  checkpoint: Optional[CrawlCheckpoint] = None,
+                                  context: Optional[CrawlContext] = None) -> List[Dict]:
+        """Rastreo en dos fases devolviendo la lista completa (ver iter_listings_two_phase)"""
+        checkpoint = checkpoint or CrawlCheckpoint(self.name, search_params, persist=False)
+        results = list(checkpoint.results)
+        results.extend(self.iter_listings_two_phase(search_params, known_listings, stale_after_days, checkpoint,
+                                                    context))
         return results
     
+    def iter_listings_two_phase(self, search_params: Dict, known_listings: Optional[Dict[str, Dict]] = None,
+                                stale_after_days: float = 7.0,
+                                checkpoint: Optional[CrawlCheckpoint] = None,
+                                context: Optional[CrawlContext] = None) -> Iterator[Dict]:
+        """
+        Rastreo en dos fases: descubrir todas las páginas y después descargar fichas por prioridad
+        
+        Args:
+            search_params: Parámetros de búsqueda (max_pages limita la fase de descubrimiento)
+            known_listings: Anuncios ya guardados {url: {'price', 'updated'}} (ExcelManager.get_known_listings)
+            stale_after_days: Días tras los que un anuncio conocido vuelve a revisarse
+            checkpoint: Checkpoint de la búsqueda; uno nuevo (no reanudado) descarta la frontera anterior
+            context: Cancelación, progreso y log del rastreo
+        """
+        self.context = context or CrawlContext()
+        if checkpoint and checkpoint.completed:
+            return
+        
+        frontier_path = UrlFrontier.path_for(self.name, search_params)
+        if checkpoint and not checkpoint.resumed:
+            UrlFrontier(frontier_path).clear()
+        frontier = UrlFrontier.load(frontier_path, known_listings, stale_after_days)
+        crawler = TwoPhaseCrawler(self, frontier, checkpoint=checkpoint,
+                                  listing_pause=partial(self.behavior.listing_pause, selenium_stealth))
+        yield from crawler.iter_run(search_params, search_params.get('max_pages', 999))
+    
+    def _update_current_page(self, page: int):
+        """Notificar la página de resultados en curso"""
+        self.context.progress(self.name, page)
+    
     def _should_stop_search(self) -> bool:
-        """Verificar si se debe parar la búsqueda (desde Streamlit session_state)"""
-        try:
-            # Intentar importar streamlit y verificar session_state
-            import streamlit as st
-            return st.session_state.get('stop_search', False)
-        except (ImportError, RuntimeError, AttributeError):
-            # Si no está disponible streamlit o session_state, continuar normalmente
-            return False
+        """Verificar si se solicitó parar la búsqueda (token de cancelación del contexto)"""
+        return self.context.cancelled()
     
-    def scrape_listing(self, url: str) -> Optional[Dict]:
-        """Scraper listado individual usando Selenium"""
+    def scrape_listing(self, url: str, soup: Optional[BeautifulSoup] = None) -> Optional[Dict]:
+        """Scraper listado individual usando Selenium (soup = ficha ya descargada, p.ej. en pestañas)"""
         self.logger.debug(f"🔍 Analizando detalle con Selenium: {url}")
         
-        soup = self._make_request(url)
+        if soup is None:
+            soup = self._make_request(url)
+        else:
+            self._page_source = 'tab'
         if not soup:
             self.logger.warning(f"⚠️ No se pudo cargar la página: {url}")
             return None
+        metrics.inc('listings_parsed_total', portal=self.name.lower())
         
         # Verificar si es particular antes de extraer datos
         if not self._is_particular(soup):
@@ -320,7 +439,8 @@ class SeleniumBaseScraper(ABC):
         self.logger.debug(f"✅ Es particular, extrayendo datos: {url}")
         
         try:
-            data = self._extract_listing_data(soup)
+            with instrumentation.span('extraction', self.name):
+                data = self._extract_listing_data(soup)
             data['url'] = url
             data['portal'] = self.name
             data['method'] = 'selenium'  # Marcar como obtenido por Selenium
@@ -360,6 +480,7 @@ class SeleniumBaseScraper(ABC):
         """Cerrar sesión Selenium"""
         selenium_stealth.close()
         self.session_pages = 0
+        driver_lifecycle.pages = 0
         self.logger.info("🔒 Sesión Selenium cerrada")
     
     def __del__(self):
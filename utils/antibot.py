@@ -7,14 +7,23 @@ Incluye rotación de User-Agents, headers realistas, delays aleatorios, etc.
 import random
 import time
 import json
+import threading
 from typing import Dict, List, Optional
 import requests
-from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
+from utils.http_pool import connection_layer
+from utils.session_store import session_store, portal_key
+from utils.politeness import politeness
+from utils.circuit_breaker import circuit_breakers
+from utils.instrumentation import instrumentation
+from utils.metrics import metrics
 
 class AntiBotManager:
     """Gestor de técnicas anti-detección para web scraping"""
     
+    # Escalera de técnicas HTTP, cada una con su circuit breaker por portal
+    HTTP_TECHNIQUES = ('http', 'cloudscraper', 'manual_bypass')
+    
     def __init__(self):
         self.user_agents = [
             # Chrome en Windows
@@ -46,6 +55,19 @@ class AntiBotManager:
         self.min_delay = 3.0  # Delay más largo para Idealista
         self.max_delay = 8.0  # Delay máximo aumentado
         
+        # Sesiones de navegador importadas: User-Agent fijado por dominio (la clearance va ligada a él)
+        self.pinned_user_agents = {}
+        self._browser_sessions_checked = set()
+        
+        # Sesiones de respaldo por dominio (conservan clearance y conexiones keep-alive)
+        self._pool_lock = threading.Lock()
+        self._cloudscrapers = {}
+        self._fallback_sessions = {}
+        self.session_pool_stats = {
+            'cloudscraper': {'created': 0, 'reused': 0, 'invalidated': 0},
+            'manual_bypass': {'created': 0, 'reused': 0, 'invalidated': 0},
+        }
+        
     def get_random_user_agent(self) -> str:
         """Obtener un User-Agent aleatorio"""
         return random.choice(self.user_agents)
@@ -72,8 +94,34 @@ class AntiBotManager:
             
         return headers
     
-    def apply_random_delay(self):
-        """Aplicar delay aleatorio entre requests"""
+    def detect_block(self, status_code: int, text: str = '') -> Optional[str]:
+        """
+        Detectar si una respuesta es una página de bloqueo
+        
+        Returns:
+            Tipo de bloqueo ('403', '429', 'datadome', 'captcha') o None si la página es válida
+        """
+        if status_code in (403, 429):
+            return str(status_code)
+        
+        text = text or ''
+        if 'captcha-delivery.com' in text:
+            return 'datadome'
+        
+        # Las páginas de desafío son pequeñas; un anuncio real puede incluir reCAPTCHA en su formulario
+        captcha_markers = ('g-recaptcha', 'h-captcha', '/cdn-cgi/challenge-platform', 'cf-chl-')
+        if len(text) < 20000 and any(marker in text for marker in captcha_markers):
+            return 'captcha'
+        
+        return None
+    
+    def apply_random_delay(self, url: Optional[str] = None):
+        """Aplicar delay entre requests (adaptativo por portal si se indica la URL)"""
+        if url:
+            politeness.get(url).wait()
+            self.last_request_time = time.time()
+            return
+        
         current_time = time.time()
         time_since_last = current_time - self.last_request_time
         
@@ -91,8 +139,6 @@ class AntiBotManager:
         if self.session:
             return self.session
             
-        session = requests.Session()
-        
         # Configurar retry strategy
         retry_strategy = Retry(
             total=3,
@@ -100,9 +146,8 @@ class AntiBotManager:
             status_forcelist=[429, 500, 502, 503, 504],
         )
         
-        adapter = HTTPAdapter(max_retries=retry_strategy)
-        session.mount("http://", adapter)
-        session.mount("https://", adapter)
+        # Pool de conexiones común (tamaño por host, keep-alive, HTTP/2 opcional)
+        session = connection_layer.new_session(max_retries=retry_strategy)
         
         # Headers por defecto
         session.headers.update(self.get_realistic_headers())
@@ -110,21 +155,75 @@ class AntiBotManager:
         self.session = session
         return session
     
+    def import_cookies(self, cookies: List[Dict], user_agent: Optional[str] = None) -> int:
+        """
+        Importar cookies de un navegador (formato Selenium o CDP) en la sesión de requests
+        
+        Args:
+            cookies: Lista de cookies exportadas por SeleniumStealth
+            user_agent: User-Agent del navegador que obtuvo las cookies; se fija para
+                los dominios de esas cookies
+        
+        Returns:
+            Número de cookies importadas
+        """
+        session = self.create_session()
+        imported = 0
+        
+        for cookie in cookies or []:
+            if not cookie.get('name'):
+                continue
+            
+            expires = cookie.get('expiry') or cookie.get('expires')
+            session.cookies.set(
+                cookie['name'],
+                cookie.get('value', ''),
+                domain=cookie.get('domain', ''),
+                path=cookie.get('path', '/'),
+                secure=cookie.get('secure', False),
+                expires=int(expires) if expires and expires > 0 else None,
+            )
+            imported += 1
+            
+            if user_agent and cookie.get('domain'):
+                self.pinned_user_agents[session_store.domain_key(cookie['domain'].lstrip('.'))] = user_agent
+        
+        return imported
+    
+    def load_browser_session(self, url: str) -> bool:
+        """Cargar en la sesión HTTP las cookies guardadas por el navegador para este portal"""
+        state = session_store.load(url)
+        if not state or not state.get('cookies'):
+            return False
+        
+        imported = self.import_cookies(state['cookies'], state.get('user_agent'))
+        print(f"🍪 Sesión de navegador importada para {state['domain']}: {imported} cookies")
+        return imported > 0
+    
+    @instrumentation.timed('http_request')
     def make_request(self, url: str, method: str = 'GET', **kwargs) -> Optional[requests.Response]:
         """Realizar request con todas las técnicas anti-detección"""
         
-        # Aplicar delay
-        self.apply_random_delay()
+        # Aplicar delay (controlador de cortesía del portal)
+        self.apply_random_delay(url)
         
         # Crear/obtener sesión
         session = self.create_session()
         
+        # Reutilizar la sesión guardada por el navegador la primera vez que se visita el dominio
+        domain = session_store.domain_key(url)
+        if domain not in self._browser_sessions_checked:
+            self._browser_sessions_checked.add(domain)
+            self.load_browser_session(url)
+        
         # Actualizar headers para este request
         if 'headers' not in kwargs:
             kwargs['headers'] = {}
         
         # Merge con headers realistas
         realistic_headers = self.get_realistic_headers()
+        if domain in self.pinned_user_agents:
+            realistic_headers['User-Agent'] = self.pinned_user_agents[domain]
         realistic_headers.update(kwargs['headers'])
         kwargs['headers'] = realistic_headers
         
@@ -132,28 +231,108 @@ class AntiBotManager:
         if 'timeout' not in kwargs:
             kwargs['timeout'] = 30
         
-        try:
-            response = session.request(method, url, **kwargs)
-            
-            # Verificar si la respuesta indica bloqueo
-            if response.status_code == 403:
-                # Intentar con cloudscraper si está disponible
-                return self._try_cloudscraper(url, method, **kwargs)
-            
-            return response
+        # Escalera de técnicas: empieza por la última que funcionó y omite las de circuito abierto
+        techniques = circuit_breakers.plan(url, self.HTTP_TECHNIQUES)
+        
+        response = None
+        for technique in techniques:
+            # Otro hilo pudo reservar el intento de prueba desde que se ordenó la escalera
+            if not circuit_breakers.allow(url, technique):
+                continue
+            attempt_kwargs = dict(kwargs, headers=dict(kwargs['headers']))
+            if technique == 'http':
+                response = self._try_session_request(session, url, method, **attempt_kwargs)
+            elif technique == 'cloudscraper':
+                response = self._try_cloudscraper(url, method, **attempt_kwargs)
+            else:
+                response = self._try_manual_bypass(url, method, **attempt_kwargs)
             
+            blocked = self._register_outcome(url, response)
+            circuit_breakers.record(url, technique, not blocked)
+            outcome = 'error' if response is None else ('blocked' if blocked else 'ok')
+            metrics.inc('http_attempts_total', portal=portal_key(url), technique=technique, outcome=outcome)
+            if not blocked:
+                metrics.inc('pages_fetched_total', portal=portal_key(url), method=technique)
+                return response
+        
+        return response
+    
+    def _try_session_request(self, session: requests.Session, url: str, method: str = 'GET',
+                             **kwargs) -> Optional[requests.Response]:
+        """Request con la sesión principal"""
+        try:
+            return session.request(method, url, **kwargs)
         except Exception as e:
             print(f"Error en request normal: {e}")
-            # Intentar con cloudscraper como fallback
-            return self._try_cloudscraper(url, method, **kwargs)
+            return None
+    
+    def _register_outcome(self, url: str, response: Optional[requests.Response]) -> bool:
+        """
+        Ajustar el ritmo del portal según la respuesta
+        
+        Returns:
+            True si la respuesta es un bloqueo o no hubo respuesta (pasar a la siguiente técnica)
+        """
+        if response is None:
+            return True
+        
+        block = self.detect_block(response.status_code, response.text)
+        if block:
+            politeness.get(url).record_block(block)
+            return True
+        
+        if response.status_code == 200:
+            politeness.get(url).record_success()
+        return False
+    
+    def _pooled_session(self, pool: Dict, kind: str, url: str, factory):
+        """
+        Obtener la sesión del dominio de un pool, creándola con factory() si no existe
+        
+        Returns:
+            Tupla (sesión, creada)
+        """
+        domain = session_store.domain_key(url)
+        with self._pool_lock:
+            session = pool.get(domain)
+            if session is not None:
+                self.session_pool_stats[kind]['reused'] += 1
+                return session, False
+        
+        session = factory()
+        with self._pool_lock:
+            pool[domain] = session
+            self.session_pool_stats[kind]['created'] += 1
+        print(f"🆕 Sesión {kind} creada para {domain} - pool: {self.session_pool_stats[kind]}")
+        return session, True
+    
+    def invalidate_sessions(self, url: str, kind: Optional[str] = None):
+        """Descartar las sesiones de respaldo del dominio tras detectar un bloqueo"""
+        domain = session_store.domain_key(url)
+        pools = {'cloudscraper': self._cloudscrapers, 'manual_bypass': self._fallback_sessions}
+        for pool_kind, pool in pools.items():
+            if kind and pool_kind != kind:
+                continue
+            with self._pool_lock:
+                session = pool.pop(domain, None)
+                if session is not None:
+                    self.session_pool_stats[pool_kind]['invalidated'] += 1
+            if session is not None:
+                session.close()
+                print(f"🗑️ Sesión {pool_kind} invalidada para {domain} - pool: {self.session_pool_stats[pool_kind]}")
+    
+    def get_session_pool_stats(self) -> Dict:
+        """Creaciones, reutilizaciones e invalidaciones de las sesiones de respaldo"""
+        with self._pool_lock:
+            return {kind: dict(stats) for kind, stats in self.session_pool_stats.items()}
     
     def _try_cloudscraper(self, url: str, method: str = 'GET', **kwargs) -> Optional[requests.Response]:
         """Intentar request con cloudscraper para evadir Cloudflare"""
         try:
             import cloudscraper
             
-            # Crear scraper con configuración más agresiva
-            scraper = cloudscraper.create_scraper(
+            # Scraper por dominio con configuración más agresiva: conserva las cookies del desafío resuelto
+            scraper, _ = self._pooled_session(self._cloudscrapers, 'cloudscraper', url, lambda: cloudscraper.create_scraper(
                 browser={
                     'browser': 'chrome',
                     'platform': 'windows',
@@ -164,10 +343,10 @@ class AntiBotManager:
                 captcha={
                     'provider': 'return_response'
                 }
-            )
+            ))
             
             # Aplicar delay también aquí
-            self.apply_random_delay()
+            self.apply_random_delay(url)
             
             # Headers adicionales para cloudscraper
             scraper_headers = {
@@ -193,6 +372,9 @@ class AntiBotManager:
             response = scraper.request(method, url, **kwargs)
             print(f"Cloudscraper response: {response.status_code}")
             
+            if self.detect_block(response.status_code, response.text):
+                self.invalidate_sessions(url, 'cloudscraper')
+            
             return response
             
         except ImportError:
@@ -200,16 +382,13 @@ class AntiBotManager:
             return None
         except Exception as e:
             print(f"Error con cloudscraper: {e}")
-            # Intentar técnica manual adicional
-            return self._try_manual_bypass(url, method, **kwargs)
+            return None
     
     def _try_manual_bypass(self, url: str, method: str = 'GET', **kwargs) -> Optional[requests.Response]:
         """Técnica manual adicional para evadir bloqueos"""
         try:
-            import time
-            
-            # Crear nueva sesión completamente limpia
-            session = requests.Session()
+            # Sesión de respaldo del dominio (limpia solo la primera vez o tras un bloqueo)
+            session, created = self._pooled_session(self._fallback_sessions, 'manual_bypass', url, connection_layer.new_session)
             
             # Headers que imitan completamente un navegador Chrome real
             ultra_realistic_headers = {
@@ -233,22 +412,26 @@ class AntiBotManager:
             # Simular comportamiento humano más realista
             base_domain = '/'.join(url.split('/')[:3])
             
-            # Paso 1: Visitar página principal con delay realista
-            print("🌐 Visitando página principal...")
-            session.get(base_domain, headers=ultra_realistic_headers, timeout=30)
-            time.sleep(random.uniform(2, 4))
+            # Paso 1: Visitar página principal con delay realista (solo con sesión nueva)
+            if created:
+                print("🌐 Visitando página principal...")
+                session.get(base_domain, headers=ultra_realistic_headers, timeout=30)
+                time.sleep(random.uniform(2, 4))
+                
+                # Paso 2: Simular navegación gradual
+                print("🔍 Simulando navegación...")
+                time.sleep(random.uniform(1, 3))
             
-            # Paso 2: Simular navegación gradual
-            print("🔍 Simulando navegación...")
             ultra_realistic_headers['Referer'] = base_domain
             ultra_realistic_headers['Sec-Fetch-Site'] = 'same-origin'
             
-            time.sleep(random.uniform(1, 3))
-            
             # Paso 3: Request final con toda la cadena de navegación
             response = session.request(method, url, headers=ultra_realistic_headers, timeout=30)
             print(f"Manual bypass response: {response.status_code}")
             
+            if self.detect_block(response.status_code, response.text):
+                self.invalidate_sessions(url, 'manual_bypass')
+            
             return response
             
         except Exception as e:
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Política de simulación humana por portal
+Reparte un presupuesto de tiempo de simulación (scroll, ratón, pausas) por sesión
+de navegador en lugar de gastarlo íntegro en cada página: intensa al inicio de la
+sesión y ligera después. Contabiliza por separado el tiempo de simulación, de
+pausas y de descarga para poder ajustarla.
+"""
+
+import time
+import random
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional
+from utils.session_store import portal_key
+
+
+class BehaviorPolicy:
+    """Presupuesto de simulación humana de un portal para la sesión de navegador actual"""
+
+    LEVELS = ('full', 'light', 'none')
+
+    def __init__(self, portal: str, warmup_pages: int = 3, full_every: int = 0,
+                 session_budget: float = 180.0, listing_pause: tuple = (1.0, 3.0),
+                 page_pause: tuple = (3.0, 6.0), steady_listing_pause: Optional[tuple] = None,
+                 steady_page_pause: Optional[tuple] = None):
+        """
+        Args:
+            portal: Nombre del portal (clave de scraper_settings)
+            warmup_pages: Navegaciones iniciales de la sesión con simulación completa
+            full_every: Tras el calentamiento, simulación completa cada N navegaciones (0 = nunca)
+            session_budget: Segundos máximos de simulación por sesión; agotados, no se simula más
+            listing_pause: Pausa (min, max) entre anuncios durante el calentamiento
+            page_pause: Pausa (min, max) entre páginas de resultados durante el calentamiento
+            steady_listing_pause: Pausa entre anuncios tras el calentamiento (None = igual que listing_pause)
+            steady_page_pause: Pausa entre páginas tras el calentamiento (None = igual que page_pause)
+        """
+        self.portal = portal
+        self.warmup_pages = warmup_pages
+        self.full_every = full_every
+        self.session_budget = session_budget
+        self.listing_pause_range = tuple(listing_pause)
+        self.page_pause_range = tuple(page_pause)
+        self.steady_listing_pause = tuple(steady_listing_pause or listing_pause)
+        self.steady_page_pause = tuple(steady_page_pause or page_pause)
+
+        self._lock = threading.Lock()
+        self.totals = {'simulation': 0.0, 'pause': 0.0, 'fetch': 0.0}
+        self.sessions = 0
+        # Estado de sesión por navegador (owner = instancia de SeleniumStealth): el navegador
+        # de revelado de teléfonos no reinicia ni consume el presupuesto del principal
+        self._sessions: Dict[int, Dict] = {}
+
+    def _session(self, owner=None) -> Dict:
+        """Estado de la sesión del navegador owner (se crea en calentamiento); llamar con el lock"""
+        session = self._sessions.get(id(owner))
+        if session is None:
+            session = self._sessions[id(owner)] = {'pages': 0, 'simulation': 0.0}
+            self.sessions += 1
+        return session
+
+    def reset_session(self, owner=None):
+        """Empezar una nueva sesión en el navegador owner (nuevo driver): vuelve su calentamiento"""
+        with self._lock:
+            self._sessions.pop(id(owner), None)
+            self._session(owner)
+
+    def end_session(self, owner=None):
+        """Olvidar la sesión del navegador owner (cerrado): su id() puede reutilizarse en otro"""
+        with self._lock:
+            self._sessions.pop(id(owner), None)
+
+    def record_page(self, owner=None):
+        """Registrar una navegación de la sesión"""
+        with self._lock:
+            self._session(owner)['pages'] += 1
+
+    def warming_up(self, owner=None) -> bool:
+        with self._lock:
+            return self._session(owner)['pages'] <= self.warmup_pages
+
+    def session_simulation(self, owner=None) -> float:
+        """Segundos de simulación gastados en la sesión actual del navegador owner"""
+        with self._lock:
+            return self._session(owner)['simulation']
+
+    def next_level(self, owner=None) -> str:
+        """Nivel de simulación a aplicar en la navegación actual: 'full', 'light' o 'none'"""
+        with self._lock:
+            session = dict(self._session(owner))
+        return self._level(session)
+
+    def _level(self, session: Dict) -> str:
+        if session['simulation'] >= self.session_budget:
+            return 'none'
+        if session['pages'] <= self.warmup_pages:
+            return 'full'
+        if self.full_every and session['pages'] % self.full_every == 0:
+            return 'full'
+        return 'light'
+
+    @contextmanager
+    def track(self, kind: str, owner=None):
+        """Medir un bloque de tiempo y acumularlo en 'simulation', 'pause' o 'fetch'"""
+        started = time.time()
+        try:
+            yield
+        finally:
+            elapsed = time.time() - started
+            with self._lock:
+                self.totals[kind] = self.totals.get(kind, 0.0) + elapsed
+                if kind == 'simulation':
+                    self._session(owner)['simulation'] += elapsed
+
+    def record_fetch(self, seconds: float):
+        """Acumular tiempo de descarga (navegación sin la simulación)"""
+        with self._lock:
+            self.totals['fetch'] += max(seconds, 0.0)
+
+    def listing_pause(self, owner=None):
+        """Pausa entre anuncios según la fase de la sesión del navegador owner"""
+        pause_range = self.listing_pause_range if self.warming_up(owner) else self.steady_listing_pause
+        with self.track('pause', owner):
+            time.sleep(random.uniform(*pause_range))
+
+    def page_pause(self, owner=None):
+        """Pausa entre páginas de resultados según la fase de la sesión del navegador owner"""
+        pause_range = self.page_pause_range if self.warming_up(owner) else self.steady_page_pause
+        with self.track('pause', owner):
+            time.sleep(random.uniform(*pause_range))
+
+    def get_stats(self, owner=None) -> Dict:
+        """Tiempos acumulados para logging/ajuste (sesión: la del navegador owner)"""
+        with self._lock:
+            session = dict(self._sessions.get(id(owner)) or {'pages': 0, 'simulation': 0.0})
+        return {
+            'portal': self.portal,
+            'sessions': self.sessions,
+            'session_pages': session['pages'],
+            'level': self._level(session),
+            'simulation_s': round(self.totals['simulation'], 1),
+            'pause_s': round(self.totals['pause'], 1),
+            'fetch_s': round(self.totals['fetch'], 1),
+            'session_budget_left_s': round(max(self.session_budget - session['simulation'], 0.0), 1),
+        }
+
+
+class BehaviorPolicyRegistry:
+    """Políticas por portal, creadas bajo demanda y configurables desde scraper_settings"""
+
+    def __init__(self):
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self._policies: Dict[str, BehaviorPolicy] = {}
+        self._settings: Dict[str, Dict] = {}
+
+    def configure(self, portal: str, settings: Optional[Dict]):
+        """Aplicar la sección 'behavior' de scraper_settings.<portal> (recrea la política)"""
+        key = portal_key(portal)
+        self._settings[key] = dict(settings or {})
+        self._policies.pop(key, None)
+
+    def get(self, portal_or_url: str) -> BehaviorPolicy:
+        """Obtener (o crear) la política del portal"""
+        key = portal_key(portal_or_url)
+        if key not in self._policies:
+            try:
+                self._policies[key] = BehaviorPolicy(key, **self._settings.get(key, {}))
+            except TypeError as e:
+                self.logger.warning(f"Configuración 'behavior' no válida para {key}: {e}")
+                self._policies[key] = BehaviorPolicy(key)
+        return self._policies[key]
+
+    def reset_sessions(self, owner=None):
+        """Nuevo driver en el navegador owner: sus sesiones vuelven a la fase de calentamiento"""
+        for policy in self._policies.values():
+            policy.reset_session(owner)
+
+    def end_sessions(self, owner=None):
+        """Navegador owner cerrado: descartar sus sesiones en todos los portales"""
+        for policy in self._policies.values():
+            policy.end_session(owner)
+
+    def get_stats(self, owner=None) -> Dict[str, Dict]:
+        return {key: policy.get_stats(owner) for key, policy in self._policies.items()}
+
+
+# Instancia global para reutilizar
+behavior_policies = BehaviorPolicyRegistry()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Traspaso navegador → HTTP
+Selenium solo resuelve el desafío anti-bot; sus cookies de clearance y su User-Agent
+se trasplantan a una sesión requests por dominio que descarga las siguientes páginas
+hasta detectar un bloqueo, momento en el que Selenium vuelve a obtener clearance.
+"""
+
+import logging
+import threading
+from typing import Dict, Optional
+import requests
+from utils.antibot import antibot_manager
+from utils.http_pool import connection_layer
+from utils.politeness import politeness
+from utils.selenium_stealth import selenium_stealth
+from utils.session_store import session_store
+
+
+class BrowserHandoff:
+    """Pool de sesiones HTTP por dominio alimentadas con la clearance del navegador"""
+
+    # Códigos que indican que la clearance ya no vale (además de los bloqueos de detect_block)
+    BLOCK_STATUSES = (401, 403, 429)
+
+    def __init__(self, stealth=selenium_stealth, max_pages: int = 25, max_failed_handoffs: int = 3,
+                 timeout: int = 30):
+        """
+        Args:
+            stealth: Instancia de SeleniumStealth de la que tomar cookies y User-Agent
+            max_pages: Páginas HTTP por clearance antes de volver a pasar por el navegador
+            max_failed_handoffs: Traspasos consecutivos bloqueados en la primera página
+                tras los que se desactiva el traspaso para ese dominio
+            timeout: Timeout de las peticiones HTTP
+        """
+        self.stealth = stealth
+        self.enabled = True
+        self.max_pages = max_pages
+        self.max_failed_handoffs = max_failed_handoffs
+        self.timeout = timeout
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+        self._lock = threading.Lock()
+        self.sessions: Dict[str, requests.Session] = {}
+        self.pages: Dict[str, int] = {}  # Páginas servidas por la clearance actual
+        self.failed_handoffs: Dict[str, int] = {}
+        self.stats = {'transplants': 0, 'http_pages': 0, 'blocks': {}}
+
+    def _is_disabled_for(self, domain: str) -> bool:
+        return not self.enabled or self.failed_handoffs.get(domain, 0) >= self.max_failed_handoffs
+
+    def has_clearance(self, url: str) -> bool:
+        """Hay una sesión HTTP con clearance vigente para el dominio"""
+        domain = session_store.domain_key(url)
+        return (domain in self.sessions and not self._is_disabled_for(domain)
+                and self.pages.get(domain, 0) < self.max_pages)
+
+    def transplant(self, url: str) -> bool:
+        """
+        Copiar cookies y User-Agent del navegador a una sesión requests para el dominio
+
+        Llamar justo después de que Selenium haya cargado y validado una página del portal.
+        """
+        domain = session_store.domain_key(url)
+        if self._is_disabled_for(domain) or not self.stealth.driver:
+            return False
+
+        cookies = session_store.filter_cookies(self.stealth.export_cookies(), url)
+        if not cookies:
+            return False
+
+        try:
+            user_agent = self.stealth.driver.execute_script("return navigator.userAgent;")
+        except Exception:
+            user_agent = self.stealth.user_agent
+        if not user_agent:
+            return False
+
+        session = connection_layer.new_session()
+
+        headers = antibot_manager.get_realistic_headers(referer='/'.join(url.split('/')[:3]) + '/')
+        headers['User-Agent'] = user_agent
+        session.headers.update(headers)
+
+        for cookie in cookies:
+            expires = cookie.get('expiry') or cookie.get('expires')
+            session.cookies.set(
+                cookie['name'], cookie.get('value', ''),
+                domain=cookie.get('domain', ''), path=cookie.get('path', '/'),
+                secure=cookie.get('secure', False),
+                expires=int(expires) if expires and expires > 0 else None,
+            )
+
+        with self._lock:
+            old = self.sessions.pop(domain, None)
+            self.sessions[domain] = session
+            self.pages[domain] = 0
+            self.stats['transplants'] += 1
+        if old:
+            old.close()
+
+        self.logger.info(f"🔀 Clearance del navegador traspasada a HTTP para {domain} ({len(cookies)} cookies)")
+        return True
+
+    def invalidate(self, url: str, reason: str = 'block'):
+        """Descartar la sesión HTTP del dominio (la próxima página volverá a pasar por Selenium)"""
+        domain = session_store.domain_key(url)
+        with self._lock:
+            session = self.sessions.pop(domain, None)
+            # Bloqueo inmediato tras el traspaso: la clearance no es transferible a HTTP
+            if self.pages.get(domain, 0) == 0:
+                self.failed_handoffs[domain] = self.failed_handoffs.get(domain, 0) + 1
+                if self.failed_handoffs[domain] >= self.max_failed_handoffs:
+                    self.logger.warning(f"AVISO: Traspaso a HTTP desactivado para {domain} "
+                                        f"({self.failed_handoffs[domain]} bloqueos inmediatos)")
+            self.stats['blocks'][reason] = self.stats['blocks'].get(reason, 0) + 1
+        if session:
+            session.close()
+            self.logger.info(f"🛡️ Clearance HTTP invalidada para {domain} ({reason})")
+
+    def get(self, url: str, **kwargs) -> Optional[requests.Response]:
+        """
+        Descargar una página con la sesión HTTP del dominio
+
+        Returns:
+            Respuesta válida, o None si no hay clearance vigente, la página está bloqueada
+            (se descarta la sesión) o responde con otro código distinto de 200 (se conserva)
+        """
+        if not self.has_clearance(url):
+            return None
+
+        domain = session_store.domain_key(url)
+        session = self.sessions.get(domain)
+        if session is None:
+            return None
+
+        antibot_manager.apply_random_delay(url)
+        kwargs.setdefault('timeout', self.timeout)
+
+        try:
+            response = session.get(url, **kwargs)
+        except requests.RequestException as e:
+            self.logger.debug(f"Error HTTP con clearance traspasada: {e}")
+            self.invalidate(url, 'error')
+            return None
+
+        block = antibot_manager.detect_block(response.status_code, response.text)
+        if block or response.status_code in self.BLOCK_STATUSES:
+            if block:
+                politeness.get(url).record_block(block)
+            self.invalidate(url, block or str(response.status_code))
+            return None
+
+        # 404/410 de un anuncio retirado, 5xx puntual...: no es un bloqueo, la clearance sigue valiendo
+        if response.status_code != 200:
+            self.logger.debug(f"HTTP {response.status_code} con clearance traspasada: {url}")
+            return None
+
+        politeness.get(url).record_success()
+
+        with self._lock:
+            self.pages[domain] = self.pages.get(domain, 0) + 1
+            self.failed_handoffs[domain] = 0
+            self.stats['http_pages'] += 1
+        return response
+
+    def get_stats(self) -> Dict:
+        """Estadísticas del traspaso para logging/métricas"""
+        return {
+            'transplants': self.stats['transplants'],
+            'http_pages': self.stats['http_pages'],
+            'blocks': dict(self.stats['blocks']),
+            'active_domains': sorted(self.sessions),
+        }
+
+
+# Instancia global para reutilizar
+browser_handoff = BrowserHandoff()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Checkpoints de rastreo reanudables por portal y búsqueda
+Guardan de forma incremental la página actual, las fichas ya procesadas y los
+resultados parciales para que un rerun de Streamlit, el cierre de la pestaña o un
+crash de Chrome no obliguen a recorrer de nuevo las páginas 1..N.
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from typing import Dict, List, Optional, Set
+from utils.session_store import portal_key
+
+
+def search_key(portal: str, search_params: Dict) -> str:
+    """Clave estable de una búsqueda: portal + hash de los parámetros (sin la página)"""
+    params = {k: v for k, v in search_params.items() if k != 'page'}
+    digest = hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode('utf-8')).hexdigest()[:12]
+    return f"{portal_key(portal)}_{digest}"
+
+
+class CrawlCheckpoint:
+    """Estado de rastreo de una búsqueda en un portal, escrito en disco cada pocas fichas y al cambiar de página"""
+
+    def __init__(self, portal: str, search_params: Dict, base_dir: str = os.path.join('data', 'checkpoints'),
+                 persist: bool = True, seen_urls: Optional[Set[str]] = None,
+                 save_every: int = 20, save_interval: float = 10.0):
+        """
+        Args:
+            portal: Nombre del portal (scraper.name)
+            search_params: Parámetros de búsqueda del portal
+            base_dir: Directorio de los checkpoints
+            persist: False = solo en memoria (búsquedas sin checkpoint)
+            seen_urls: Fichas ya procesadas por otras búsquedas del mismo lote (compartido, no se persiste)
+            save_every: Fichas procesadas tras las que se reescribe el checkpoint
+            save_interval: Segundos tras los que se reescribe aunque no se llegue a save_every
+                (tras un crash solo se repiten las fichas posteriores a la última escritura)
+        """
+        self.portal = portal
+        self.search_params = {k: v for k, v in search_params.items() if k != 'page'}
+        self.path = os.path.join(base_dir, f"{search_key(portal, search_params)}.json") if persist else None
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self._lock = threading.Lock()
+
+        self.page = 1  # Página de resultados en curso
+        self.processed = set()  # Fichas ya procesadas (con o sin resultado)
+        self.seen_urls = seen_urls
+        self.results: List[Dict] = []  # Particulares encontrados aún no volcados al Excel
+        self.completed = False
+        self.resumed = False
+        self.updated_at: Optional[float] = None
+
+        self.save_every = save_every
+        self.save_interval = save_interval
+        self._unsaved = 0  # Fichas procesadas desde la última escritura
+
+    @classmethod
+    def start(cls, portal: str, search_params: Dict, **kwargs) -> 'CrawlCheckpoint':
+        """Nuevo rastreo: descarta cualquier checkpoint anterior de la misma búsqueda"""
+        checkpoint = cls(portal, search_params, **kwargs)
+        checkpoint.clear()
+        return checkpoint
+
+    @classmethod
+    def resume(cls, portal: str, search_params: Dict, **kwargs) -> 'CrawlCheckpoint':
+        """Reanudar desde el último checkpoint guardado (nuevo si no existe o está corrupto)"""
+        checkpoint = cls(portal, search_params, **kwargs)
+        if checkpoint.path and os.path.exists(checkpoint.path):
+            try:
+                with open(checkpoint.path, 'r', encoding='utf-8') as f:
+                    checkpoint.restore(json.load(f))
+                checkpoint.resumed = True
+                checkpoint.logger.info(f"📂 Reanudando {portal} desde la página {checkpoint.page} "
+                                       f"({len(checkpoint.processed)} fichas procesadas, "
+                                       f"{len(checkpoint.results)} resultados)")
+            except (OSError, ValueError) as e:
+                checkpoint.logger.warning(f"Checkpoint no válido en {checkpoint.path}, se empieza de cero: {e}")
+        return checkpoint
+
+    def restore(self, data: Dict):
+        self.page = data.get('page', 1)
+        self.processed = set(data.get('processed', []))
+        if self.seen_urls is not None:
+            self.seen_urls.update(self.processed)
+        self.results = list(data.get('results', []))
+        self.completed = data.get('completed', False)
+        self.updated_at = data.get('updated_at')
+
+    def to_dict(self) -> Dict:
+        return {
+            'portal': self.portal,
+            'search_params': self.search_params,
+            'page': self.page,
+            'processed': sorted(self.processed),
+            'results': self.results,
+            'completed': self.completed,
+            'updated_at': self.updated_at,
+        }
+
+    def save(self):
+        """Escribir el checkpoint de forma atómica"""
+        if not self.path:
+            return
+        with self._lock:
+            self.updated_at = time.time()
+            self._unsaved = 0
+            data = self.to_dict()
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = self.path + '.tmp'
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False, default=str)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                self.logger.warning(f"No se pudo guardar el checkpoint {self.path}: {e}")
+
+    def is_processed(self, url: str) -> bool:
+        return url in self.processed or (self.seen_urls is not None and url in self.seen_urls)
+
+    def record_listing(self, url: str, data: Optional[Dict]):
+        """
+        Ficha procesada: guardar el resultado (si es de particular)
+
+        Reescribir el JSON entero en cada ficha cuesta O(n) y O(n²) en un rastreo largo, así
+        que solo se escribe cada save_every fichas o save_interval segundos; advance,
+        mark_persisted y complete escriben siempre.
+        """
+        self.processed.add(url)
+        if self.seen_urls is not None:
+            self.seen_urls.add(url)
+        if data:
+            self.results.append(data)
+        self._unsaved += 1
+        if self._unsaved >= self.save_every or time.time() - (self.updated_at or 0) >= self.save_interval:
+            self.save()
+
+    def mark_persisted(self):
+        """Los resultados acumulados ya están guardados en el Excel: no conservarlos en memoria ni en disco"""
+        self.results = []
+        self.save()
+
+    def advance(self, page: int):
+        """Página de resultados terminada: la siguiente en curso es 'page'"""
+        self.page = page
+        self.save()
+
+    def complete(self):
+        """Rastreo terminado sin interrupciones (pendiente solo de volcar los resultados)"""
+        self.completed = True
+        self.save()
+
+    def clear(self):
+        """Eliminar el checkpoint (resultados ya guardados o búsqueda nueva)"""
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def list_checkpoints(base_dir: str = os.path.join('data', 'checkpoints')) -> List[Dict]:
+    """Resumen de los checkpoints guardados, del más reciente al más antiguo"""
+    if not os.path.isdir(base_dir):
+        return []
+
+    summaries = []
+    for name in os.listdir(base_dir):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(base_dir, name), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        summaries.append({
+            'key': name[:-len('.json')],  # search_key(portal, search_params)
+            'portal': data.get('portal'),
+            'search_params': data.get('search_params', {}),
+            'page': data.get('page', 1),
+            'processed': len(data.get('processed', [])),
+            'results': len(data.get('results', [])),
+            'completed': data.get('completed', False),
+            'updated_at': data.get('updated_at'),
+        })
+    return sorted(summaries, key=lambda s: s['updated_at'] or 0, reverse=True)
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Circuit breaker por portal y técnica anti-bloqueo
+Tras N fallos consecutivos una técnica se abre durante un tiempo de enfriamiento;
+la escalera de técnicas salta directamente a la que funcionó por última vez y,
+si todas están abiertas, el portal queda en pausa sin afectar a los demás.
+"""
+
+import time
+import logging
+import threading
+from typing import Dict, List, Optional
+from utils.session_store import portal_key
+
+
+class CircuitBreaker:
+    """Estado de una técnica en un portal: cerrado, abierto o semiabierto"""
+
+    def __init__(self, failure_threshold: int = 3, cooldown: float = 300.0, trial_timeout: float = 120.0):
+        """
+        Args:
+            failure_threshold: Fallos consecutivos que abren el circuito
+            cooldown: Segundos que el circuito permanece abierto antes de permitir un intento de prueba
+            trial_timeout: Segundos tras los que un intento de prueba sin resultado deja paso a otro
+        """
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.trial_timeout = trial_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_started_at: Optional[float] = None  # Intento de prueba en curso (semiabierto)
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        if time.time() - self.opened_at >= self.cooldown:
+            return 'half_open'
+        return 'open'
+
+    def _trial_in_flight(self) -> bool:
+        return self.trial_started_at is not None and time.time() - self.trial_started_at < self.trial_timeout
+
+    def available(self) -> bool:
+        """Se podría usar la técnica ahora (sin reservar el intento de prueba)"""
+        state = self.state
+        return state == 'closed' or (state == 'half_open' and not self._trial_in_flight())
+
+    def allow(self) -> bool:
+        """
+        Se puede usar la técnica: cerrado, o semiabierto para un único intento de prueba
+
+        En semiabierto el primer llamante reserva el intento; los demás (p. ej. el hilo de
+        precarga) no pasan hasta que se registre su resultado o venza trial_timeout.
+        """
+        if not self.available():
+            return False
+        if self.state == 'half_open':
+            self.trial_started_at = time.time()
+        return True
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_started_at = None
+
+    def record_failure(self) -> bool:
+        """Registrar un fallo; devuelve True si el circuito se (re)abre"""
+        self.failures += 1
+        self.trial_started_at = None
+        # Fallo del intento de prueba (semiabierto) o umbral alcanzado: abrir otro enfriamiento
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.time()
+            return True
+        return False
+
+    def reopens_in(self) -> float:
+        """Segundos hasta que el circuito admita un intento de prueba"""
+        if self.opened_at is None:
+            return 0.0
+        if self._trial_in_flight():
+            return max(self.trial_started_at + self.trial_timeout - time.time(), 0.0)
+        return max(self.opened_at + self.cooldown - time.time(), 0.0)
+
+
+class CircuitBreakerRegistry:
+    """Circuit breakers por (portal, técnica) y memoria de la última técnica que funcionó"""
+
+    def __init__(self, failure_threshold: int = 3, cooldown: float = 300.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self._lock = threading.Lock()
+        self._breakers: Dict[tuple, CircuitBreaker] = {}
+        self.last_success: Dict[str, str] = {}  # portal -> técnica
+
+    def configure(self, failure_threshold: int = 3, cooldown: float = 300.0):
+        """Ajustar umbrales (se aplica a los breakers creados a partir de ahora)"""
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+
+    def _get(self, portal: str, technique: str) -> CircuitBreaker:
+        key = (portal, technique)
+        if key not in self._breakers:
+            self._breakers[key] = CircuitBreaker(self.failure_threshold, self.cooldown)
+        return self._breakers[key]
+
+    def plan(self, url: str, techniques: List[str]) -> List[str]:
+        """
+        Ordenar las técnicas a probar para el portal de la URL
+
+        No reserva nada: la escalera llama a allow() justo antes de usar cada técnica, así
+        que las que no llegan a probarse no bloquean su intento de prueba semiabierto.
+
+        Returns:
+            Técnicas con el circuito cerrado (o semiabierto libre), empezando por la última que
+            funcionó. Lista vacía si todas están abiertas: el portal está en pausa.
+        """
+        portal = portal_key(url)
+        with self._lock:
+            available = [t for t in techniques if self._get(portal, t).available()]
+
+        last = self.last_success.get(portal)
+        if last in available:
+            available.remove(last)
+            available.insert(0, last)
+
+        if not available:
+            self.logger.warning(f"⏸️ {portal} en pausa: todas las técnicas con el circuito abierto "
+                                f"({self.paused_for(url, techniques):.0f}s restantes)")
+        return available
+
+    def allow(self, url: str, technique: str) -> bool:
+        """Reservar la técnica justo antes de usarla (en semiabierto, su único intento de prueba)"""
+        with self._lock:
+            return self._get(portal_key(url), technique).allow()
+
+    def record(self, url: str, technique: str, success: bool):
+        """Registrar el resultado de una técnica"""
+        portal = portal_key(url)
+        with self._lock:
+            breaker = self._get(portal, technique)
+            if success:
+                breaker.record_success()
+                self.last_success[portal] = technique
+                return
+            opened = breaker.record_failure()
+
+        if opened:
+            self.logger.warning(f"🔌 Circuito abierto: {portal}/{technique} durante {breaker.cooldown:.0f}s "
+                                f"({breaker.failures} fallos consecutivos)")
+            if self.last_success.get(portal) == technique:
+                self.last_success.pop(portal, None)
+
+    def paused_for(self, url: str, techniques: List[str]) -> float:
+        """Segundos de pausa restantes del portal (0 si alguna técnica está disponible)"""
+        portal = portal_key(url)
+        with self._lock:
+            waits = [self._get(portal, t).reopens_in() for t in techniques]
+        return min(waits) if waits else 0.0
+
+    def get_stats(self) -> Dict[str, Dict]:
+        """Estado de cada circuito por portal"""
+        stats = {}
+        for (portal, technique), breaker in self._breakers.items():
+            stats.setdefault(portal, {})[technique] = {
+                'state': breaker.state,
+                'failures': breaker.failures,
+                'reopens_in_s': round(breaker.reopens_in(), 1),
+            }
+        for portal, technique in self.last_success.items():
+            stats.setdefault(portal, {})['last_success'] = technique
+        return stats
+
+
+# Instancia global para reutilizar
+circuit_breakers = CircuitBreakerRegistry()
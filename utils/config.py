@@ -39,17 +39,62 @@ class ConfigManager:
                     "idealista": {
                         "enabled": True,
                         "delay": 2.0,
-                        "max_retries": 3
+                        "max_retries": 3,
+                        "prefetch_pages": 1,
+                        "phone_reveal": "inline",
+                        "max_tabs": 1,
+                        "behavior": {
+                            "warmup_pages": 3,
+                            "full_every": 0,
+                            "session_budget": 180,
+                            "listing_pause": [1, 3],
+                            "page_pause": [3, 6],
+                            "steady_listing_pause": [0.5, 1.5],
+                            "steady_page_pause": [2, 4]
+                        },
+                        "politeness": {
+                            "initial_delay": 5.0,
+                            "min_delay": 1.0,
+                            "max_delay": 60.0,
+                            "decrease_step": 0.25,
+                            "backoff_factor": 2.0
+                        }
                     },
                     "fotocasa": {
                         "enabled": True,
                         "delay": 1.5,
-                        "max_retries": 3
+                        "max_retries": 3,
+                        "prefetch_pages": 0,
+                        "network_capture": False,
+                        "behavior": {
+                            "warmup_pages": 3,
+                            "full_every": 0,
+                            "session_budget": 180,
+                            "listing_pause": [1, 3],
+                            "page_pause": [3, 6],
+                            "steady_listing_pause": [0.5, 1.5],
+                            "steady_page_pause": [2, 4]
+                        },
+                        "politeness": {
+                            "initial_delay": 5.0,
+                            "min_delay": 1.0,
+                            "max_delay": 60.0,
+                            "decrease_step": 0.25,
+                            "backoff_factor": 2.0
+                        }
                     },
                     "habitaclia": {
                         "enabled": True,
                         "delay": 1.0,
-                        "max_retries": 3
+                        "max_retries": 3,
+                        "prefetch_pages": 1,
+                        "politeness": {
+                            "initial_delay": 5.0,
+                            "min_delay": 1.0,
+                            "max_delay": 60.0,
+                            "decrease_step": 0.25,
+                            "backoff_factor": 2.0
+                        }
                     }
                 },
                 "ui_settings": {
@@ -61,7 +106,60 @@ class ConfigManager:
                 "file_settings": {
                     "excel_path": "data/viviendas.xlsx",
                     "backup_enabled": True,
-                    "backup_frequency": "daily"
+                    "backup_frequency": "daily",
+                    "stream_batch_size": 5,
+                    "stream_flush_seconds": 10
+                },
+                "browser_settings": {
+                    "profile_pool_dir": None,
+                    "profile_pool_size": 2,
+                    "persist_sessions": True,
+                    "session_max_age_hours": 24,
+                    "handoff_enabled": True,
+                    "handoff_max_pages": 25
+                },
+                "circuit_breaker": {
+                    "failure_threshold": 3,
+                    "cooldown": 300
+                },
+                "connection_settings": {
+                    "pool_connections": 10,
+                    "pool_maxsize": 10,
+                    "pool_block": False,
+                    "keepalive": True,
+                    "keepalive_expiry": 30,
+                    "http2": False,
+                    "dns_cache": False,
+                    "dns_ttl": 300
+                },
+                "scheduler_settings": {
+                    "budget_minutes": 60,
+                    "default_interval_minutes": 1440,
+                    "default_estimate_minutes": 10,
+                    "portals": ["idealista", "fotocasa", "habitaclia"],
+                    "search_params": {
+                        "min_price": 100000,
+                        "max_price": 500000,
+                        "min_rooms": 1,
+                        "max_rooms": 4,
+                        "min_surface": 50,
+                        "max_pages": 999
+                    },
+                    "schedules": [
+                        {"location": "barcelona-barcelona", "interval_minutes": 60},
+                        {"location": "barcelona/anoia", "interval_minutes": 1440}
+                    ]
+                },
+                "batch_settings": {
+                    "locations": [],
+                    "price_bands": [[100000, 500000]]
+                },
+                "metrics_settings": {
+                    "enabled": False,
+                    "textfile": "data/metrics/inmocapt.prom",
+                    "port": None,
+                    "host": "127.0.0.1",
+                    "interval_seconds": 15
                 },
                 "locations": {
                     "suggested_cities": [
@@ -194,6 +292,36 @@ class ConfigManager:
         config = self.get_user_config()
         return config.get('file_settings', {})
     
+    def get_browser_settings(self) -> Dict[str, Any]:
+        """Obtener configuración del navegador (pool de perfiles y persistencia de sesiones)"""
+        config = self.get_user_config()
+        return config.get('browser_settings', {})
+    
+    def get_circuit_breaker_settings(self) -> Dict[str, Any]:
+        """Obtener umbrales de los circuit breakers anti-bloqueo"""
+        config = self.get_user_config()
+        return config.get('circuit_breaker', {})
+    
+    def get_connection_settings(self) -> Dict[str, Any]:
+        """Obtener configuración del pool de conexiones HTTP compartido"""
+        config = self.get_user_config()
+        return config.get('connection_settings', {})
+    
+    def get_scheduler_settings(self) -> Dict[str, Any]:
+        """Obtener calendario de rastreos por zona y presupuesto de tiempo"""
+        config = self.get_user_config()
+        return config.get('scheduler_settings', {})
+    
+    def get_batch_settings(self) -> Dict[str, Any]:
+        """Obtener ubicaciones y franjas de precio por defecto del rastreo por lotes"""
+        config = self.get_user_config()
+        return config.get('batch_settings', {})
+    
+    def get_metrics_settings(self) -> Dict[str, Any]:
+        """Obtener la exportación de métricas de Prometheus (fichero de texto y/o puerto local)"""
+        config = self.get_user_config()
+        return config.get('metrics_settings', {})
+    
     def get_locations(self) -> Dict[str, Any]:
         """Obtener configuración de ubicaciones"""
         config = self.get_user_config()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Contexto explícito de un rastreo
+Sustituye la lectura de st.session_state desde los scrapers: la cancelación llega
+por un token (cualquier objeto tipo Event) y el progreso y los mensajes salen por
+callbacks. Los scrapers no dependen así de Streamlit ni del hilo en el que corren.
+"""
+
+import time
+import logging
+import threading
+from typing import Callable, Dict, Optional
+
+
+class CrawlContext:
+    """Token de cancelación, callback de progreso y destino de log de un rastreo"""
+
+    def __init__(self, cancel_event=None, on_progress: Optional[Callable[..., None]] = None,
+                 log_sink: Optional[Callable[[str], None]] = None,
+                 on_update: Optional[Callable[[Dict], None]] = None, deadline: Optional[float] = None):
+        """
+        Args:
+            cancel_event: threading.Event o multiprocessing.Event (entre procesos); None = uno propio
+            on_progress: Callback on_progress(portal=..., page=...) al empezar cada página de resultados
+            log_sink: Destino de los mensajes de progreso para el usuario (p. ej. CrawlWorker.log o Queue.put)
+            on_update: Callback on_update(listing) para anuncios ya emitidos que se completan después
+                (p. ej. teléfono revelado en diferido): se guardan como actualización, no como hallazgo
+            deadline: Instante (time.time()) a partir del cual el rastreo se da por cancelado (presupuesto)
+        """
+        self.cancel_event = cancel_event if cancel_event is not None else threading.Event()
+        self.on_progress = on_progress
+        self.log_sink = log_sink
+        self.on_update = on_update
+        self.deadline = deadline
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set() or self.expired()
+
+    def expired(self) -> bool:
+        """Se agotó el presupuesto de tiempo del rastreo"""
+        return self.deadline is not None and time.time() >= self.deadline
+
+    def progress(self, portal: str, page: int):
+        """Notificar la página de resultados en curso"""
+        if self.on_progress:
+            try:
+                self.on_progress(portal=portal, page=page)
+            except Exception as e:
+                self.logger.debug(f"Error notificando progreso: {e}")
+
+    def update(self, listing: Dict):
+        """Notificar que un anuncio ya emitido ha cambiado"""
+        if self.on_update:
+            try:
+                self.on_update(listing)
+            except Exception as e:
+                self.logger.debug(f"Error notificando actualización: {e}")
+
+    def log(self, message: str, **fields):
+        """Enviar un mensaje de progreso al destino de log (fields opcionales: portal, page, url)"""
+        if self.log_sink:
+            try:
+                if fields:
+                    self.log_sink(message, **fields)
+                else:
+                    self.log_sink(message)
+            except Exception as e:
+                self.logger.debug(f"Error enviando mensaje de log: {e}")
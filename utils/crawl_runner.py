@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+Orquestación del rastreo sin dependencias de Streamlit
+Creación de managers y scrapers desde la configuración, trabajos por portal con su
+checkpoint y el bucle que guarda los particulares en micro-lotes. Lo usan tanto la
+app de Streamlit (a través del CrawlWorker) como el CLI (python -m inmocapt).
+"""
+
+import time
+import logging
+from utils.config import ConfigManager
+from utils.excel_manager import ExcelManager
+from scraper.idealista import IdealistaScraper
+from scraper.fotocasa import FotocasaScraper
+from scraper.habitaclia import HabitacliaScraper
+from utils.selenium_stealth import selenium_stealth
+from utils.session_store import session_store
+from utils.browser_handoff import browser_handoff
+from utils.behavior_policy import behavior_policies
+from utils.politeness import politeness
+from utils.circuit_breaker import circuit_breakers
+from utils.http_pool import connection_layer
+from utils.checkpoint import CrawlCheckpoint
+from utils.locations import location_manager
+from utils.scheduler import CrawlScheduler
+from utils.instrumentation import instrumentation
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def create_managers():
+    """Crear y configurar managers y scrapers a partir de config/ (sin Streamlit)"""
+    config_manager = ConfigManager()
+    excel_manager = ExcelManager()
+    
+    # Pool opcional de perfiles persistentes de Chrome (--user-data-dir)
+    browser_settings = config_manager.get_browser_settings()
+    selenium_stealth.configure_profile_pool(
+        browser_settings.get('profile_pool_dir'),
+        browser_settings.get('profile_pool_size', 2)
+    )
+    selenium_stealth.persist_sessions = browser_settings.get('persist_sessions', True)
+    session_store.max_age = browser_settings.get('session_max_age_hours', 24) * 3600
+    browser_handoff.enabled = browser_settings.get('handoff_enabled', True)
+    browser_handoff.max_pages = browser_settings.get('handoff_max_pages', 25)
+    
+    # Pool de conexiones HTTP compartido (antes de crear las sesiones de los scrapers)
+    connection_settings = config_manager.get_connection_settings()
+    connection_layer.configure(
+        pool_connections=connection_settings.get('pool_connections', 10),
+        pool_maxsize=connection_settings.get('pool_maxsize', 10),
+        pool_block=connection_settings.get('pool_block', False),
+        keepalive=connection_settings.get('keepalive', True),
+        keepalive_expiry=connection_settings.get('keepalive_expiry', 30),
+        http2=connection_settings.get('http2', False),
+        dns_cache=connection_settings.get('dns_cache', False),
+        dns_ttl=connection_settings.get('dns_ttl', 300)
+    )
+    
+    breaker_settings = config_manager.get_circuit_breaker_settings()
+    circuit_breakers.configure(
+        failure_threshold=breaker_settings.get('failure_threshold', 3),
+        cooldown=breaker_settings.get('cooldown', 300)
+    )
+    
+    # Presupuesto de simulación humana y cortesía adaptativa por portal
+    for portal in ('idealista', 'fotocasa', 'habitaclia'):
+        portal_settings = config_manager.get_scraper_settings(portal)
+        behavior_policies.configure(portal, portal_settings.get('behavior'))
+        politeness.configure(portal, portal_settings.get('politeness'))
+    
+    scrapers = {
+        'Idealista': IdealistaScraper(
+            phone_reveal=config_manager.get_scraper_settings('idealista').get('phone_reveal', 'inline'),
+            max_tabs=config_manager.get_scraper_settings('idealista').get('max_tabs', 1)
+        ),
+        'Fotocasa': FotocasaScraper(
+            network_capture=config_manager.get_scraper_settings('fotocasa').get('network_capture', False)
+        ),
+        'Habitaclia': HabitacliaScraper()
+    }
+    
+    # Páginas de resultados precargadas en segundo plano mientras se procesan las fichas
+    for name, scraper in scrapers.items():
+        scraper.prefetch_pages = config_manager.get_scraper_settings(name.lower()).get('prefetch_pages', 1)
+    
+    return config_manager, excel_manager, scrapers
+
+
+def build_portal_params(search_params):
+    """Parámetros de búsqueda comunes a todos los portales"""
+    return {
+        'location': search_params['location'],
+        'min_price': search_params['min_price'],
+        'max_price': search_params['max_price'],
+        'min_rooms': search_params['min_rooms'],
+        'max_rooms': search_params['max_rooms'],
+        'min_surface': search_params['min_surface'],
+        'max_pages': search_params['max_pages'],
+        'operation': search_params['operation'],
+        'two_phase': search_params.get('two_phase', False)
+    }
+
+
+def persist_batch(worker, excel_manager, batch, checkpoint, totals):
+    """Guardar un micro-lote de particulares en el Excel y notificarlo al trabajador"""
+    if not batch:
+        return
+    
+    stats = excel_manager.add_listings(batch)
+    for key, value in stats.items():
+        totals[key] = totals.get(key, 0) + value
+    
+    # Ya en disco: el checkpoint solo necesita recordar las fichas procesadas
+    checkpoint.mark_persisted()
+    worker.emit('saved', totals=totals)
+
+
+def build_search_jobs(search_params, scrapers, resume=False):
+    """
+    Trabajos (portal, parámetros, checkpoint) de una búsqueda
+    
+    Con resume=True cada portal activo continúa desde el checkpoint de esta misma
+    búsqueda (search_key del portal y sus parámetros) en lugar de empezar por la
+    página 1; si no hay ninguno, empieza de cero.
+    """
+    portal_params = build_portal_params(search_params)
+    factory = CrawlCheckpoint.resume if resume else CrawlCheckpoint.start
+    jobs = []
+    for portal_name in scrapers:
+        if search_params['portales_activos'].get(portal_name.lower(), False):
+            jobs.append((portal_name, portal_params, factory(portal_name, portal_params)))
+    return jobs
+
+
+def build_batch_jobs(locations, price_bands, base_params, portals, scrapers, resume=False):
+    """
+    Trabajos de un rastreo por lotes: ubicaciones x franjas de precio x portales
+    
+    Cada ubicación se convierte al formato de cada portal y las combinaciones que
+    resuelven a la misma búsqueda (p. ej. 'anoia' y 'barcelona/anoia') se ejecutan
+    una sola vez. Todos los checkpoints comparten un conjunto de fichas procesadas,
+    de modo que una ficha que aparece en una ciudad y en su comarca se descarga una
+    sola vez. Los trabajos se ejecutan en secuencia sobre los mismos scrapers, por lo
+    que comparten navegador, sesiones y cortesía por portal.
+    
+    Args:
+        locations: Ubicaciones (admite 'all' y 'provincia:<nombre>')
+        price_bands: Franjas [(min_price, max_price), ...]
+        base_params: Resto de parámetros de búsqueda (habitaciones, superficie, páginas...)
+        portals: Portales en minúsculas
+        scrapers: Scrapers por nombre
+        resume: Continuar desde los checkpoints guardados de cada trabajo
+    """
+    seen_urls = set()
+    jobs = []
+    planned = set()
+    expanded = location_manager.expand_locations(locations)
+    for location in expanded:
+        for min_price, max_price in price_bands:
+            params = build_portal_params({**base_params, 'location': location,
+                                          'min_price': min_price, 'max_price': max_price})
+            for portal_name in scrapers:
+                if portal_name.lower() not in portals:
+                    continue
+                resolved, _ = location_manager.get_portal_location(portal_name, location)
+                key = (portal_name, resolved, min_price, max_price)
+                if key in planned:
+                    logger.info(f"↪️ {portal_name}: '{location}' equivale a '{resolved}', ya incluida en el lote")
+                    continue
+                planned.add(key)
+                
+                factory = CrawlCheckpoint.resume if resume else CrawlCheckpoint.start
+                jobs.append((portal_name, params, factory(portal_name, params, seen_urls=seen_urls)))
+    
+    logger.info(f"📦 Lote: {len(jobs)} búsquedas ({len(expanded)} ubicaciones x {len(price_bands)} franjas de precio)")
+    return jobs
+
+
+def build_scheduled_jobs(planned, base_params, scrapers):
+    """Trabajos de las zonas elegidas por el CrawlScheduler (con deduplicación de fichas entre ellas)"""
+    seen_urls = set()
+    names = {name.lower(): name for name in scrapers}
+    jobs = []
+    for entry in planned:
+        portal_name = names.get(entry['portal'].lower())
+        if portal_name is None:
+            logger.warning(f"Portal desconocido en el calendario: {entry['portal']}")
+            continue
+        params = build_portal_params({**base_params, 'location': entry['location']})
+        jobs.append((portal_name, params, CrawlCheckpoint.start(portal_name, params, seen_urls=seen_urls)))
+    return jobs
+
+
+def create_scheduler(config_manager):
+    """Calendario de rastreos sincronizado con scheduler_settings"""
+    settings = config_manager.get_scheduler_settings()
+    scheduler = CrawlScheduler(
+        default_interval_minutes=settings.get('default_interval_minutes', 1440),
+        default_estimate_minutes=settings.get('default_estimate_minutes', 10)
+    )
+    scheduler.configure(settings.get('schedules', []),
+                        settings.get('portals', ['idealista', 'fotocasa', 'habitaclia']))
+    return scheduler
+
+
+def start_metrics(config_manager, worker, textfile=None, port=None) -> bool:
+    """
+    Exportar las métricas de Prometheus del trabajador según metrics_settings
+
+    textfile/port (p. ej. desde la línea de comandos) activan la exportación aunque
+    metrics_settings.enabled sea false.
+    """
+    settings = config_manager.get_metrics_settings()
+    if not (settings.get('enabled') or textfile or port):
+        return False
+    if not (textfile or port):
+        textfile, port = settings.get('textfile'), settings.get('port')
+    metrics.register_worker(worker)
+    return metrics.start(textfile=textfile, port=port, host=settings.get('host', '127.0.0.1'),
+                         interval_seconds=settings.get('interval_seconds', 15))
+
+
+def run_scheduled(worker, scheduler, scrapers, excel_manager, base_params, budget_minutes, **kwargs):
+    """
+    Pasada del calendario: rastrear las zonas que tocan dentro del presupuesto de minutos
+    
+    Se ejecuta en el CrawlWorker (app o CLI). Cada trabajo terminado actualiza el
+    histórico de su zona (nuevos y duración) para la siguiente planificación.
+    """
+    planned = scheduler.plan(budget_minutes)
+    worker.log(f"🗓️ Calendario: {len(planned)} zonas a rastrear (presupuesto {budget_minutes} min)")
+    jobs = build_scheduled_jobs(planned, base_params, scrapers)
+    
+    def record(portal_name, params, result):
+        # Parcial solo si el presupuesto cortó la búsqueda; terminar por max_pages cuenta como completa
+        if result['completed'] or not (worker.cancelled() or result['expired']):
+            status = 'ok'
+        else:
+            status = 'cancelled' if worker.cancelled() else 'partial'
+        scheduler.record_run(params['location'], portal_name, result['nuevos'], result['seconds'], status)
+    
+    run_crawl(worker, jobs, scrapers, excel_manager, deadline=time.time() + budget_minutes * 60,
+              on_job_done=record, **kwargs)
+
+
+def run_crawl(worker, jobs, scrapers, excel_manager, batch_size=5, flush_interval=10,
+              deadline=None, on_job_done=None):
+    """
+    Rastreo completo de los trabajos, ejecutado en el hilo del CrawlWorker
+    
+    No usa Streamlit: el progreso se publica como eventos del trabajador y la
+    cancelación llega por su threading.Event. Los particulares se guardan en
+    micro-lotes mientras avanza el rastreo. Al terminar se vuelcan los tiempos
+    por portal y fase (utils.instrumentation) a data/runs/.
+    
+    Args:
+        deadline: Instante (time.time()) en el que se detiene el rastreo, también a mitad de un trabajo
+        on_job_done: Callback (portal, params, {'nuevos', 'seconds', 'completed', 'expired'}) al terminar cada trabajo
+    """
+    totals = {'nuevos': 0, 'actualizados': 0, 'duplicados': 0}
+    finished_checkpoints = []
+    instrumentation.reset()
+    
+    # Anuncios ya guardados para priorizar las fichas en el rastreo en dos fases
+    known_listings = excel_manager.get_known_listings() if any(params.get('two_phase') for _, params, _ in jobs) else None
+    
+    # Anuncios ya emitidos que se completan más tarde (teléfono diferido): se guardan como
+    # actualización, sin contarlos otra vez como particulares encontrados
+    updates = []
+    context = worker.context(on_update=updates.append, deadline=deadline)
+    for portal_name, portal_params, checkpoint in jobs:
+        # Verificar si se solicitó parar la búsqueda
+        if worker.cancelled():
+            break
+        if deadline and time.time() >= deadline:
+            logger.info(f"⏱️ Presupuesto de tiempo agotado: quedan trabajos sin empezar desde {portal_name}")
+            break
+        
+        scraper = scrapers[portal_name]
+        worker.emit('portal', portal=portal_name, location=portal_params.get('location'))
+        started = time.time()
+        nuevos_before = totals['nuevos']
+        
+        # Particulares de una ejecución anterior que no llegaron a guardarse
+        batch = list(checkpoint.results)
+        updates.clear()
+        last_flush = time.time()
+        
+        try:
+            # Ejecutar búsqueda (cada ficha queda registrada en el checkpoint del portal)
+            if portal_params.get('two_phase'):
+                listings = scraper.iter_listings_two_phase(portal_params, known_listings, checkpoint=checkpoint,
+                                                           context=context)
+            else:
+                listings = scraper.iter_listings(portal_params, checkpoint, context)
+            
+            for listing in listings:
+                batch.append(listing)
+                worker.emit('listing', url=listing.get('url'), title=(listing.get('titulo') or '')[:60])
+                metrics.inc('particulares_total', portal=portal_name.lower())
+                
+                if len(batch) >= batch_size or time.time() - last_flush >= flush_interval:
+                    persist_batch(worker, excel_manager, batch, checkpoint, totals)
+                    batch = []
+                    last_flush = time.time()
+                
+                # Verificar si se solicitó parar (o se agotó el presupuesto) durante la búsqueda del portal
+                if context.cancelled():
+                    break
+            
+            persist_batch(worker, excel_manager, batch, checkpoint, totals)
+            persist_batch(worker, excel_manager, updates, checkpoint, totals)
+            if context.expired() and not worker.cancelled() and not checkpoint.completed:
+                logger.info(f"⏱️ Presupuesto de tiempo agotado durante {portal_name}: se guarda lo encontrado "
+                            f"y el trabajo queda parcial")
+            if checkpoint.completed:
+                finished_checkpoints.append(checkpoint)
+            
+        except Exception as e:
+            # Solo log interno, no mostrar al usuario; guardar lo que aún no se volcó
+            logger.error(f"Error en {portal_name}: {e}")
+            try:
+                persist_batch(worker, excel_manager, list(checkpoint.results) + updates, checkpoint, totals)
+            except Exception:
+                # Error silencioso: lo no guardado sigue en el checkpoint para reanudar
+                pass
+        finally:
+            # Fichas procesadas desde la última escritura (el checkpoint se guarda cada pocas fichas)
+            checkpoint.save()
+            seconds = time.time() - started
+            instrumentation.record('job', seconds, portal_name)
+            worker.emit('portal_done', portal=portal_name, seconds=round(seconds, 1))
+            if on_job_done:
+                on_job_done(portal_name, portal_params, {'nuevos': totals['nuevos'] - nuevos_before,
+                                                         'seconds': seconds, 'completed': checkpoint.completed,
+                                                         'expired': context.expired()})
+    
+    # Los portales terminados (y guardados) ya no necesitan reanudarse
+    for checkpoint in finished_checkpoints:
+        checkpoint.clear()
+    
+    worker.emit('stages', path=instrumentation.dump())
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Trabajador de rastreo en segundo plano
+El rastreo se ejecuta en un hilo propio en lugar de en el hilo del script de
+Streamlit: la interfaz no se congela, recargar la página no mata el rastreo y
+varias sesiones pueden observar el mismo trabajo. Del rastreo a la interfaz, cada
+evento se aplica al publicarse sobre un estado compartido y un buffer circular de
+progreso (memoria acotada aunque nadie sondee durante horas); de la interfaz al
+rastreo, un threading.Event de cancelación.
+"""
+
+import time
+import logging
+import threading
+from functools import partial
+from typing import Any, Callable, Dict, Optional
+from utils.crawl_context import CrawlContext
+from utils.progress_log import ProgressLog
+
+
+class CrawlWorker:
+    """Un único trabajo de rastreo a la vez, observable por sondeo desde cualquier sesión"""
+
+    def __init__(self, max_log_messages: int = 500):
+        """
+        Args:
+            max_log_messages: Eventos de progreso que se conservan (buffer circular)
+        """
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.cancel_event = threading.Event()
+
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._job_id = 0
+        self.progress = ProgressLog(max_log_messages)
+        self._state = self._initial_state()
+
+    def _initial_state(self) -> Dict:
+        return {
+            'job_id': self._job_id,
+            'status': 'idle',  # idle | running | cancelling | finished | cancelled | failed
+            'portal': '',
+            'page': 0,
+            'found': 0,
+            'totals': {},
+            'persisted': 0,  # Micro-lotes guardados (cambia cada vez que hay datos nuevos en el Excel)
+            'timings': {},  # Segundos por portal terminado
+            'stage_report': None,  # JSON con los tiempos por portal y fase del rastreo
+            'error': None,
+            'started_at': None,
+            'finished_at': None,
+        }
+
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, target: Callable[..., Any], *args, **kwargs) -> bool:
+        """
+        Lanzar target(worker, *args, **kwargs) en un hilo nuevo
+
+        Returns:
+            False si ya hay un rastreo en marcha (no se lanza otro)
+        """
+        with self._lock:
+            if self.is_running():
+                return False
+
+            self.cancel_event.clear()
+            self._job_id += 1
+            self.progress.clear()
+            self._state = self._initial_state()
+            self._state.update(status='running', started_at=time.time())
+
+            self._thread = threading.Thread(target=self._run, args=(target, args, kwargs),
+                                            name=f'crawl-worker-{self._job_id}', daemon=True)
+            self._thread.start()
+            return True
+
+    def _run(self, target: Callable[..., Any], args, kwargs):
+        try:
+            target(self, *args, **kwargs)
+        except Exception as e:
+            self.logger.error(f"Error en el rastreo en segundo plano: {e}")
+            self.emit('error', error=str(e))
+        finally:
+            self.emit('done')
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """Esperar al rastreo en curso; devuelve True si ya ha terminado"""
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return not self.is_running()
+
+    def context(self, on_update: Optional[Callable[[Dict], None]] = None,
+                deadline: Optional[float] = None) -> CrawlContext:
+        """Contexto para los scrapers: cancelación por el Event del trabajador o al llegar a deadline, progreso como eventos"""
+        return CrawlContext(self.cancel_event, on_progress=partial(self.emit, 'page'), log_sink=self.log,
+                            on_update=on_update, deadline=deadline)
+
+    def cancel(self):
+        """Solicitar la parada; el rastreo termina en la siguiente comprobación de cancelled()"""
+        if self.is_running():
+            self.cancel_event.set()
+            self.emit('cancelling')
+
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+    def emit(self, kind: str, **data):
+        """Publicar un evento desde el hilo del rastreo: se aplica al estado y al buffer en el momento"""
+        with self._lock:
+            self._apply({'kind': kind, 'time': time.time(), **data})
+
+    def log(self, message: str, **fields):
+        """Mensaje de progreso para la interfaz (fields: portal, page, url)"""
+        self.emit('log', message=message, **fields)
+
+    def _apply(self, event: Dict):
+        kind = event['kind']
+        state = self._state
+        if kind == 'log':
+            self.progress.append('log', event['message'], portal=event.get('portal', state['portal']),
+                                 page=event.get('page', state['page']), url=event.get('url'), timestamp=event['time'])
+        elif kind == 'portal':
+            state.update(portal=event['portal'], page=0)
+            where = f" ({event['location']})" if event.get('location') else ''
+            self.progress.append('portal', f"🌐 Procesando{where}...", portal=event['portal'], timestamp=event['time'])
+        elif kind == 'page':
+            state['page'] = event['page']
+            self.progress.append('page', "📄 Procesando página", portal=event.get('portal', state['portal']),
+                                 page=event['page'], timestamp=event['time'])
+        elif kind == 'portal_done':
+            # Un lote puede pasar varias veces por el mismo portal: se acumula
+            state['timings'][event['portal']] = round(state['timings'].get(event['portal'], 0) + event['seconds'], 1)
+        elif kind == 'listing':
+            state['found'] += 1
+            self.progress.append('listing', f"🏠 Particular #{state['found']}: {event.get('title') or 'Sin título'}",
+                                 portal=state['portal'], page=state['page'], url=event.get('url'),
+                                 timestamp=event['time'])
+        elif kind == 'saved':
+            state['totals'] = dict(event['totals'])
+            state['persisted'] += 1
+            self.progress.append('saved', f"💾 Guardados: {state['totals'].get('nuevos', 0)} nuevos, "
+                                          f"{state['totals'].get('actualizados', 0)} actualizados",
+                                 portal=state['portal'], timestamp=event['time'])
+        elif kind == 'stages':
+            state['stage_report'] = event['path']
+        elif kind == 'cancelling':
+            if state['status'] == 'running':
+                state['status'] = 'cancelling'
+        elif kind == 'error':
+            state['error'] = event['error']
+        elif kind == 'done':
+            if state['error']:
+                state['status'] = 'failed'
+            elif self.cancel_event.is_set():
+                state['status'] = 'cancelled'
+            else:
+                state['status'] = 'finished'
+            state['finished_at'] = event['time']
+
+    def poll(self) -> Dict:
+        """
+        Copia del estado del trabajo
+
+        Es barato y seguro llamarlo en cada rerun de cualquier sesión: los eventos ya
+        están aplicados sobre un estado compartido; los mensajes nuevos se leen del
+        buffer con progress.since(log_seq).
+        """
+        with self._lock:
+            snapshot = dict(self._state)
+            snapshot['totals'] = dict(self._state['totals'])
+            snapshot['timings'] = dict(self._state['timings'])
+            snapshot['log_seq'] = self.progress.last_seq
+            return snapshot
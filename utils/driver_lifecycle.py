@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Gestión del ciclo de vida del driver de Selenium
+Reciclado proactivo por páginas, memoria (RSS de Chrome) y tasa de errores,
+con recuperación transparente de la URL en curso tras un crash.
+"""
+
+import logging
+from collections import deque
+from typing import Callable, Optional, List, Dict, Tuple
+from bs4 import BeautifulSoup
+from utils.selenium_stealth import selenium_stealth
+
+
+class DriverLifecycleManager:
+    """Vigila el driver compartido y lo recicla antes de que se degrade"""
+
+    def __init__(self, stealth=selenium_stealth, max_pages: int = 200, max_rss_mb: float = 2048,
+                 max_error_rate: float = 0.5, error_window: int = 20, crash_retries: int = 1,
+                 cookie_snapshot_every: int = 10):
+        """
+        Args:
+            stealth: Instancia de SeleniumStealth a gestionar
+            max_pages: Páginas por driver antes de reciclar
+            max_rss_mb: Memoria total de Chrome (MB) a partir de la cual se recicla
+            max_error_rate: Proporción de errores en la ventana reciente que fuerza reciclado
+            error_window: Número de navegaciones recientes consideradas para la tasa de errores
+            crash_retries: Reintentos de la URL en curso tras un crash del driver
+            cookie_snapshot_every: Cada cuántas páginas guardar cookies para recuperarlas tras un crash
+        """
+        self.stealth = stealth
+        self.max_pages = max_pages
+        self.max_rss_mb = max_rss_mb
+        self.max_error_rate = max_error_rate
+        self.crash_retries = crash_retries
+        self.cookie_snapshot_every = cookie_snapshot_every
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+        self.pages = 0  # Páginas servidas por el driver actual
+        self.recent_results = deque(maxlen=error_window)  # True = éxito, False = error
+        self.recycles = {'pages': 0, 'memory': 0, 'errors': 0, 'crash': 0}
+        self._cookie_snapshot: List[Dict] = []
+        self._psutil_warned = False
+
+    def get_chrome_rss_mb(self) -> Optional[float]:
+        """Memoria residente total (MB) de ChromeDriver y sus procesos Chrome hijos"""
+        driver = self.stealth.driver
+        if not driver:
+            return None
+
+        try:
+            import psutil
+        except ImportError:
+            if not self._psutil_warned:
+                self.logger.warning("psutil no instalado - reciclado por memoria desactivado (pip install psutil)")
+                self._psutil_warned = True
+            return None
+
+        try:
+            root = psutil.Process(driver.service.process.pid)
+            processes = [root] + root.children(recursive=True)
+            total = 0
+            for process in processes:
+                try:
+                    total += process.memory_info().rss
+                except (psutil.NoSuchProcess, psutil.AccessDenied):
+                    continue
+            return total / (1024 * 1024)
+        except Exception as e:
+            self.logger.debug(f"No se pudo medir la memoria de Chrome: {e}")
+            return None
+
+    def get_error_rate(self) -> float:
+        """Proporción de navegaciones fallidas en la ventana reciente"""
+        if not self.recent_results:
+            return 0.0
+        return self.recent_results.count(False) / len(self.recent_results)
+
+    def should_recycle(self) -> Optional[str]:
+        """Devolver el motivo de reciclado si se ha superado algún umbral, o None"""
+        if not self.stealth.driver:
+            return None
+
+        if self.pages >= self.max_pages:
+            return 'pages'
+
+        # Exigir ventana mínima para no reciclar por un único fallo
+        if len(self.recent_results) >= 5 and self.get_error_rate() >= self.max_error_rate:
+            return 'errors'
+
+        rss = self.get_chrome_rss_mb()
+        if rss is not None and rss >= self.max_rss_mb:
+            return 'memory'
+
+        return None
+
+    def recycle(self, reason: str) -> bool:
+        """Reciclar el driver conservando cookies (o el último snapshot si ha caído)"""
+        self.logger.info(f"♻️ Reciclando driver (motivo: {reason}, páginas: {self.pages})")
+
+        ok = self.stealth.restart_driver(preserve_cookies=True, cookies=self._cookie_snapshot)
+        self.recycles[reason] = self.recycles.get(reason, 0) + 1
+        self.pages = 0
+        self.recent_results.clear()
+        return ok
+
+    def record_result(self, success: bool):
+        """Registrar el resultado de una navegación"""
+        self.recent_results.append(success)
+        if success:
+            self.pages += 1
+            if self.cookie_snapshot_every and self.pages % self.cookie_snapshot_every == 0:
+                self._cookie_snapshot = self.stealth.export_cookies() or self._cookie_snapshot
+
+    def navigate(self, url: str, wait_time: tuple = (3, 7),
+                 validate: Optional[Callable[[BeautifulSoup], bool]] = None) -> Tuple[Optional[BeautifulSoup], bool]:
+        """
+        Navegar a una URL reciclando el driver si procede y reintentando tras un crash
+
+        Args:
+            validate: Validación del contenido; una página descargada pero bloqueada cuenta
+                como error (una sola vez) para la tasa de reciclado
+
+        Returns:
+            (BeautifulSoup de la página o None si no se pudo obtener, resultado de validate)
+        """
+        reason = self.should_recycle()
+        if reason:
+            self.recycle(reason)
+
+        for attempt in range(self.crash_retries + 1):
+            try:
+                soup = self.stealth.human_navigation(url, wait_time=wait_time)
+            except Exception as e:
+                self.logger.error(f"ERROR: Excepción navegando a {url}: {e}")
+                soup = None
+
+            if soup is not None:
+                valid = validate(soup) if validate else True
+                self.record_result(valid)
+                return soup, valid
+
+            self.record_result(False)
+
+            # Driver caído: reiniciar y reintentar la misma URL de forma transparente
+            if self.stealth.driver and not self.stealth.is_alive() and attempt < self.crash_retries:
+                self.logger.warning(f"💥 Driver caído, recuperando y reintentando: {url}")
+                if not self.recycle('crash'):
+                    break
+                continue
+
+            break
+
+        return None, False
+
+    def get_stats(self) -> Dict:
+        """Estadísticas del ciclo de vida para logging/métricas"""
+        return {
+            'pages': self.pages,
+            'error_rate': round(self.get_error_rate(), 3),
+            'rss_mb': self.get_chrome_rss_mb(),
+            'recycles': dict(self.recycles),
+            'restarts': self.stealth.driver_restarts,
+            'startup': self.stealth.get_startup_stats(),
+        }
+
+
+# Instancia global para reutilizar
+driver_lifecycle = DriverLifecycleManager()
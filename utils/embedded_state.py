@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Extracción rápida del estado JSON embebido en el HTML inicial
+(__NEXT_DATA__, window.__INITIAL_PROPS__ / __INITIAL_STATE__ y JSON-LD)
+sin construir un BeautifulSoup completo de la página.
+"""
+
+import re
+import json
+import logging
+from typing import Any, Dict, List, Optional
+
+
+class EmbeddedStateExtractor:
+    """Localiza y decodifica estado JSON embebido mediante regex dirigidas"""
+
+    # <script id="__NEXT_DATA__" type="application/json">{...}</script>
+    NEXT_DATA_PATTERN = re.compile(
+        r'<script[^>]+id=["\']__NEXT_DATA__["\'][^>]*>(.*?)</script>',
+        re.DOTALL | re.IGNORECASE
+    )
+
+    # <script type="application/ld+json">{...}</script>
+    JSON_LD_PATTERN = re.compile(
+        r'<script[^>]+type=["\']application/ld\+json["\'][^>]*>(.*?)</script>',
+        re.DOTALL | re.IGNORECASE
+    )
+
+    # window.__INITIAL_PROPS__ = JSON.parse("...") o window.__INITIAL_STATE__ = {...}
+    WINDOW_STATE_PATTERN = re.compile(
+        r'window\.(__INITIAL_PROPS__|__INITIAL_STATE__|__PRELOADED_STATE__)\s*=\s*',
+        re.IGNORECASE
+    )
+
+    def __init__(self):
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self._decoder = json.JSONDecoder()
+
+    def extract(self, html: str) -> Dict[str, Any]:
+        """
+        Extraer todo el estado embebido disponible en el HTML
+
+        Args:
+            html: HTML crudo de la página
+
+        Returns:
+            Dict con las claves encontradas: 'next_data', 'window_state' y/o 'json_ld'.
+            Vacío si la página no contiene estado embebido.
+        """
+        state = {}
+
+        if not html:
+            return state
+
+        next_data = self.extract_next_data(html)
+        if next_data:
+            state['next_data'] = next_data
+
+        window_state = self.extract_window_state(html)
+        if window_state:
+            state['window_state'] = window_state
+
+        json_ld = self.extract_json_ld(html)
+        if json_ld:
+            state['json_ld'] = json_ld
+
+        return state
+
+    def extract_next_data(self, html: str) -> Optional[Dict]:
+        """Extraer el bloque __NEXT_DATA__ de Next.js"""
+        match = self.NEXT_DATA_PATTERN.search(html)
+        if not match:
+            return None
+
+        try:
+            return json.loads(match.group(1))
+        except ValueError as e:
+            self.logger.debug(f"__NEXT_DATA__ no decodificable: {e}")
+            return None
+
+    def extract_window_state(self, html: str) -> Optional[Dict]:
+        """Extraer estado asignado a window.__INITIAL_PROPS__ y similares"""
+        for match in self.WINDOW_STATE_PATTERN.finditer(html):
+            start = match.end()
+
+            try:
+                # Caso 1: JSON.parse("...") - cadena JSON escapada como literal JS
+                if html.startswith('JSON.parse(', start):
+                    literal, _ = self._decoder.raw_decode(html, start + len('JSON.parse('))
+                    if isinstance(literal, str):
+                        return json.loads(literal)
+
+                # Caso 2: objeto literal directo - decodificar solo el primer valor JSON
+                value, _ = self._decoder.raw_decode(html, start)
+                if isinstance(value, dict):
+                    return value
+
+            except ValueError as e:
+                self.logger.debug(f"Estado window.{match.group(1)} no decodificable: {e}")
+                continue
+
+        return None
+
+    def extract_json_ld(self, html: str) -> List[Dict]:
+        """Extraer todos los bloques JSON-LD, aplanando listas y @graph"""
+        blocks = []
+
+        for match in self.JSON_LD_PATTERN.finditer(html):
+            try:
+                value = json.loads(match.group(1).strip())
+            except ValueError:
+                continue
+
+            for item in value if isinstance(value, list) else [value]:
+                if not isinstance(item, dict):
+                    continue
+                if isinstance(item.get('@graph'), list):
+                    blocks.extend(node for node in item['@graph'] if isinstance(node, dict))
+                else:
+                    blocks.append(item)
+
+        return blocks
+
+    def find_key(self, data: Any, key: str, max_depth: int = 12) -> Optional[Any]:
+        """Buscar recursivamente el primer valor asociado a una clave"""
+        if max_depth < 0:
+            return None
+
+        if isinstance(data, dict):
+            if key in data:
+                return data[key]
+            children = data.values()
+        elif isinstance(data, list):
+            children = data
+        else:
+            return None
+
+        for child in children:
+            found = self.find_key(child, key, max_depth - 1)
+            if found is not None:
+                return found
+
+        return None
+
+    def map_json_ld_listing(self, blocks: List[Dict]) -> Dict:
+        """
+        Mapear bloques JSON-LD de un anuncio al formato de _extract_listing_data
+
+        Returns:
+            Dict con la misma forma que _extract_listing_data, o vacío si no hay bloques de anuncio
+        """
+        data = {}
+
+        listing_types = {
+            'product', 'offer', 'residence', 'singlefamilyresidence', 'apartment',
+            'house', 'accommodation', 'realestatelisting', 'place'
+        }
+
+        for block in blocks:
+            block_type = block.get('@type', '')
+            types = block_type if isinstance(block_type, list) else [block_type]
+            if not any(str(t).lower() in listing_types for t in types):
+                continue
+
+            if not data.get('titulo') and block.get('name'):
+                data['titulo'] = str(block['name']).strip()
+
+            # Precio: directo u obtenido de offers
+            offers = block.get('offers')
+            if isinstance(offers, list):
+                offers = offers[0] if offers else None
+            price = block.get('price') or (offers.get('price') if isinstance(offers, dict) else None)
+            if price and not data.get('precio'):
+                data['precio'] = self.to_number(price)
+
+            # Superficie
+            floor_size = block.get('floorSize')
+            if floor_size and not data.get('superficie'):
+                value = floor_size.get('value') if isinstance(floor_size, dict) else floor_size
+                data['superficie'] = int(self.to_number(value) or 0)
+
+            # Habitaciones y baños
+            rooms = block.get('numberOfBedrooms') or block.get('numberOfRooms')
+            if rooms and not data.get('habitaciones'):
+                data['habitaciones'] = int(self.to_number(rooms) or 0)
+
+            bathrooms = block.get('numberOfBathroomsTotal') or block.get('numberOfFullBathrooms')
+            if bathrooms and not data.get('banos'):
+                data['banos'] = int(self.to_number(bathrooms) or 0)
+
+            # Ubicación
+            address = block.get('address')
+            if address and not data.get('ubicacion'):
+                if isinstance(address, dict):
+                    parts = [address.get('streetAddress'), address.get('addressLocality'), address.get('addressRegion')]
+                    data['ubicacion'] = ', '.join(str(p) for p in parts if p)
+                else:
+                    data['ubicacion'] = str(address)
+
+            # Teléfono
+            telephone = block.get('telephone')
+            if telephone and not data.get('telefono'):
+                data['telefono'] = str(telephone)
+
+            if block.get('datePosted') and not data.get('fecha_publicacion'):
+                data['fecha_publicacion'] = str(block['datePosted'])
+
+        if not data:
+            return data
+
+        # Completar con los mismos valores por defecto que _extract_listing_data
+        for key, default in (('titulo', ''), ('precio', None), ('ubicacion', ''), ('superficie', 0),
+                             ('habitaciones', 0), ('banos', 0), ('telefono', ''),
+                             ('nombre_contacto', ''), ('fecha_publicacion', '')):
+            data.setdefault(key, default)
+        data['requiere_formulario'] = not data['telefono']
+
+        return data
+
+    def to_number(self, value: Any) -> Optional[float]:
+        """Convertir precio/medida (numérico o texto) a número"""
+        if isinstance(value, bool):
+            return None
+        if isinstance(value, (int, float)):
+            return value
+        if isinstance(value, dict):
+            value = value.get('value') or value.get('amount')
+            return self.to_number(value) if value is not None else None
+
+        text = str(value).strip()
+        # Miles agrupados con punto ("250.000", "1.250.000"): no es un decimal
+        if re.fullmatch(r'\d{1,3}(\.\d{3})+', text):
+            return float(text.replace('.', ''))
+        if re.fullmatch(r'\d+(\.\d+)?', text):
+            return float(text)
+
+        # Formato español: "250.000 €" / "85,5 m²"
+        digits = re.sub(r'[^\d]', '', text.split(',')[0])
+        return float(digits) if digits else None
+
+
+# Instancia global para reutilizar
+embedded_state_extractor = EmbeddedStateExtractor()
@@ -4,6 +4,7 @@ from datetime import datetime
 import os
 import logging
 from typing import Dict, List, Optional
+from utils.instrumentation import instrumentation
 
 
 class ExcelManager:
@@ -61,6 +62,7 @@ class ExcelManager:
             self.logger.error(f"Error cargando datos: {e}")
             return pd.DataFrame(columns=self.columns)
     
+    @instrumentation.timed('excel_save')
     def save_data(self, df: pd.DataFrame):
         """Guardar datos al archivo Excel"""
         try:
@@ -241,6 +243,24 @@ class ExcelManager:
         
         return False
     
+    def get_known_listings(self, portal: Optional[str] = None) -> Dict[str, Dict]:
+        """Anuncios ya guardados {url: {'price', 'updated'}} para priorizar el rastreo"""
+        df = self.load_data()
+        if portal:
+            df = df[df['Portal'].astype(str).str.lower() == portal.lower()]
+
+        known = {}
+        for _, row in df.iterrows():
+            url = row.get('URL')
+            if not isinstance(url, str) or not url:
+                continue
+            updated = row.get('Ultima_Actualizacion')
+            known[url] = {
+                'price': row.get('Precio') if pd.notna(row.get('Precio')) else None,
+                'updated': str(updated) if pd.notna(updated) else None,
+            }
+        return known
+
     def get_statistics(self) -> Dict:
         """Obtener estadísticas de los datos"""
         df = self.load_data()
@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+Frontera de URLs para el rastreo en dos fases
+Fase 1: se recorren todas las páginas de resultados extrayendo solo enlaces (y precio
+si el portal lo muestra en el listado) hacia una frontera deduplicada.
+Fase 2: las fichas se descargan desde una cola de prioridad: primero los anuncios
+nuevos, después los que han cambiado de precio y por último los que llevan tiempo
+sin revisarse. La frontera se guarda en disco para poder reanudar el rastreo.
+"""
+
+import os
+import json
+import heapq
+import logging
+import itertools
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterator, List, Optional
+from utils.checkpoint import CrawlCheckpoint, search_key
+
+
+class UrlFrontier:
+    """Cola de prioridad deduplicada de fichas pendientes, persistida en JSON"""
+
+    # Orden de descarga; 'fresh' (conocido, mismo precio y revisado hace poco) no se descarga
+    PRIORITIES = ('new', 'price_changed', 'stale')
+
+    def __init__(self, path: Optional[str] = None, known: Optional[Dict[str, Dict]] = None,
+                 stale_after_days: float = 7.0):
+        """
+        Args:
+            path: Fichero JSON donde persistir la frontera (None = solo en memoria)
+            known: Anuncios ya guardados {url: {'price': ..., 'updated': datetime | str}}
+            stale_after_days: Días tras los que un anuncio conocido vuelve a revisarse
+        """
+        self.path = path
+        self.known = known or {}
+        self.stale_after = timedelta(days=stale_after_days)
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+        self.entries: Dict[str, Dict] = {}
+        self.next_page = 1  # Siguiente página de resultados a recorrer en la fase 1
+        self.discovery_complete = False
+        self.discovery_failures = 0  # Intentos fallidos seguidos de descargar next_page
+        self._heap = []
+        self._seq = itertools.count()
+
+    @staticmethod
+    def path_for(portal: str, search_params: Dict, base_dir: str = 'data/frontier') -> str:
+        """Fichero de la frontera para un portal y unos parámetros de búsqueda"""
+        return os.path.join(base_dir, f"{search_key(portal, search_params)}.json")
+
+    def classify(self, url: str, price: Optional[float] = None) -> str:
+        """Prioridad de una URL descubierta: 'new', 'price_changed', 'stale' o 'fresh'"""
+        record = self.known.get(url)
+        if record is None:
+            return 'new'
+
+        known_price = record.get('price')
+        try:
+            if price and known_price and abs(float(price) - float(known_price)) >= 1:
+                return 'price_changed'
+        except (TypeError, ValueError):
+            pass
+
+        updated = record.get('updated')
+        if isinstance(updated, str):
+            try:
+                updated = datetime.strptime(updated, '%Y-%m-%d %H:%M:%S')
+            except ValueError:
+                updated = None
+        if not isinstance(updated, datetime) or datetime.now() - updated >= self.stale_after:
+            return 'stale'
+        return 'fresh'
+
+    def _push(self, url: str):
+        entry = self.entries[url]
+        if entry['status'] == 'pending':
+            heapq.heappush(self._heap, (self.PRIORITIES.index(entry['priority']), next(self._seq), url))
+
+    def add(self, url: str, price: Optional[float] = None, page: Optional[int] = None) -> bool:
+        """Añadir una URL descubierta; devuelve False si ya estaba en la frontera"""
+        if url in self.entries:
+            return False
+        priority = self.classify(url, price)
+        self.entries[url] = {
+            'priority': priority,
+            'price': price,
+            'page': page,
+            'status': 'pending' if priority in self.PRIORITIES else 'skipped',
+        }
+        self._push(url)
+        return True
+
+    def pop(self) -> Optional[str]:
+        """Siguiente URL a descargar según prioridad (None si no quedan)"""
+        while self._heap:
+            _, _, url = heapq.heappop(self._heap)
+            if self.entries.get(url, {}).get('status') == 'pending':
+                self.entries[url]['status'] = 'in_progress'
+                return url
+        return None
+
+    def mark_done(self, url: str, found: bool = True):
+        """Ficha procesada (found = era de particular y se obtuvieron datos)"""
+        if url in self.entries:
+            self.entries[url]['status'] = 'done' if found else 'discarded'
+
+    def mark_failed(self, url: str):
+        if url in self.entries:
+            self.entries[url]['status'] = 'failed'
+
+    def pending(self) -> int:
+        """Fichas que quedan por descargar"""
+        return sum(1 for e in self.entries.values() if e['status'] in ('pending', 'in_progress'))
+
+    def to_dict(self) -> Dict:
+        # Las fichas a medio procesar vuelven a quedar pendientes al reanudar
+        entries = {url: {**e, 'status': 'pending' if e['status'] == 'in_progress' else e['status']}
+                   for url, e in self.entries.items()}
+        return {
+            'next_page': self.next_page,
+            'discovery_complete': self.discovery_complete,
+            'discovery_failures': self.discovery_failures,
+            'entries': entries,
+        }
+
+    def save(self):
+        """Escribir la frontera de forma atómica"""
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def restore(self, data: Dict):
+        """Cargar el estado guardado (las prioridades se conservan tal y como se descubrieron)"""
+        self.next_page = data.get('next_page', 1)
+        self.discovery_complete = data.get('discovery_complete', False)
+        self.discovery_failures = data.get('discovery_failures', 0)
+        self.entries = {url: dict(entry) for url, entry in data.get('entries', {}).items()}
+        self._heap = []
+        for url in self.entries:
+            self._push(url)
+
+    @classmethod
+    def load(cls, path: str, known: Optional[Dict[str, Dict]] = None,
+             stale_after_days: float = 7.0) -> 'UrlFrontier':
+        """Abrir la frontera guardada en path (vacía si no existe o está corrupta)"""
+        frontier = cls(path, known, stale_after_days)
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    frontier.restore(json.load(f))
+                frontier.logger.info(f"📂 Frontera reanudada: {path} ({frontier.pending()} fichas pendientes, "
+                                     f"siguiente página {frontier.next_page})")
+            except (OSError, ValueError) as e:
+                frontier.logger.warning(f"Frontera no válida en {path}, se empieza de cero: {e}")
+        return frontier
+
+    def clear(self):
+        """Eliminar la frontera persistida (rastreo completado)"""
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def get_stats(self) -> Dict:
+        by_priority = {}
+        by_status = {}
+        for entry in self.entries.values():
+            by_priority[entry['priority']] = by_priority.get(entry['priority'], 0) + 1
+            by_status[entry['status']] = by_status.get(entry['status'], 0) + 1
+        return {
+            'urls': len(self.entries),
+            'next_page': self.next_page,
+            'discovery_complete': self.discovery_complete,
+            'priority': by_priority,
+            'status': by_status,
+        }
+
+
+class TwoPhaseCrawler:
+    """Rastreo en dos fases sobre cualquier scraper (BaseScraper o SeleniumBaseScraper)"""
+
+    def __init__(self, scraper, frontier: UrlFrontier, listing_pause: Optional[Callable[[], None]] = None,
+                 save_every: int = 5, checkpoint: Optional[CrawlCheckpoint] = None,
+                 max_discovery_failures: int = 3):
+        """
+        Args:
+            scraper: Scraper con build_search_url, _make_request, _extract_listing_summaries,
+                _is_end_of_results, scrape_listing y _should_stop_search
+            frontier: Frontera (nueva o reanudada)
+            listing_pause: Pausa entre fichas en la fase 2 (None = sin pausa adicional)
+            save_every: Fichas procesadas entre escrituras de la frontera
+            checkpoint: Checkpoint donde acumular los resultados parciales (None = solo en memoria)
+            max_discovery_failures: Intentos fallidos seguidos (entre reanudaciones) de una página de
+                resultados tras los que el descubrimiento se da por terminado en ella
+        """
+        self.scraper = scraper
+        self.frontier = frontier
+        self.checkpoint = checkpoint or CrawlCheckpoint(scraper.name, {}, persist=False)
+        self.listing_pause = listing_pause
+        self.save_every = save_every
+        self.max_discovery_failures = max_discovery_failures
+        self.logger = scraper.logger
+
+    def discover(self, search_params: Dict, max_pages: int) -> int:
+        """Fase 1: recorrer las páginas de resultados añadiendo enlaces a la frontera"""
+        added = 0
+        page = self.frontier.next_page
+        while not self.frontier.discovery_complete and page <= max_pages:
+            if self.scraper._should_stop_search():
+                break
+
+            url = self.scraper.build_search_url({**search_params, 'page': page})
+            soup = self.scraper._make_request(url)
+            if not soup:
+                # Fallo de descarga (no es el fin de resultados): se reintenta al reanudar, salvo
+                # que la misma página falle una y otra vez
+                self.frontier.discovery_failures += 1
+                if self.frontier.discovery_failures >= self.max_discovery_failures:
+                    self.frontier.discovery_complete = True
+                    self.logger.warning(f"⚠️ Descubrimiento: la página {page} falló "
+                                        f"{self.frontier.discovery_failures} veces, se da por terminado")
+                else:
+                    self.logger.error(f"❌ Descubrimiento: no se pudo obtener la página {page} "
+                                      f"(intento {self.frontier.discovery_failures}/{self.max_discovery_failures})")
+                break
+            self.frontier.discovery_failures = 0
+
+            if self.scraper._is_end_of_results(soup, url):
+                self.frontier.discovery_complete = True
+                self.logger.info(f"🏁 Descubrimiento completado: fin de resultados en página {page}")
+                break
+
+            summaries = self.scraper._extract_listing_summaries(soup)
+            if not summaries:
+                self.frontier.discovery_complete = True
+                self.logger.info(f"🏁 Descubrimiento completado: página {page} sin enlaces")
+                break
+
+            page_added = sum(1 for s in summaries if self.frontier.add(s['url'], s.get('price'), page))
+            added += page_added
+            self.logger.info(f"🔎 Página {page}: {len(summaries)} enlaces ({page_added} nuevos en la frontera)")
+
+            page += 1
+            self.frontier.next_page = page
+            self.frontier.save()
+
+        if page > max_pages:
+            self.frontier.discovery_complete = True
+        self.frontier.save()
+        return added
+
+    def iter_scrape(self) -> Iterator[Dict]:
+        """Fase 2: descargar las fichas pendientes por orden de prioridad, emitiendo cada particular"""
+        found = 0
+        processed = 0
+        while not self.scraper._should_stop_search():
+            url = self.frontier.pop()
+            if url is None:
+                break
+
+            # Ya procesada por otra búsqueda del mismo lote (zonas solapadas)
+            if self.checkpoint.is_processed(url):
+                self.frontier.mark_done(url, found=False)
+                continue
+
+            try:
+                listing_data = self.scraper.scrape_listing(url)
+            except Exception as e:
+                self.logger.error(f"Error procesando {url}: {e}")
+                self.frontier.mark_failed(url)
+                listing_data = None
+            else:
+                self.frontier.mark_done(url, found=bool(listing_data))
+
+            self.checkpoint.record_listing(url, listing_data)
+            if listing_data:
+                found += 1
+                yield listing_data
+                self.logger.info(f"✅ Particular encontrado ({found} total, "
+                                 f"{self.frontier.entries[url]['priority']}): {listing_data.get('titulo', 'Sin título')}")
+
+            processed += 1
+            if processed % self.save_every == 0:
+                self.frontier.save()
+            if self.listing_pause:
+                self.listing_pause()
+
+        self.frontier.save()
+
+    def iter_run(self, search_params: Dict, max_pages: int) -> Iterator[Dict]:
+        """Ejecutar (o reanudar) ambas fases; la frontera se elimina al terminar sin interrupciones"""
+        self.discover(search_params, max_pages)
+        yield from self.iter_scrape()
+
+        self.logger.info(f"🗺️ Frontera {self.scraper.name}: {self.frontier.get_stats()}")
+        if self.frontier.discovery_complete and not self.frontier.pending():
+            self.frontier.clear()
+            self.checkpoint.complete()
+
+    def run(self, search_params: Dict, max_pages: int) -> List[Dict]:
+        """Ejecutar ambas fases y devolver la lista de particulares encontrados"""
+        return list(self.iter_run(search_params, max_pages))
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Capa de conexiones HTTP compartida por todos los scrapers HTTP
+Tamaño de pool por host, keep-alive TCP, cliente HTTP/2 opcional (httpx) y caché
+de resolución DNS, con métricas de reutilización de conexiones y handshakes TLS.
+"""
+
+import time
+import socket
+import logging
+import threading
+import weakref
+from collections import Counter
+from email.message import Message
+from typing import Dict
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers, select_proxy
+from urllib3.exceptions import MaxRetryError
+from urllib3.util.retry import Retry
+
+
+class DnsCache:
+    """
+    Caché con TTL sobre socket.getaddrinfo
+
+    Se instala de forma global para todo el proceso (también Selenium, el servidor de
+    métricas y cualquier otra librería), por eso solo se activa con connection_settings.dns_cache.
+    """
+
+    def __init__(self, ttl: float = 300.0):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._cache = {}
+        self._lock = threading.Lock()
+        self._original = None
+
+    def _getaddrinfo(self, host, port, family=0, type=0, proto=0, flags=0):
+        key = (host, port, family, type, proto, flags)
+        now = time.time()
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached and cached[0] > now:
+                self.hits += 1
+                return cached[1]
+
+        result = self._original(host, port, family, type, proto, flags)
+        with self._lock:
+            self._cache[key] = (now + self.ttl, result)
+            self.misses += 1
+        return result
+
+    @property
+    def installed(self) -> bool:
+        return self._original is not None
+
+    def install(self):
+        if not self.installed:
+            self._original = socket.getaddrinfo
+            socket.getaddrinfo = self._getaddrinfo
+
+    def uninstall(self):
+        if self.installed:
+            socket.getaddrinfo = self._original
+            self._original = None
+            self._cache.clear()
+
+    def get_stats(self) -> Dict:
+        return {'enabled': self.installed, 'hits': self.hits, 'misses': self.misses, 'entries': len(self._cache)}
+
+
+class KeepAliveHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter con SO_KEEPALIVE en los sockets del pool"""
+
+    def __init__(self, *args, keepalive: bool = True, **kwargs):
+        self.keepalive = keepalive
+        super().__init__(*args, **kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        if self.keepalive:
+            from urllib3.connection import HTTPConnection
+            kwargs['socket_options'] = HTTPConnection.default_socket_options + [
+                (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            ]
+        super().init_poolmanager(*args, **kwargs)
+
+
+class _RawHttpxResponse:
+    """Objeto 'raw' mínimo para que requests extraiga cookies y gestione redirecciones"""
+
+    def __init__(self, headers):
+        message = Message()
+        for name, value in headers.multi_items():
+            message[name] = value
+        self._original_response = type('OriginalResponse', (), {'msg': message})()
+
+    def read(self, *args, **kwargs):
+        return b''
+
+    def release_conn(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class HTTP2Adapter(BaseAdapter):
+    """
+    Adaptador de requests sobre httpx con HTTP/2 (mantiene la API de requests.Session)
+
+    Respeta como HTTPAdapter la estrategia Retry montada y los argumentos verify, cert y
+    proxies (un cliente httpx por combinación). Con stream=True el cuerpo ya viene
+    descargado y iter_content lo sirve desde memoria.
+    """
+
+    def __init__(self, max_connections: int = 10, max_keepalive: int = 10, keepalive_expiry: float = 30.0,
+                 max_retries=None):
+        import httpx  # ImportError si no está instalado: se usa HTTP/1.1
+
+        super().__init__()
+        self.limits = httpx.Limits(max_connections=max_connections,
+                                   max_keepalive_connections=max_keepalive,
+                                   keepalive_expiry=keepalive_expiry)
+        self.max_retries = Retry.from_int(max_retries if max_retries is not None else 0)
+        self.http_versions = Counter()
+        self._clients = {}  # (verify, cert, proxy) -> httpx.Client
+        self._lock = threading.Lock()
+
+    def _client(self, verify, cert, proxy):
+        import httpx
+
+        key = (verify, tuple(cert) if isinstance(cert, list) else cert, proxy)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                kwargs = {'proxy': proxy} if proxy else {}
+                client = self._clients[key] = httpx.Client(http2=True, follow_redirects=False, limits=self.limits,
+                                                           verify=verify, cert=key[1], **kwargs)
+            return client
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        import httpx
+
+        if isinstance(timeout, tuple):
+            connect, read = timeout
+            timeout = httpx.Timeout(read, connect=connect)
+
+        client = self._client(verify, cert, select_proxy(request.url, proxies))
+        retries = self.max_retries
+        while True:
+            try:
+                response = client.request(
+                    request.method, request.url,
+                    headers=dict(request.headers),
+                    content=request.body,
+                    timeout=timeout
+                )
+            except httpx.TransportError as e:
+                # Mismas excepciones que HTTPAdapter para que los llamantes no cambien
+                try:
+                    retries = retries.increment(request.method, request.url, error=e)
+                except MaxRetryError:
+                    if isinstance(e, httpx.TimeoutException):
+                        raise requests.exceptions.Timeout(e, request=request)
+                    raise requests.exceptions.ConnectionError(e, request=request)
+                retries.sleep()
+                continue
+
+            if retries.is_retry(request.method, response.status_code, 'Retry-After' in response.headers):
+                try:
+                    retries = retries.increment(request.method, request.url)
+                except MaxRetryError as e:
+                    if retries.raise_on_status:
+                        raise requests.exceptions.RetryError(e, request=request)
+                else:
+                    retries.sleep()
+                    continue
+            break
+        self.http_versions[response.http_version] += 1
+
+        result = requests.Response()
+        result.status_code = response.status_code
+        result.headers = CaseInsensitiveDict(response.headers)
+        result._content = response.content
+        result._content_consumed = True
+        result.encoding = get_encoding_from_headers(result.headers)
+        result.reason = response.reason_phrase
+        result.url = request.url
+        result.request = request
+        result.connection = self
+        result.raw = _RawHttpxResponse(response.headers)
+        result.elapsed = response.elapsed
+        return result
+
+    def close(self):
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+        for client in clients:
+            client.close()
+
+
+class ConnectionLayer:
+    """Fábrica de sesiones/adaptadores con la configuración de conexiones común"""
+
+    def __init__(self):
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.pool_connections = 10  # Hosts distintos con pool propio
+        self.pool_maxsize = 10  # Conexiones por host
+        self.pool_block = False
+        self.keepalive = True
+        self.keepalive_expiry = 30.0
+        self.http2 = False
+        self.dns_cache = DnsCache()
+        self._adapters = weakref.WeakSet()
+        self._http2_warned = False
+
+    def configure(self, pool_connections: int = 10, pool_maxsize: int = 10, pool_block: bool = False,
+                  keepalive: bool = True, keepalive_expiry: float = 30.0, http2: bool = False,
+                  dns_cache: bool = False, dns_ttl: float = 300.0):
+        """Aplicar la configuración (afecta a las sesiones creadas a partir de ahora)"""
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self.keepalive = keepalive
+        self.keepalive_expiry = keepalive_expiry
+        self.http2 = http2
+
+        self.dns_cache.ttl = dns_ttl
+        if dns_cache:
+            self.dns_cache.install()
+        else:
+            self.dns_cache.uninstall()
+
+    def create_adapter(self, max_retries=None) -> BaseAdapter:
+        """Adaptador HTTP/2 (si está activado y httpx disponible) o HTTP/1.1 con pool configurado"""
+        adapter = None
+        if self.http2:
+            try:
+                adapter = HTTP2Adapter(self.pool_maxsize, self.pool_maxsize, self.keepalive_expiry,
+                                       max_retries=max_retries)
+            except ImportError:
+                if not self._http2_warned:
+                    self.logger.warning("httpx[http2] no instalado - usando HTTP/1.1 (pip install 'httpx[http2]')")
+                    self._http2_warned = True
+
+        if adapter is None:
+            adapter = KeepAliveHTTPAdapter(
+                pool_connections=self.pool_connections,
+                pool_maxsize=self.pool_maxsize,
+                pool_block=self.pool_block,
+                max_retries=max_retries if max_retries is not None else 0,
+                keepalive=self.keepalive
+            )
+
+        self._adapters.add(adapter)
+        return adapter
+
+    def mount(self, session: requests.Session, max_retries=None) -> requests.Session:
+        """Montar el adaptador común en una sesión existente"""
+        adapter = self.create_adapter(max_retries)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def new_session(self, max_retries=None) -> requests.Session:
+        """Crear una sesión requests con el adaptador común"""
+        return self.mount(requests.Session(), max_retries)
+
+    def get_stats(self) -> Dict:
+        """Reutilización de conexiones y handshakes TLS de los pools activos"""
+        connections = requests_count = tls_handshakes = 0
+        http_versions = Counter()
+
+        for adapter in list(self._adapters):
+            if isinstance(adapter, HTTP2Adapter):
+                http_versions.update(adapter.http_versions)
+                continue
+
+            managers = [adapter.poolmanager] + list(getattr(adapter, 'proxy_manager', {}).values())
+            for manager in managers:
+                if manager is None:
+                    continue
+                for key in list(manager.pools.keys()):
+                    pool = manager.pools.get(key)
+                    if pool is None:
+                        continue
+                    connections += pool.num_connections
+                    requests_count += pool.num_requests
+                    if pool.scheme == 'https':
+                        tls_handshakes += pool.num_connections
+
+        return {
+            'requests': requests_count,
+            'connections': connections,
+            'reuse_ratio': round(1 - connections / requests_count, 3) if requests_count else None,
+            'tls_handshakes': tls_handshakes,
+            'http2_responses': dict(http_versions),
+            'dns_cache': self.dns_cache.get_stats(),
+        }
+
+
+# Instancia global para reutilizar
+connection_layer = ConnectionLayer()
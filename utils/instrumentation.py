@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Instrumentación de tiempos por fase del rastreo
+Tramos (spans) ligeros con context manager o decorador que acumulan, por portal
+y fase (espera de cortesía, petición HTTP, navegación, simulación humana,
+extracción, teléfono, guardado en Excel), número de llamadas, tiempo total,
+mínimo, máximo e histograma por cubos. Al final de cada rastreo se vuelca una
+tabla resumen al log y un JSON en data/runs/.
+
+Los tramos anidados cuentan también dentro del tramo que los contiene (p. ej. el
+teléfono forma parte de la extracción). Un tramo sin portal hereda el del tramo
+abierto más cercano en el mismo hilo.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+import functools
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+from utils.session_store import portal_key
+
+# Límites superiores (segundos) de los cubos del histograma; el último es +inf
+BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class StageStats:
+    """Contadores e histograma de una fase de un portal"""
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.min = float('inf')
+        self.max = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+
+    def observe(self, seconds: float, error: bool = False):
+        self.count += 1
+        self.errors += int(error)
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+                return
+        self.buckets[-1] += 1
+
+    def percentile(self, q: float) -> float:
+        """Percentil aproximado: límite superior del cubo que lo contiene (max en el cubo +inf)"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        accumulated = 0
+        for i, bound in enumerate(BUCKETS):
+            accumulated += self.buckets[i]
+            if accumulated >= target:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self) -> Dict:
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'total': round(self.total, 3),
+            'avg': round(self.total / self.count, 3) if self.count else 0.0,
+            'min': round(self.min, 3) if self.count else 0.0,
+            'max': round(self.max, 3),
+            'p50': round(self.percentile(0.5), 3),
+            'p95': round(self.percentile(0.95), 3),
+            'buckets': {('+inf' if i == len(BUCKETS) else str(BUCKETS[i])): n
+                        for i, n in enumerate(self.buckets)},
+        }
+
+
+class Instrumentation:
+    """Agregado thread-safe de tiempos por (portal, fase) del rastreo en curso"""
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._stats: Dict[Tuple[str, str], StageStats] = {}
+        self.started_at = time.time()
+
+    def _stack(self) -> List[str]:
+        if not hasattr(self._local, 'portals'):
+            self._local.portals = []
+        return self._local.portals
+
+    def record(self, stage: str, seconds: float, portal: Optional[str] = None, error: bool = False):
+        """Añadir una medida ya tomada"""
+        if not self.enabled:
+            return
+        key = (portal_key(portal) if portal else 'general', stage)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = StageStats()
+            stats.observe(seconds, error)
+
+    @contextmanager
+    def span(self, stage: str, portal: Optional[str] = None):
+        """
+        Medir el bloque como la fase stage del portal (nombre o URL)
+
+        Las excepciones se cuentan como error y se propagan sin cambios.
+        """
+        if not self.enabled:
+            yield
+            return
+        stack = self._stack()
+        portal = portal_key(portal) if portal else (stack[-1] if stack else None)
+        stack.append(portal)
+        started = time.perf_counter()
+        error = False
+        try:
+            yield
+        except BaseException:
+            error = True
+            raise
+        finally:
+            stack.pop()
+            self.record(stage, time.perf_counter() - started, portal, error)
+
+    def timed(self, stage: str):
+        """
+        Decorador de métodos: mide cada llamada como la fase stage
+
+        El portal se toma del argumento url (posicional o por nombre) o, si no lo
+        hay, del atributo name de la instancia (los scrapers); si tampoco, se hereda.
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(stage, self._infer_portal(args, kwargs)):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    @staticmethod
+    def _infer_portal(args, kwargs) -> Optional[str]:
+        url = kwargs.get('url')
+        if url is None and len(args) > 1 and isinstance(args[1], str):
+            url = args[1]
+        if isinstance(url, str) and '/' in url:
+            return url
+        name = getattr(args[0], 'name', None) if args else None
+        return name if isinstance(name, str) else None
+
+    def reset(self):
+        """Empezar un rastreo nuevo"""
+        with self._lock:
+            self._stats.clear()
+            self.started_at = time.time()
+
+    def get_stats(self) -> Dict[str, Dict[str, Dict]]:
+        """{portal: {fase: {count, errors, total, avg, min, max, p50, p95, buckets}}}"""
+        with self._lock:
+            items = [(portal, stage, stats.to_dict()) for (portal, stage), stats in self._stats.items()]
+        result: Dict[str, Dict[str, Dict]] = {}
+        for portal, stage, stats in sorted(items):
+            result.setdefault(portal, {})[stage] = stats
+        return result
+
+    def summary_table(self) -> str:
+        """Tabla de texto con una fila por (portal, fase), ordenada por tiempo total"""
+        rows = [(portal, stage, s) for portal, stages in self.get_stats().items() for stage, s in stages.items()]
+        if not rows:
+            return 'Sin medidas de tiempo'
+        rows.sort(key=lambda row: row[2]['total'], reverse=True)
+        header = f"{'portal':<12} {'fase':<18} {'n':>6} {'err':>4} {'total s':>9} {'media':>7} {'p50':>7} {'p95':>7} {'max':>7}"
+        lines = [header, '-' * len(header)]
+        for portal, stage, s in rows:
+            lines.append(f"{portal:<12} {stage:<18} {s['count']:>6} {s['errors']:>4} {s['total']:>9.2f} "
+                         f"{s['avg']:>7.2f} {s['p50']:>7.2f} {s['p95']:>7.2f} {s['max']:>7.2f}")
+        return '\n'.join(lines)
+
+    def dump(self, directory: str = os.path.join('data', 'runs')) -> Optional[str]:
+        """Escribir el resumen del rastreo en directory/run_<fecha>.json y a la tabla del log; devuelve la ruta"""
+        if not self.enabled:
+            return None
+        finished = time.time()
+        self.logger.info(f"Tiempos por fase del rastreo:\n{self.summary_table()}")
+        path = os.path.join(directory, time.strftime('run_%Y%m%d_%H%M%S.json', time.localtime(finished)))
+        try:
+            os.makedirs(directory, exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'started_at': self.started_at,
+                    'finished_at': finished,
+                    'seconds': round(finished - self.started_at, 1),
+                    'buckets': list(BUCKETS),
+                    'stages': self.get_stats(),
+                }, f, ensure_ascii=False, indent=2)
+        except OSError as e:
+            self.logger.warning(f"No se pudo guardar el resumen de tiempos en {path}: {e}")
+            return None
+        return path
+
+
+# Instancia global para reutilizar
+instrumentation = Instrumentation()
@@ -411,6 +411,40 @@ class LocationManager:
         
         return result
     
+    def get_portal_location(self, portal: str, location: str) -> Tuple[str, LocationType]:
+        """Convertir ubicación al formato del portal indicado (idealista, fotocasa o habitaclia)"""
+        converters = {
+            'idealista': self.get_idealista_location,
+            'fotocasa': self.get_fotocasa_location,
+            'habitaclia': self.get_habitaclia_location,
+        }
+        return converters[portal.lower()](location)
+    
+    def expand_locations(self, names: List[str]) -> List[str]:
+        """
+        Expandir una lista de ubicaciones para un rastreo por lotes
+        
+        Args:
+            names: Ubicaciones sueltas, 'all' (todas las conocidas) o
+                'provincia:<nombre>' (ciudades y comarcas de la provincia)
+            
+        Returns:
+            Ubicaciones sin repetir, en el orden indicado
+        """
+        expanded = []
+        for name in names:
+            name = name.lower().strip()
+            if not name:
+                continue
+            if name == 'all':
+                expanded.extend(self.get_suggested_locations())
+            elif name.startswith('provincia:'):
+                by_province = self.get_locations_by_province(name.split(':', 1)[1])
+                expanded.extend(by_province['cities'] + by_province['comarcas'])
+            else:
+                expanded.append(name)
+        return list(dict.fromkeys(expanded))
+    
     def search_locations(self, query: str) -> List[Tuple[str, LocationType]]:
         """Buscar ubicaciones que coincidan con la consulta"""
         query_lower = query.lower()
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Métricas del rastreo en formato de texto de Prometheus
+Contadores propios (páginas descargadas por técnica, intentos HTTP, fichas
+analizadas, particulares) más los que ya llevan los componentes: bloqueos por tipo
+del control de cortesía, circuitos, caché DNS y pools de sesiones, reinicios del
+driver, histogramas de tiempos por fase (incluida la escritura del Excel) y el
+estado del CrawlWorker. Se exportan a un fichero .prom (textfile collector de
+node_exporter) y/o en http://<host>:<port>/metrics, sin dependencias externas.
+
+Los histogramas por fase se reinician con cada rastreo (utils.instrumentation);
+Prometheus lo trata como un reinicio de contador.
+"""
+
+import os
+import time
+import logging
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+PREFIX = 'inmocapt_'
+
+# Tipo y ayuda de cada métrica (sin prefijo)
+HELP = {
+    'pages_fetched_total': ('counter', 'Páginas descargadas correctamente por portal y técnica (http, cloudscraper, manual_bypass, selenium)'),
+    'http_attempts_total': ('counter', 'Intentos de la escalera de técnicas HTTP por portal, técnica y resultado'),
+    'listings_parsed_total': ('counter', 'Fichas de anuncio descargadas y analizadas por portal'),
+    'particulares_total': ('counter', 'Particulares encontrados por portal'),
+    'blocks_total': ('counter', 'Bloqueos detectados por portal y tipo (403, 429, datadome, captcha)'),
+    'politeness_delay_seconds': ('gauge', 'Intervalo actual entre peticiones del portal'),
+    'circuit_open': ('gauge', 'Circuito abierto (1) o disponible (0) por portal y técnica'),
+    'dns_cache_hits_total': ('counter', 'Resoluciones DNS servidas desde la caché'),
+    'dns_cache_misses_total': ('counter', 'Resoluciones DNS que fueron a la red'),
+    'dns_cache_hit_ratio': ('gauge', 'Proporción de aciertos de la caché DNS'),
+    'session_pool_total': ('counter', 'Sesiones HTTP de respaldo creadas, reutilizadas o invalidadas por tipo'),
+    'connection_reuse_ratio': ('gauge', 'Proporción de peticiones HTTP servidas por conexiones reutilizadas'),
+    'driver_restarts_total': ('counter', 'Reinicios del driver de Chrome'),
+    'driver_recycles_total': ('counter', 'Reciclados del driver por motivo'),
+    'stage_seconds': ('histogram', 'Duración de cada fase del rastreo en curso por portal (excel_save = escritura del Excel)'),
+    'crawl_running': ('gauge', 'Hay un rastreo en marcha (1) o no (0)'),
+    'crawl_found': ('gauge', 'Particulares encontrados en el rastreo actual o el último'),
+    'crawl_saved': ('gauge', 'Anuncios guardados en el rastreo actual o el último por resultado'),
+    'crawl_portal_seconds': ('gauge', 'Segundos de rastreo por portal en el rastreo actual o el último'),
+    'scrape_timestamp_seconds': ('gauge', 'Instante en que se generaron estas métricas'),
+}
+
+Sample = Tuple[str, Dict[str, str], float]
+
+
+def _labels(labels: Dict[str, str]) -> str:
+    """{clave="valor",...} con los valores escapados como pide el formato de texto"""
+    if not labels:
+        return ''
+    pairs = (f'{key}="' + str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+             for key, value in sorted(labels.items()))
+    return '{' + ','.join(pairs) + '}'
+
+
+class MetricsRegistry:
+    """Contadores propios y recolectores de los componentes, con exportación a fichero o HTTP"""
+
+    def __init__(self):
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, Tuple], float] = {}
+        self._collectors: List[Callable[[], List[Sample]]] = [self._collect_components, self._collect_stages,
+                                                               self._collect_worker]
+        self._worker = None
+
+        self.textfile: Optional[str] = None
+        self.interval = 15.0
+        self._stop = threading.Event()
+        self._writer: Optional[threading.Thread] = None
+        self._server = None
+
+    def inc(self, name: str, value: float = 1, **labels):
+        """Incrementar un contador propio (name sin prefijo, p. ej. 'pages_fetched_total')"""
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def register_worker(self, worker):
+        """Publicar también el estado del CrawlWorker (rastreo en marcha, particulares, guardados)"""
+        self._worker = worker
+
+    def add_collector(self, collector: Callable[[], List[Sample]]):
+        """Recolector extra: función sin argumentos que devuelve [(nombre, etiquetas, valor), ...]"""
+        self._collectors.append(collector)
+
+    def _collect_components(self) -> List[Sample]:
+        # Importaciones aquí para no crear ciclos (antibot y los scrapers importan este módulo)
+        from utils.politeness import politeness
+        from utils.circuit_breaker import circuit_breakers
+        from utils.http_pool import connection_layer
+        from utils.antibot import antibot_manager
+        from utils.driver_lifecycle import driver_lifecycle
+        from utils.selenium_stealth import selenium_stealth
+
+        samples: List[Sample] = []
+        for portal, stats in politeness.get_metrics().items():
+            samples.append(('politeness_delay_seconds', {'portal': portal}, stats['delay_s']))
+            for kind, count in stats['blocks'].items():
+                samples.append(('blocks_total', {'portal': portal, 'kind': kind}, count))
+
+        for portal, techniques in circuit_breakers.get_stats().items():
+            for technique, state in techniques.items():
+                if isinstance(state, dict):
+                    samples.append(('circuit_open', {'portal': portal, 'technique': technique},
+                                    1 if state['state'] == 'open' else 0))
+
+        connections = connection_layer.get_stats()
+        dns = connections['dns_cache']
+        samples.append(('dns_cache_hits_total', {}, dns['hits']))
+        samples.append(('dns_cache_misses_total', {}, dns['misses']))
+        lookups = dns['hits'] + dns['misses']
+        if lookups:
+            samples.append(('dns_cache_hit_ratio', {}, round(dns['hits'] / lookups, 4)))
+        if connections['reuse_ratio'] is not None:
+            samples.append(('connection_reuse_ratio', {}, connections['reuse_ratio']))
+        for kind, events in antibot_manager.session_pool_stats.items():
+            for event, count in events.items():
+                samples.append(('session_pool_total', {'kind': kind, 'event': event}, count))
+
+        samples.append(('driver_restarts_total', {}, selenium_stealth.driver_restarts))
+        for reason, count in driver_lifecycle.recycles.items():
+            samples.append(('driver_recycles_total', {'reason': reason}, count))
+        return samples
+
+    def _collect_stages(self) -> List[Sample]:
+        """Histogramas de utils.instrumentation con cubos acumulados, _sum y _count"""
+        from utils.instrumentation import instrumentation, BUCKETS
+
+        samples: List[Sample] = []
+        for portal, stages in instrumentation.get_stats().items():
+            for stage, stats in stages.items():
+                labels = {'portal': portal, 'stage': stage}
+                accumulated = 0
+                for bound, count in zip(list(BUCKETS) + ['+Inf'], stats['buckets'].values()):
+                    accumulated += count
+                    samples.append(('stage_seconds_bucket', {**labels, 'le': str(bound)}, accumulated))
+                samples.append(('stage_seconds_sum', labels, stats['total']))
+                samples.append(('stage_seconds_count', labels, stats['count']))
+        return samples
+
+    def _collect_worker(self) -> List[Sample]:
+        if self._worker is None:
+            return []
+        snapshot = self._worker.poll()
+        samples: List[Sample] = [
+            ('crawl_running', {}, 1 if snapshot['status'] in ('running', 'cancelling') else 0),
+            ('crawl_found', {}, snapshot['found']),
+        ]
+        for result, count in snapshot['totals'].items():
+            samples.append(('crawl_saved', {'result': result}, count))
+        for portal, seconds in snapshot['timings'].items():
+            samples.append(('crawl_portal_seconds', {'portal': portal}, seconds))
+        return samples
+
+    def collect(self) -> List[Sample]:
+        """Todas las muestras: contadores propios, componentes, fases y trabajador"""
+        with self._lock:
+            samples: List[Sample] = [(name, dict(labels), value) for (name, labels), value in self._counters.items()]
+        for collector in self._collectors:
+            try:
+                samples.extend(collector())
+            except Exception as e:
+                self.logger.debug(f"Error recogiendo métricas de {getattr(collector, '__name__', collector)}: {e}")
+        samples.append(('scrape_timestamp_seconds', {}, round(time.time(), 3)))
+        return samples
+
+    def render(self) -> str:
+        """Exposición en formato de texto de Prometheus (versión 0.0.4)"""
+        families: Dict[str, List[Sample]] = {}
+        for name, labels, value in self.collect():
+            family = name
+            for suffix in ('_bucket', '_sum', '_count'):
+                if name.endswith(suffix) and name[:-len(suffix)] in HELP:
+                    family = name[:-len(suffix)]
+            families.setdefault(family, []).append((name, labels, value))
+
+        lines = []
+        for family in sorted(families):
+            kind, help_text = HELP.get(family, ('untyped', family))
+            lines.append(f"# HELP {PREFIX}{family} {help_text}")
+            lines.append(f"# TYPE {PREFIX}{family} {kind}")
+            for name, labels, value in families[family]:
+                lines.append(f"{PREFIX}{name}{_labels(labels)} {value}")
+        return '\n'.join(lines) + '\n'
+
+    def write_textfile(self, path: Optional[str] = None) -> bool:
+        """Escribir las métricas de forma atómica (el collector de node_exporter nunca lee un fichero a medias)"""
+        path = path or self.textfile
+        if not path:
+            return False
+        tmp_path = path + '.tmp'
+        try:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(self.render())
+            os.replace(tmp_path, path)
+            return True
+        except OSError as e:
+            self.logger.warning(f"No se pudieron escribir las métricas en {path}: {e}")
+            return False
+
+    def start(self, textfile: Optional[str] = None, port: Optional[int] = None, host: str = '127.0.0.1',
+              interval_seconds: float = 15.0) -> bool:
+        """
+        Empezar a exportar: fichero reescrito cada interval_seconds y/o servidor HTTP local
+
+        Returns:
+            True si quedó activa alguna de las dos salidas
+        """
+        self.stop()
+        self.textfile = textfile
+        self.interval = interval_seconds
+        self._stop.clear()
+
+        if textfile:
+            self._writer = threading.Thread(target=self._write_loop, name='metrics-textfile', daemon=True)
+            self._writer.start()
+            self.logger.info(f"📈 Métricas en {textfile} cada {interval_seconds:g}s")
+
+        if port:
+            self._server = self._start_server(host, port)
+        return bool(self._writer or self._server)
+
+    def _write_loop(self):
+        self.write_textfile()
+        while not self._stop.wait(self.interval):
+            self.write_textfile()
+
+    def _start_server(self, host: str, port: int):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        registry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                registry.logger.debug(f"Métricas {self.address_string()}: {format % args}")
+
+        try:
+            server = ThreadingHTTPServer((host, port), MetricsHandler)
+        except OSError as e:
+            self.logger.warning(f"No se pudo abrir el endpoint de métricas en {host}:{port}: {e}")
+            return None
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+        self.logger.info(f"📈 Métricas en http://{host}:{port}/metrics")
+        return server
+
+    def stop(self):
+        """Parar la exportación dejando el fichero con los valores finales"""
+        self._stop.set()
+        if self._writer is not None:
+            self._writer.join(timeout=5)
+            self._writer = None
+            self.write_textfile()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+# Instancia global para reutilizar
+metrics = MetricsRegistry()
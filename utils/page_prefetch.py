@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Precarga de páginas de resultados
+Mientras se procesan las fichas de la página N, un único hilo en segundo plano
+descarga la página N+1 (y opcionalmente N+2) para que el descubrimiento de enlaces
+no espere al scraping de detalle. Deja de adelantarse al detectar el final de los
+resultados (página sin enlaces o redirección a la primera página).
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Callable, Dict, Optional
+from bs4 import BeautifulSoup
+
+
+class ResultPagePrefetcher:
+    """Lookahead de páginas de resultados con un solo hilo de descarga"""
+
+    def __init__(self, fetch: Callable[[str], Optional[BeautifulSoup]], build_url: Callable[[int], str],
+                 is_last: Callable[[BeautifulSoup, str], bool], depth: int = 1,
+                 logger: Optional[logging.Logger] = None):
+        """
+        Args:
+            fetch: Descarga segura para usarse desde otro hilo (url -> soup o None)
+            build_url: URL de la página de resultados n
+            is_last: Indica si una página descargada marca el final de los resultados
+            depth: Páginas a adelantar (0 = desactivado, 1 = N+1, 2 = N+1 y N+2)
+            logger: Logger del scraper
+        """
+        self.fetch = fetch
+        self.build_url = build_url
+        self.is_last = is_last
+        self.depth = max(int(depth or 0), 0)
+        self.logger = logger or logging.getLogger(self.__class__.__name__)
+
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='page-prefetch') if self.depth else None
+        self._futures: Dict[int, Future] = {}
+        self._last_page: Optional[int] = None  # Última página con resultados detectada en segundo plano
+        self.stats = {'scheduled': 0, 'hits': 0, 'misses': 0, 'errors': 0}
+
+    def _fetch_page(self, page: int) -> Optional[BeautifulSoup]:
+        # Las tareas se ejecutan en orden: si la anterior era la última, no hay nada que descargar
+        if self._last_page is not None and page > self._last_page:
+            return None
+
+        url = self.build_url(page)
+        try:
+            soup = self.fetch(url)
+        except Exception as e:
+            self.stats['errors'] += 1
+            self.logger.debug(f"Error precargando página {page}: {e}")
+            return None
+
+        if soup is not None and self.is_last(soup, url):
+            self._last_page = page
+            self.logger.info(f"🏁 Precarga: fin de resultados detectado en página {page}")
+        return soup
+
+    def schedule_after(self, page: int, max_page: int):
+        """Lanzar en segundo plano la descarga de las páginas siguientes a 'page'"""
+        if not self._executor:
+            return
+
+        for next_page in range(page + 1, min(page + self.depth, max_page) + 1):
+            if next_page in self._futures:
+                continue
+            if self._last_page is not None and next_page > self._last_page:
+                break
+            self._futures[next_page] = self._executor.submit(self._fetch_page, next_page)
+            self.stats['scheduled'] += 1
+
+    def get(self, page: int) -> Optional[BeautifulSoup]:
+        """
+        Recoger la página precargada (esperando a que termine su descarga)
+
+        Returns:
+            BeautifulSoup de la página, o None si no se precargó o falló (descargar de forma síncrona)
+        """
+        future = self._futures.pop(page, None)
+        if future is None:
+            return None
+
+        soup = future.result()
+        self.stats['hits' if soup is not None else 'misses'] += 1
+        return soup
+
+    def close(self):
+        """Cancelar las precargas pendientes y liberar el hilo"""
+        for future in self._futures.values():
+            future.cancel()
+        self._futures.clear()
+        if self._executor:
+            self._executor.shutdown(wait=False)
+            self._executor = None
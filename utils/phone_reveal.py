@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Cola diferida de revelado de teléfonos
+Un navegador dedicado, en su propio hilo, hace los clics en "Ver teléfono" para que
+el rastreo principal no espere a cada interacción.
+"""
+
+import re
+import queue
+import logging
+import threading
+from typing import Dict, Optional
+from utils.selenium_stealth import SeleniumStealth, selenium_stealth
+
+
+class PhoneRevealQueue:
+    """Procesa revelados de teléfono en segundo plano con un SeleniumStealth propio"""
+
+    def __init__(self, headless: bool = False, min_digits: int = 9):
+        """
+        Args:
+            headless: Arrancar el navegador dedicado en modo headless
+            min_digits: Dígitos mínimos para aceptar el texto revelado como teléfono
+        """
+        self.headless = headless
+        self.min_digits = min_digits
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.stats = {'submitted': 0, 'revealed': 0, 'failed': 0, 'cancelled': 0}
+
+    def submit(self, url: str, record: Dict, button_selector: str, result_selector: str):
+        """
+        Encolar un revelado; al completarse se actualiza record['telefono'] en su sitio
+
+        Args:
+            url: URL del anuncio
+            record: Dict de datos del anuncio (ya devuelto al rastreo principal)
+            button_selector: Selector CSS del botón "Ver teléfono"
+            result_selector: Selector CSS del elemento con el teléfono revelado
+        """
+        self._queue.put((url, record, button_selector, result_selector))
+        self._count('submitted')
+        self._ensure_worker()
+
+    def _count(self, key: str, amount: int = 1):
+        """Actualizar stats desde cualquier hilo (rastreo principal o navegador dedicado)"""
+        with self._lock:
+            self.stats[key] += amount
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='phone-reveal', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        """Bucle del hilo: procesar la cola hasta que quede vacía y cerrar su navegador"""
+        # Navegador dedicado con el mismo pool de perfiles que el principal (otro slot)
+        stealth = SeleniumStealth(
+            profile_pool_dir=selenium_stealth.profile_pool_dir,
+            profile_pool_size=selenium_stealth.profile_pool_size
+        )
+
+        while True:
+            try:
+                item = self._queue.get(timeout=5)
+            except queue.Empty:
+                with self._lock:
+                    if self._queue.empty():
+                        self._thread = None
+                        break
+                continue
+
+            try:
+                self._reveal(stealth, *item)
+            except Exception as e:
+                self._count('failed')
+                self.logger.error(f"❌ Error revelando teléfono en {item[0]}: {e}")
+            finally:
+                self._queue.task_done()
+
+        stealth.close()
+
+    def _reveal(self, stealth: SeleniumStealth, url: str, record: Dict, button_selector: str,
+                result_selector: str):
+        if not stealth.driver and not stealth.setup_driver(headless=self.headless):
+            self._count('failed')
+            return
+
+        phone_text = stealth.click_button_and_get_content(
+            url=url,
+            button_selector=button_selector,
+            result_selector=result_selector,
+            wait_time=(2, 4)
+        )
+
+        if phone_text and len(re.sub(r'\D', '', phone_text)) >= self.min_digits:
+            record['telefono'] = phone_text
+            record['requiere_formulario'] = False
+            self._count('revealed')
+            self.logger.info(f"📞 Teléfono revelado en diferido: {phone_text} ({url})")
+        else:
+            self._count('failed')
+            self.logger.warning(f"⚠️ Revelado diferido sin teléfono válido: {url}")
+
+    def cancel(self) -> int:
+        """
+        Descartar los revelados aún en cola (el que esté en curso termina por su cuenta)
+
+        Returns:
+            Número de revelados descartados
+        """
+        dropped = 0
+        # Con el lock, el hilo del navegador no puede darse por terminado a mitad del vaciado
+        with self._lock:
+            while True:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                self._queue.task_done()
+                dropped += 1
+            self.stats['cancelled'] += dropped
+        return dropped
+
+    def get_stats(self) -> Dict:
+        """Copia coherente de los contadores para logging"""
+        with self._lock:
+            return dict(self.stats)
+
+    def pending(self) -> int:
+        """Revelados aún en cola"""
+        return self._queue.unfinished_tasks
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """
+        Esperar a que se procesen los revelados pendientes
+
+        Returns:
+            True si la cola quedó vacía dentro del timeout
+        """
+        if timeout is None:
+            self._queue.join()
+            return True
+
+        thread = self._thread
+        if thread:
+            thread.join(timeout)
+        return self.pending() == 0
+
+
+# Instancia global para reutilizar
+phone_reveal_queue = PhoneRevealQueue()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Control adaptativo de cortesía (AIMD) por portal
+El intervalo entre peticiones se reduce poco a poco mientras las páginas validan
+y se multiplica ante bloqueos (403, DataDome, captcha).
+"""
+
+import time
+import random
+import logging
+import threading
+from collections import deque
+from typing import Dict, Optional
+from utils.session_store import portal_key
+from utils.instrumentation import instrumentation
+
+
+class PolitenessController:
+    """Intervalo entre peticiones de un portal con disminución aditiva y aumento multiplicativo"""
+
+    def __init__(self, portal: str, initial_delay: float = 5.0, min_delay: float = 1.0,
+                 max_delay: float = 60.0, decrease_step: float = 0.25, backoff_factor: float = 2.0,
+                 jitter: float = 0.3, window: int = 50):
+        """
+        Args:
+            portal: Nombre del portal
+            initial_delay: Intervalo inicial (s) entre peticiones
+            min_delay: Intervalo mínimo al que puede bajar
+            max_delay: Intervalo máximo tras bloqueos repetidos
+            decrease_step: Segundos que se restan tras cada página válida
+            backoff_factor: Factor que multiplica el intervalo tras un bloqueo
+            jitter: Variación aleatoria relativa añadida al intervalo (0.3 = hasta +30%)
+            window: Resultados recientes usados para la tasa de bloqueo
+        """
+        self.portal = portal
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.decrease_step = decrease_step
+        self.backoff_factor = backoff_factor
+        self.jitter = jitter
+        self.delay = min(max(initial_delay, min_delay), max_delay)
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+        self._lock = threading.Lock()
+        self._next_slot = 0.0  # Instante a partir del cual puede salir la siguiente petición
+        self.recent = deque(maxlen=window)  # True = página válida, False = bloqueo
+        self.successes = 0
+        self.blocks: Dict[str, int] = {}
+
+    def wait(self):
+        """Esperar hasta que toque la siguiente petición al portal (reserva el turno de forma atómica)"""
+        with self._lock:
+            now = time.time()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.delay * (1 + random.uniform(0, self.jitter))
+        if slot > now:
+            with instrumentation.span('politeness_wait', self.portal):
+                time.sleep(slot - now)
+
+    def remaining(self) -> float:
+        """Segundos hasta el siguiente turno disponible (sin reservarlo)"""
+        return max(self._next_slot - time.time(), 0.0)
+
+    def record_success(self):
+        """Página válida: reducir el intervalo de forma aditiva"""
+        with self._lock:
+            self.successes += 1
+            self.recent.append(True)
+            self.delay = max(self.min_delay, self.delay - self.decrease_step)
+
+    def record_block(self, kind: str = 'block'):
+        """Bloqueo detectado: multiplicar el intervalo y aplazar el siguiente turno"""
+        with self._lock:
+            self.blocks[kind] = self.blocks.get(kind, 0) + 1
+            self.recent.append(False)
+            previous = self.delay
+            self.delay = min(self.max_delay, self.delay * self.backoff_factor)
+            self._next_slot = max(self._next_slot, time.time() + self.delay)
+        self.logger.warning(f"🐢 {self.portal}: bloqueo '{kind}' - intervalo {previous:.1f}s → {self.delay:.1f}s")
+
+    def get_block_rate(self) -> float:
+        """Proporción de bloqueos en la ventana reciente"""
+        if not self.recent:
+            return 0.0
+        return self.recent.count(False) / len(self.recent)
+
+    def get_metrics(self) -> Dict:
+        """Intervalo actual, ritmo equivalente y tasa de bloqueo"""
+        return {
+            'delay_s': round(self.delay, 2),
+            'rate_per_min': round(60.0 / self.delay, 2) if self.delay else None,
+            'block_rate': round(self.get_block_rate(), 3),
+            'successes': self.successes,
+            'blocks': dict(self.blocks),
+        }
+
+
+class PolitenessRegistry:
+    """Controladores por portal, configurables desde scraper_settings.<portal>.politeness"""
+
+    def __init__(self):
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self._controllers: Dict[str, PolitenessController] = {}
+        self._settings: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def configure(self, portal: str, settings: Optional[Dict]):
+        """Aplicar la configuración de cortesía del portal (recrea el controlador)"""
+        key = portal_key(portal)
+        with self._lock:
+            self._settings[key] = dict(settings or {})
+            self._controllers.pop(key, None)
+
+    def get(self, portal_or_url: str) -> PolitenessController:
+        """Obtener (o crear) el controlador del portal"""
+        key = portal_key(portal_or_url)
+        with self._lock:
+            if key not in self._controllers:
+                try:
+                    self._controllers[key] = PolitenessController(key, **self._settings.get(key, {}))
+                except TypeError as e:
+                    self.logger.warning(f"Configuración 'politeness' no válida para {key}: {e}")
+                    self._controllers[key] = PolitenessController(key)
+            return self._controllers[key]
+
+    def get_metrics(self) -> Dict[str, Dict]:
+        return {key: controller.get_metrics() for key, controller in self._controllers.items()}
+
+
+# Instancia global para reutilizar
+politeness = PolitenessRegistry()
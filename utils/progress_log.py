@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Registro acotado de eventos de progreso del rastreo
+Buffer circular thread-safe de eventos estructurados (tipo, portal, página, URL,
+instante) con número de secuencia creciente: añadir es O(1), la memoria no crece
+en rastreos de horas y la interfaz solo lee los eventos posteriores al último
+que ya pintó (since).
+"""
+
+import time
+import threading
+from collections import deque
+from typing import Dict, List, Optional
+
+
+class ProgressLog:
+    """Buffer circular de eventos de progreso con lectura incremental por número de secuencia"""
+
+    def __init__(self, maxlen: int = 500):
+        """
+        Args:
+            maxlen: Eventos que se conservan (los más antiguos se descartan)
+        """
+        self._events = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+        self._seq = 0
+
+    def append(self, kind: str, message: str = '', portal: Optional[str] = None, page: Optional[int] = None,
+               url: Optional[str] = None, timestamp: Optional[float] = None) -> int:
+        """Añadir un evento y devolver su número de secuencia"""
+        with self._lock:
+            self._seq += 1
+            self._events.append({
+                'seq': self._seq,
+                'time': timestamp or time.time(),
+                'kind': kind,
+                'portal': portal,
+                'page': page,
+                'url': url,
+                'message': message,
+            })
+            return self._seq
+
+    @property
+    def last_seq(self) -> int:
+        """Número de secuencia del último evento (0 si no hay ninguno)"""
+        return self._seq
+
+    def since(self, seq: int = 0, limit: Optional[int] = None) -> List[Dict]:
+        """
+        Eventos con número de secuencia mayor que seq, del más antiguo al más reciente
+
+        Recorre el buffer desde el final, así que el coste depende de los eventos
+        nuevos y no del tamaño del buffer. Si se pidió algo ya descartado, se
+        devuelven los que sigan disponibles; con limit, solo los limit más recientes.
+        """
+        with self._lock:
+            if seq >= self._seq:
+                return []
+            new = []
+            for event in reversed(self._events):
+                if event['seq'] <= seq or (limit is not None and len(new) >= limit):
+                    break
+                new.append(event)
+        new.reverse()
+        return new
+
+    def tail(self, count: int) -> List[Dict]:
+        """Últimos count eventos"""
+        return self.since(max(self._seq - count, 0))
+
+    def clear(self):
+        """Vaciar el buffer (la secuencia sigue creciendo para no confundir a los lectores)"""
+        with self._lock:
+            self._events.clear()
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    @staticmethod
+    def format(event: Dict) -> str:
+        """Línea legible de un evento para la interfaz o la consola"""
+        where = ' - '.join(str(part) for part in (event.get('portal'), event.get('page') and f"pág. {event['page']}")
+                           if part)
+        clock = time.strftime('%H:%M:%S', time.localtime(event['time']))
+        return f"[{clock}] {where + ': ' if where else ''}{event.get('message', '')}"
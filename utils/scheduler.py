@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Programación de rastreos por ubicación y portal
+Cada par (ubicación, portal) tiene su frecuencia objetivo (Barcelona cada hora, una
+comarca rural una vez al día) y un histórico de ejecuciones. En cada pasada se
+eligen, dentro de un presupuesto global de minutos de rastreo, las zonas más
+atrasadas respecto a su frecuencia y, a igualdad de retraso, las más productivas
+(particulares nuevos por minuto de rastreo).
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from typing import Dict, List, Optional
+
+
+class CrawlScheduler:
+    """Calendario de rastreos por (ubicación, portal) con estadísticas de cada ejecución, persistido en JSON"""
+
+    def __init__(self, path: Optional[str] = os.path.join('data', 'schedule.json'),
+                 default_interval_minutes: float = 1440, default_estimate_minutes: float = 10):
+        """
+        Args:
+            path: Fichero JSON del calendario (None = solo en memoria)
+            default_interval_minutes: Frecuencia de las zonas sin frecuencia propia
+            default_estimate_minutes: Duración estimada de una zona que aún no se ha rastreado
+        """
+        self.path = path
+        self.default_interval = default_interval_minutes
+        self.default_estimate = default_estimate_minutes
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self._lock = threading.Lock()
+        self.entries: Dict[str, Dict] = {}
+        self.load()
+
+    @staticmethod
+    def key(location: str, portal: str) -> str:
+        return f"{portal.lower()}|{location.lower().strip()}"
+
+    def load(self):
+        """Cargar el calendario guardado (vacío si no existe o está corrupto)"""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f).get('entries', {})
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Calendario no válido en {self.path}, se empieza de cero: {e}")
+
+    def save(self):
+        """Escribir el calendario de forma atómica"""
+        if not self.path:
+            return
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            tmp_path = self.path + '.tmp'
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump({'entries': self.entries}, f, ensure_ascii=False, indent=2)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                self.logger.warning(f"No se pudo guardar el calendario {self.path}: {e}")
+
+    def set_schedule(self, location: str, portal: str, interval_minutes: Optional[float] = None):
+        """Alta o cambio de frecuencia de una zona (conserva su histórico)"""
+        entry = self.entries.setdefault(self.key(location, portal), {
+            'location': location,
+            'portal': portal,
+            'last_run': None,
+            'runs': 0,
+            'new_listings': 0,
+            'crawl_seconds': 0.0,
+        })
+        entry['interval_minutes'] = interval_minutes or self.default_interval
+
+    def configure(self, schedules: List[Dict], portals: List[str]):
+        """
+        Sincronizar el calendario con la configuración (scheduler_settings.schedules)
+
+        Las zonas que ya no están configuradas se eliminan del calendario con su histórico.
+
+        Args:
+            schedules: [{'location': ..., 'interval_minutes': ..., 'portals': [...] (opcional)}, ...]
+            portals: Portales por defecto de las zonas que no indican los suyos
+        """
+        configured = set()
+        for schedule in schedules:
+            for portal in schedule.get('portals') or portals:
+                self.set_schedule(schedule['location'], portal, schedule.get('interval_minutes'))
+                configured.add(self.key(schedule['location'], portal))
+
+        removed = [key for key in self.entries if key not in configured]
+        for key in removed:
+            del self.entries[key]
+        if removed:
+            self.logger.info(f"🗑️ Zonas retiradas del calendario: {', '.join(sorted(removed))}")
+        self.save()
+
+    def staleness(self, entry: Dict, now: Optional[float] = None) -> float:
+        """Retraso respecto a la frecuencia objetivo (1.0 = toca ahora; infinito si nunca se rastreó)"""
+        if not entry.get('last_run'):
+            return float('inf')
+        now = now or time.time()
+        return (now - entry['last_run']) / 60.0 / (entry.get('interval_minutes') or self.default_interval)
+
+    @staticmethod
+    def productivity(entry: Dict) -> float:
+        """Particulares nuevos por minuto de rastreo (histórico de la zona)"""
+        minutes = entry.get('crawl_seconds', 0) / 60.0
+        return entry.get('new_listings', 0) / minutes if minutes > 0 else 0.0
+
+    def estimate_minutes(self, entry: Dict) -> float:
+        """Duración esperada de la próxima pasada por la zona (media histórica)"""
+        if entry.get('runs'):
+            return entry.get('crawl_seconds', 0) / 60.0 / entry['runs']
+        return self.default_estimate
+
+    def plan(self, budget_minutes: float, now: Optional[float] = None) -> List[Dict]:
+        """
+        Zonas a rastrear en esta pasada, en orden, sin superar el presupuesto
+
+        Solo entran las zonas que ya tocan (retraso >= 1). Se ordenan por retraso
+        ponderado por productividad y se añaden mientras quepa su duración estimada
+        (la primera siempre entra, aunque por sí sola supere el presupuesto).
+        """
+        now = now or time.time()
+        due = [entry for entry in self.entries.values() if self.staleness(entry, now) >= 1.0]
+        due.sort(key=lambda e: (self.staleness(e, now) * (1.0 + self.productivity(e)), self.productivity(e)),
+                 reverse=True)
+
+        planned = []
+        remaining = budget_minutes
+        for entry in due:
+            estimate = self.estimate_minutes(entry)
+            if planned and estimate > remaining:
+                continue
+            planned.append(entry)
+            remaining -= estimate
+        return planned
+
+    def record_run(self, location: str, portal: str, new_listings: int, seconds: float, status: str = 'ok'):
+        """
+        Registrar una pasada por la zona
+
+        Solo las completas ('ok') dejan la zona al día; una cancelada o cortada por el
+        presupuesto ('partial') sigue pendiente y vuelve a entrar en la siguiente pasada.
+        """
+        entry = self.entries.get(self.key(location, portal))
+        if entry is None:
+            self.set_schedule(location, portal)
+            entry = self.entries[self.key(location, portal)]
+
+        entry['runs'] += 1
+        entry['new_listings'] += new_listings
+        entry['crawl_seconds'] += seconds
+        entry['last_new'] = new_listings
+        entry['last_seconds'] = round(seconds, 1)
+        entry['last_status'] = status
+        if status == 'ok':
+            entry['last_run'] = time.time()
+        self.save()
+
+    def get_stats(self, now: Optional[float] = None) -> List[Dict]:
+        """Estado de cada zona: retraso, productividad y duración estimada"""
+        now = now or time.time()
+        stats = []
+        for entry in self.entries.values():
+            staleness = self.staleness(entry, now)
+            stats.append({
+                **entry,
+                'staleness': None if staleness == float('inf') else round(staleness, 2),
+                'new_per_minute': round(self.productivity(entry), 3),
+                'estimate_minutes': round(self.estimate_minutes(entry), 1),
+            })
+        return sorted(stats, key=lambda s: (s['staleness'] is not None, -(s['staleness'] or 0)))
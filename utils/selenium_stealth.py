@@ -4,11 +4,20 @@ Selenium Stealth Scraper para casos extremos como Idealista
 Usa navegador real con técnicas anti-detección avanzadas
 """
 
+import os
 import time
+import json
+import base64
 import random
 import logging
-from typing import Optional, Dict
+import threading
+from typing import Optional, Dict, List
 from bs4 import BeautifulSoup
+from utils.session_store import session_store, portal_key
+from utils.behavior_policy import behavior_policies
+from utils.politeness import politeness
+from utils.instrumentation import instrumentation
+from utils.metrics import metrics
 
 # Suprimir logs innecesarios de Selenium
 import urllib3
@@ -19,198 +28,367 @@ logging.getLogger('selenium').setLevel(logging.CRITICAL)
 logging.getLogger('urllib3').setLevel(logging.CRITICAL)
 logging.getLogger('webdriver_manager').setLevel(logging.CRITICAL)
 
+# Argumentos de Chrome (sin duplicados) - plantilla común para todos los drivers
+CHROME_ARGUMENTS = (
+    "--no-sandbox",
+    "--disable-dev-shm-usage",
+    "--disable-gpu",
+    "--window-size=1920,1080",
+    
+    # Anti-detección avanzada contra DataDome
+    "--disable-blink-features=AutomationControlled",
+    
+    # Headers más realistas específicos para España/Fotocasa
+    "--accept-lang=es-ES,es;q=0.9,en;q=0.8",
+    "--accept-encoding=gzip, deflate, br",
+    
+    # CONFIGURACIÓN ESPECÍFICA ANTI-FOTOCASA
+    "--disable-web-security",
+    "--disable-features=VizDisplayCompositor,TranslateUI,BlinkGenPropertyTrees",
+    "--disable-background-networking",
+    "--disable-sync",
+    "--disable-translate",
+    "--disable-ipc-flooding-protection",
+    "--disable-hang-monitor",
+    "--disable-client-side-phishing-detection",
+    "--disable-component-update",
+    "--disable-background-timer-throttling",
+    "--disable-renderer-backgrounding",
+    "--disable-backgrounding-occluded-windows",
+    
+    # Deshabilitar características detectables por DataDome
+    "--disable-plugins-discovery",
+    "--disable-extensions",
+    "--disable-default-apps",
+    
+    # Evitar detección de canvas y WebGL - MÁS AGRESIVO
+    "--disable-canvas-aa",
+    "--disable-2d-canvas-clip-aa",
+    "--disable-gl-drawing-for-tests",
+    "--disable-accelerated-2d-canvas",
+    "--disable-accelerated-jpeg-decoding",
+    "--disable-accelerated-mjpeg-decode",
+    "--disable-app-list-dismiss-on-blur",
+    "--disable-accelerated-video-decode",
+    
+    # Configuración de red más realista
+    "--dns-prefetch-disable",
+    
+    # NUEVAS TÉCNICAS ANTI-DATADOME
+    "--disable-software-rasterizer",
+    "--no-zygote",
+    "--disable-field-trial-config",
+    
+    # Simular navegador normal mejor
+    "--enable-features=NetworkService,NetworkServiceLogging",
+    "--force-color-profile=srgb",
+    "--metrics-recording-only",
+    "--use-mock-keychain",
+    
+    # Configuración de memoria y rendimiento
+    "--memory-pressure-off",
+    "--max_old_space_size=4096",
+    
+    # Suprimir logs del ChromeDriver
+    "--log-level=3",  # Solo errores críticos
+    "--silent",
+    "--disable-logging",
+)
+
+# Prefs adicionales para evadir detección
+CHROME_PREFS = {
+    "profile.default_content_setting_values.notifications": 2,
+    "profile.default_content_settings.popups": 0,
+    "profile.managed_default_content_settings.images": 1,  # Cargar imágenes para parecer más humano
+    "profile.default_content_setting_values.media_stream": 2,
+}
+
+# Rotar User Agents realistas
+USER_AGENTS = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/118.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:109.0) Gecko/20100101 Firefox/119.0",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Edge/119.0.0.0"
+]
+
+# JavaScript avanzado para evadir DataDome y otros detectores
+STEALTH_JS = """
+// Ocultar webdriver property
+Object.defineProperty(navigator, 'webdriver', {get: () => undefined});
+
+// Simular propiedades de navegador real
+Object.defineProperty(navigator, 'languages', {get: () => ['es-ES', 'es', 'en']});
+Object.defineProperty(navigator, 'plugins', {get: () => [1, 2, 3, 4, 5]});
+
+// Evitar detección de canvas fingerprinting
+const getContext = HTMLCanvasElement.prototype.getContext;
+HTMLCanvasElement.prototype.getContext = function(contextType, ...args) {
+    if (contextType === '2d') {
+        const context = getContext.call(this, contextType, ...args);
+        const originalFillText = context.fillText;
+        context.fillText = function(text, x, y, maxWidth) {
+            return originalFillText.call(this, text, x, y, maxWidth);
+        };
+        return context;
+    }
+    return getContext.call(this, contextType, ...args);
+};
+
+// Simular timezone y configuración regional
+Object.defineProperty(Intl.DateTimeFormat.prototype, 'resolvedOptions', {
+    value: function() {
+        return {
+            locale: 'es-ES',
+            timeZone: 'Europe/Madrid',
+            hour12: false
+        };
+    }
+});
+
+// Evitar detección por timing de eventos
+const originalAddEventListener = EventTarget.prototype.addEventListener;
+EventTarget.prototype.addEventListener = function(type, listener, options) {
+    return originalAddEventListener.call(this, type, listener, options);
+};
+"""
+
+# Caché en disco de la ruta de ChromeDriver resuelta por webdriver-manager
+DRIVER_PATH_CACHE_FILE = os.path.join('data', 'cache', 'chromedriver.json')
+DRIVER_PATH_CACHE_TTL = 7 * 24 * 3600  # Revalidar con webdriver-manager una vez por semana
+
+# Slots del pool de perfiles en uso por cualquier instancia (Chrome no admite un perfil en dos procesos)
+_profile_slots_in_use = set()
+_profile_slots_lock = threading.Lock()
+
+
 class SeleniumStealth:
     """Selenium con técnicas stealth para evadir detección"""
     
-    def __init__(self):
+    def __init__(self, profile_pool_dir: Optional[str] = None, profile_pool_size: int = 2):
+        """
+        Args:
+            profile_pool_dir: Directorio base para perfiles persistentes de Chrome (--user-data-dir).
+                None = perfil temporal nuevo en cada arranque
+            profile_pool_size: Número de slots de perfil disponibles en el pool
+        """
         self.driver = None
         self.logger = logging.getLogger(self.__class__.__name__)
+        self.network_capture = False  # Logs de rendimiento (CDP) activos en el driver actual
+        self.driver_restarts = 0
+        self._setup_kwargs = {}  # Parámetros del último setup_driver, reutilizados al reiniciar
+        
+        self.profile_pool_dir = profile_pool_dir
+        self.profile_pool_size = profile_pool_size
+        self.profile_slot = None  # Slot de perfil ocupado por el driver actual
+        
+        self._driver_path = None  # Ruta de ChromeDriver resuelta (caché en memoria)
+        self.startup_times = []  # Segundos por arranque de driver
+        
+        # Persistencia de sesión por portal (cookies + localStorage) entre ejecuciones
+        self.persist_sessions = True
+        self.session_save_interval = 60  # Segundos mínimos entre guardados del mismo portal
+        self.user_agent = None  # User-Agent efectivo del driver actual
+        self._warm_domains = set()  # Portales con sesión ya calentada en el driver actual
+        self._session_saved_at = {}
+    
+    def _resolve_driver_path(self) -> str:
+        """Resolver la ruta de ChromeDriver usando caché en memoria y en disco"""
+        if self._driver_path and os.path.exists(self._driver_path):
+            return self._driver_path
+        
+        # Caché en disco: evita la consulta de versión de webdriver-manager en cada arranque
+        try:
+            with open(DRIVER_PATH_CACHE_FILE, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+            if (os.path.exists(cached.get('path', '')) and
+                    time.time() - cached.get('resolved_at', 0) < DRIVER_PATH_CACHE_TTL):
+                self._driver_path = cached['path']
+                return self._driver_path
+        except (OSError, ValueError):
+            pass
+        
+        from webdriver_manager.chrome import ChromeDriverManager
+        
+        os.environ['WDM_LOG_LEVEL'] = '0'  # Suprimir logs de WebDriver Manager
+        self._driver_path = ChromeDriverManager().install()
+        
+        try:
+            os.makedirs(os.path.dirname(DRIVER_PATH_CACHE_FILE), exist_ok=True)
+            with open(DRIVER_PATH_CACHE_FILE, 'w', encoding='utf-8') as f:
+                json.dump({'path': self._driver_path, 'resolved_at': time.time()}, f)
+        except OSError as e:
+            self.logger.debug(f"No se pudo guardar la caché de ChromeDriver: {e}")
+        
+        return self._driver_path
+    
+    def configure_profile_pool(self, profile_pool_dir: Optional[str], profile_pool_size: int = 2):
+        """Configurar el pool de perfiles persistentes (se aplica en el siguiente arranque)"""
+        self.profile_pool_dir = profile_pool_dir
+        self.profile_pool_size = profile_pool_size
+        if profile_pool_dir:
+            os.makedirs(profile_pool_dir, exist_ok=True)
+            self.logger.info(f"📁 Pool de perfiles Chrome: {profile_pool_dir} ({profile_pool_size} slots)")
+    
+    def _acquire_profile_slot(self, preferred: Optional[int] = None) -> Optional[int]:
+        """Reservar un slot libre del pool de perfiles (None si no hay pool o está lleno)"""
+        if not self.profile_pool_dir:
+            return None
+        
+        with _profile_slots_lock:
+            candidates = [preferred] if preferred is not None else range(self.profile_pool_size)
+            for slot in candidates:
+                key = (self.profile_pool_dir, slot)
+                if key not in _profile_slots_in_use:
+                    _profile_slots_in_use.add(key)
+                    return slot
+        
+        self.logger.warning("AVISO: Pool de perfiles lleno - usando perfil temporal")
+        return None
+    
+    def _release_profile_slot(self):
+        """Liberar el slot de perfil del driver actual"""
+        if self.profile_slot is not None:
+            with _profile_slots_lock:
+                _profile_slots_in_use.discard((self.profile_pool_dir, self.profile_slot))
+            self.profile_slot = None
+    
+    def get_profile_dir(self) -> Optional[str]:
+        """Directorio de perfil de Chrome del driver actual (None si es temporal)"""
+        if self.profile_slot is None:
+            return None
+        return os.path.abspath(os.path.join(self.profile_pool_dir, f"profile_{self.profile_slot}"))
+    
+    def _build_options(self, user_agent: str, headless: bool, proxy_url: Optional[str],
+                       capture_network: bool):
+        """Construir Options de Chrome a partir de la plantilla precalculada"""
+        from selenium.webdriver.chrome.options import Options
+        
+        chrome_options = Options()
+        for argument in CHROME_ARGUMENTS:
+            chrome_options.add_argument(argument)
+        
+        chrome_options.add_argument(f"--user-agent={user_agent}")
+        chrome_options.add_experimental_option("excludeSwitches", ["enable-automation", "enable-logging"])
+        chrome_options.add_experimental_option('useAutomationExtension', False)
+        chrome_options.add_experimental_option("prefs", CHROME_PREFS)
+        
+        # Para DataDome, es mejor NO usar headless
+        if headless:
+            chrome_options.add_argument("--headless=new")
+        
+        if proxy_url:
+            chrome_options.add_argument(f"--proxy-server={proxy_url}")
+        
+        profile_dir = self.get_profile_dir()
+        if profile_dir:
+            chrome_options.add_argument(f"--user-data-dir={profile_dir}")
+        
+        # Captura de red vía logs de rendimiento (Network.* de CDP)
+        if capture_network:
+            chrome_options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+        
+        return chrome_options
+    
+    def setup_driver(self, headless: bool = False, use_proxy: bool = False, proxy_url: str = None,
+                     capture_network: bool = False, profile_slot: Optional[int] = None):
+        """Configurar WebDriver con máxima evasión anti-DataDome y rotación
+        
+        Args:
+            capture_network: Activar logs de rendimiento/red de Chrome para capturar
+                las respuestas JSON (XHR) que solicita la propia página
+            profile_slot: Slot preferido del pool de perfiles persistentes (si hay pool configurado)
+        """
+        self._setup_kwargs = {
+            'headless': headless,
+            'use_proxy': use_proxy,
+            'proxy_url': proxy_url,
+            'capture_network': capture_network,
+            'profile_slot': profile_slot,
+        }
+        
+        started = time.time()
         
-    def setup_driver(self, headless: bool = False, use_proxy: bool = False, proxy_url: str = None):  
-        """Configurar WebDriver con máxima evasión anti-DataDome y rotación"""
         try:
             from selenium import webdriver
-            from selenium.webdriver.chrome.options import Options
             from selenium.webdriver.chrome.service import Service
-            from selenium.webdriver.common.by import By
-            from webdriver_manager.chrome import ChromeDriverManager
-            
-            chrome_options = Options()
-            
-            # Rotar User Agents realistas
-            user_agents = [
-                "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-                "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36",
-                "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/118.0.0.0 Safari/537.36",
-                "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:109.0) Gecko/20100101 Firefox/119.0",
-                "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Edge/119.0.0.0"
-            ]
             
-            import random
-            selected_ua = random.choice(user_agents)
+            selected_ua = random.choice(USER_AGENTS)
             self.logger.info(f"🎭 User Agent seleccionado: {selected_ua[:50]}...")
             
-            # Para DataDome, es mejor NO usar headless
             if headless:
-                chrome_options.add_argument("--headless=new")
                 self.logger.warning("AVISO: Modo headless activado - DataDome puede detectar esto mas facilmente")
             else:
                 self.logger.info("Modo visible activado - mejor para evadir DataDome")
             
-            # Configuración proxy si se proporciona
             if use_proxy and proxy_url:
-                chrome_options.add_argument(f"--proxy-server={proxy_url}")
                 self.logger.info(f"🔄 Usando proxy: {proxy_url}")
+            if capture_network:
+                self.logger.info("📡 Captura de red (performance logs) activada")
+            
+            if self.profile_slot is None:
+                self.profile_slot = self._acquire_profile_slot(profile_slot)
+            
+            chrome_options = self._build_options(
+                selected_ua, headless, proxy_url if use_proxy else None, capture_network
+            )
             
-            chrome_options.add_argument("--no-sandbox")
-            chrome_options.add_argument("--disable-dev-shm-usage")
-            chrome_options.add_argument("--disable-gpu")
-            chrome_options.add_argument("--window-size=1920,1080")
-            
-            # Anti-detección avanzada contra DataDome
-            chrome_options.add_argument("--disable-blink-features=AutomationControlled")
-            chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
-            chrome_options.add_experimental_option('useAutomationExtension', False)
-            
-            # Headers más realistas específicos para España/Fotocasa
-            chrome_options.add_argument(f"--user-agent={selected_ua}")
-            chrome_options.add_argument("--accept-lang=es-ES,es;q=0.9,en;q=0.8")
-            chrome_options.add_argument("--accept-encoding=gzip, deflate, br")
-            
-            # CONFIGURACIÓN ESPECÍFICA ANTI-FOTOCASA
-            chrome_options.add_argument("--disable-web-security")
-            chrome_options.add_argument("--disable-features=VizDisplayCompositor,TranslateUI,BlinkGenPropertyTrees")
-            chrome_options.add_argument("--disable-background-networking")
-            chrome_options.add_argument("--disable-sync")
-            chrome_options.add_argument("--disable-translate")
-            chrome_options.add_argument("--disable-ipc-flooding-protection")
-            chrome_options.add_argument("--disable-hang-monitor")
-            chrome_options.add_argument("--disable-client-side-phishing-detection")
-            chrome_options.add_argument("--disable-component-update")
-            chrome_options.add_argument("--disable-background-timer-throttling")
-            chrome_options.add_argument("--disable-renderer-backgrounding")
-            chrome_options.add_argument("--disable-backgrounding-occluded-windows")
-            
-            # Deshabilitar características detectables por DataDome
-            chrome_options.add_argument("--disable-plugins-discovery")
-            chrome_options.add_argument("--disable-extensions")
-            chrome_options.add_argument("--disable-web-security")
-            chrome_options.add_argument("--disable-features=VizDisplayCompositor")
-            chrome_options.add_argument("--disable-ipc-flooding-protection")
-            
-            # Evitar detección de canvas y WebGL - MÁS AGRESIVO
-            chrome_options.add_argument("--disable-canvas-aa")
-            chrome_options.add_argument("--disable-2d-canvas-clip-aa")
-            chrome_options.add_argument("--disable-gl-drawing-for-tests")
-            chrome_options.add_argument("--disable-accelerated-2d-canvas")
-            chrome_options.add_argument("--disable-accelerated-jpeg-decoding")
-            chrome_options.add_argument("--disable-accelerated-mjpeg-decode")
-            chrome_options.add_argument("--disable-app-list-dismiss-on-blur")
-            chrome_options.add_argument("--disable-accelerated-video-decode")
-            
-            # Configuración de red más realista
-            chrome_options.add_argument("--max_old_space_size=4096")
-            chrome_options.add_argument("--dns-prefetch-disable")
-            
-            # NUEVAS TÉCNICAS ANTI-DATADOME
-            chrome_options.add_argument("--disable-dev-shm-usage")
-            chrome_options.add_argument("--disable-software-rasterizer")
-            chrome_options.add_argument("--no-zygote")
-            chrome_options.add_argument("--disable-background-timer-throttling")
-            chrome_options.add_argument("--disable-backgrounding-occluded-windows")
-            chrome_options.add_argument("--disable-renderer-backgrounding")
-            chrome_options.add_argument("--disable-field-trial-config")
-            chrome_options.add_argument("--disable-ipc-flooding-protection")
-            
-            # Simular navegador normal mejor
-            chrome_options.add_argument("--enable-features=NetworkService,NetworkServiceLogging")
-            chrome_options.add_argument("--force-color-profile=srgb")
-            chrome_options.add_argument("--metrics-recording-only")
-            chrome_options.add_argument("--use-mock-keychain")
-            
-            # Prefs adicionales para evadir detección
-            prefs = {
-                "profile.default_content_setting_values.notifications": 2,
-                "profile.default_content_settings.popups": 0,
-                "profile.managed_default_content_settings.images": 1,  # Cargar imágenes para parecer más humano
-                "profile.default_content_setting_values.media_stream": 2,
-            }
-            chrome_options.add_experimental_option("prefs", prefs)
-            chrome_options.add_argument("--disable-default-apps")
-            chrome_options.add_argument("--disable-extensions")
-            
-            # Configuración de memoria y rendimiento
-            chrome_options.add_argument("--memory-pressure-off")
-            chrome_options.add_argument("--max_old_space_size=4096")
-            
-            # Suprimir logs del ChromeDriver
-            chrome_options.add_argument("--log-level=3")  # Solo errores críticos
-            chrome_options.add_argument("--silent")
-            chrome_options.add_argument("--disable-logging")
-            chrome_options.add_experimental_option('excludeSwitches', ['enable-logging'])
-            chrome_options.add_experimental_option('useAutomationExtension', False)
-            
-            # Crear driver con WebDriver Manager (silencioso)
-            import os
-            os.environ['WDM_LOG_LEVEL'] = '0'  # Suprimir logs de WebDriver Manager
-            service = Service(ChromeDriverManager().install(), log_path=os.devnull)
+            # Crear driver con la ruta de ChromeDriver cacheada (silencioso)
+            service = Service(self._resolve_driver_path(), log_path=os.devnull)
             self.driver = webdriver.Chrome(service=service, options=chrome_options)
             
-            # JavaScript avanzado para evadir DataDome y otros detectores
-            stealth_js = """
-            // Ocultar webdriver property
-            Object.defineProperty(navigator, 'webdriver', {get: () => undefined});
-            
-            // Simular propiedades de navegador real
-            Object.defineProperty(navigator, 'languages', {get: () => ['es-ES', 'es', 'en']});
-            Object.defineProperty(navigator, 'plugins', {get: () => [1, 2, 3, 4, 5]});
-            
-            // Evitar detección de canvas fingerprinting
-            const getContext = HTMLCanvasElement.prototype.getContext;
-            HTMLCanvasElement.prototype.getContext = function(contextType, ...args) {
-                if (contextType === '2d') {
-                    const context = getContext.call(this, contextType, ...args);
-                    const originalFillText = context.fillText;
-                    context.fillText = function(text, x, y, maxWidth) {
-                        return originalFillText.call(this, text, x, y, maxWidth);
-                    };
-                    return context;
-                }
-                return getContext.call(this, contextType, ...args);
-            };
-            
-            // Simular timezone y configuración regional
-            Object.defineProperty(Intl.DateTimeFormat.prototype, 'resolvedOptions', {
-                value: function() {
-                    return {
-                        locale: 'es-ES',
-                        timeZone: 'Europe/Madrid',
-                        hour12: false
-                    };
-                }
-            });
-            
-            // Evitar detección por timing de eventos
-            const originalAddEventListener = EventTarget.prototype.addEventListener;
-            EventTarget.prototype.addEventListener = function(type, listener, options) {
-                return originalAddEventListener.call(this, type, listener, options);
-            };
-            """
-            
-            self.driver.execute_script(stealth_js)
-            
-            self.logger.info("OK: Selenium WebDriver configurado con tecnicas stealth anti-DataDome")
+            self.driver.execute_script(STEALTH_JS)
+            self.network_capture = capture_network
+            self.user_agent = selected_ua
+            self._warm_domains = set()
+            behavior_policies.reset_sessions(self)
+            
+            startup = time.time() - started
+            self.startup_times.append(startup)
+            self.logger.info(f"OK: Selenium WebDriver configurado con tecnicas stealth anti-DataDome ({startup:.1f}s)")
             return True
             
         except ImportError:
             self.logger.error("ERROR: Selenium no esta instalado. Ejecuta: pip install selenium webdriver-manager")
+            self._release_profile_slot()
             return False
         except Exception as e:
             self.logger.error(f"ERROR: Error configurando WebDriver: {str(e)}")
+            self._release_profile_slot()
             return False
     
+    def get_startup_stats(self) -> Dict:
+        """Métrica de tiempos de arranque de Chrome"""
+        if not self.startup_times:
+            return {'count': 0, 'last': 0.0, 'avg': 0.0, 'max': 0.0, 'total': 0.0}
+        
+        return {
+            'count': len(self.startup_times),
+            'last': round(self.startup_times[-1], 2),
+            'avg': round(sum(self.startup_times) / len(self.startup_times), 2),
+            'max': round(max(self.startup_times), 2),
+            'total': round(sum(self.startup_times), 2),
+        }
+    
+    @instrumentation.timed('navigation')
     def human_navigation(self, url: str, wait_time: tuple = (3, 7)) -> Optional[BeautifulSoup]:
-        """Navegación que simula comportamiento humano"""
+        """Navegación que simula comportamiento humano (contabilizando descarga y simulación por separado)"""
+        policy = behavior_policies.get(url)
+        policy.record_page(self)
+        
+        started = time.time()
+        simulation_before = policy.session_simulation(self)
+        try:
+            soup = self._navigate_humanlike(url, wait_time)
+            if soup is not None:
+                metrics.inc('pages_fetched_total', portal=portal_key(url), method='selenium')
+            return soup
+        finally:
+            simulated = max(policy.session_simulation(self) - simulation_before, 0.0)
+            policy.record_fetch(time.time() - started - simulated)
+    
+    def _navigate_humanlike(self, url: str, wait_time: tuple) -> Optional[BeautifulSoup]:
+        """Cuerpo de human_navigation"""
         
         if not self.driver:
             if not self.setup_driver():
@@ -221,9 +399,17 @@ class SeleniumStealth:
             
             # Paso 1: Ir a página principal primero (especial para Fotocasa)
             base_url = '/'.join(url.split('/')[:3])
+            domain = session_store.domain_key(url)
+            
+            # Sesión ya calentada (en este driver o restaurada de disco): omitir el calentamiento
+            if domain not in self._warm_domains and self.restore_session_state(url):
+                self._warm_domains.add(domain)
+            
+            if domain in self._warm_domains:
+                self.logger.info(f"♨️ Sesión caliente para {domain} - omitiendo calentamiento")
             
             # Para Fotocasa, usar navegación más elaborada
-            if 'fotocasa.es' in url:
+            elif 'fotocasa.es' in url:
                 self.logger.info(f"🏠 FOTOCASA: Navegación anti-bloqueo iniciada")
                 
                 # Paso 1.1: Página principal con delay más largo
@@ -261,22 +447,22 @@ class SeleniumStealth:
                 except Exception:
                     pass  # No hay cookies o error
                 
-                # Paso 1.3: Comportamiento humano intenso
-                self._simulate_fotocasa_human_behavior()
+                # Paso 1.3: Comportamiento humano intenso (según presupuesto de la sesión)
+                self._simulate(url, fotocasa=True)
                 
                 # Paso 1.4: Visitar una página de búsqueda intermedia
                 search_url = f"{base_url}/es/comprar/viviendas/"
                 self.logger.info(f"Paso 1.5: Visitando búsqueda intermedia")
                 self.driver.get(search_url)
                 self._random_wait(4, 7)
-                self._simulate_fotocasa_human_behavior()
+                self._simulate(url, fotocasa=True)
                 
             else:
                 # Navegación estándar para otros sitios
                 self.logger.info(f"Paso 1: Visitando página principal: {base_url}")
                 self.driver.get(base_url)
                 self._random_wait(2, 4)
-                self._simulate_human_behavior()
+                self._simulate(url)
             
             # Paso 2: Navegar a la URL objetivo
             self.logger.info(f"Paso 2: Navegando a URL objetivo")
@@ -290,6 +476,11 @@ class SeleniumStealth:
             if 'captcha-delivery.com' in page_source or 'DataDome' in page_source:
                 self.logger.warning("BLOQUEO: Detectado CAPTCHA de DataDome - intentando evasion adicional")
                 
+                # La sesión guardada ya no sirve: volver a calentar en la próxima navegación
+                self._warm_domains.discard(domain)
+                session_store.clear(url)
+                politeness.get(url).record_block('datadome')
+                
                 try:
                     # Técnica adicional: simular comportamiento humano más intenso
                     self._simulate_human_behavior()
@@ -298,8 +489,7 @@ class SeleniumStealth:
                     # Verificar si la conexión sigue activa antes del refresh
                     if not self.driver or not self.driver.session_id:
                         self.logger.error("DESCONEXION: Conexion perdida con DataDome - reintentando con nueva sesion")
-                        self.close()
-                        if not self.setup_driver(headless=False):
+                        if not self.restart_driver():
                             return None
                         # Reintentar navegación completa
                         self.driver.get(base_url)
@@ -315,9 +505,8 @@ class SeleniumStealth:
                     
                 except Exception as e:
                     self.logger.error(f"DESCONEXION: DataDome cerro conexion: {e}")
-                    # Reiniciar completamente
-                    self.close()
-                    if not self.setup_driver(headless=False):
+                    # Reiniciar completamente (conservando cookies)
+                    if not self.restart_driver():
                         return None
                     # Intentar navegación más lenta
                     self.logger.info("LENTO: Navegacion ultra-lenta para evitar DataDome")
@@ -346,7 +535,7 @@ class SeleniumStealth:
                         return None
             
             # Simular más comportamiento humano después de cargar
-            self._simulate_human_behavior()
+            self._simulate(url)
             
             # Obtener contenido final
             soup = BeautifulSoup(page_source, 'html.parser')
@@ -354,6 +543,8 @@ class SeleniumStealth:
             # Verificar si la página se cargó correctamente
             if self._validate_page_content(soup, url):
                 self.logger.info("OK: Pagina cargada y validada correctamente")
+                self._warm_domains.add(domain)
+                self.save_session_state(url)
                 return soup
             else:
                 self.logger.warning("AVISO: Pagina cargada pero contenido sospechoso")
@@ -363,6 +554,31 @@ class SeleniumStealth:
             self.logger.error(f"ERROR: Error en navegacion humana: {str(e)}")
             return None
     
+    def _simulate(self, url: str, fotocasa: bool = False):
+        """Aplicar la simulación humana que permita la política del portal"""
+        policy = behavior_policies.get(url)
+        level = policy.next_level(self)
+        if level == 'none':
+            return
+        
+        with policy.track('simulation', self):
+            if level == 'light':
+                self._simulate_light_behavior()
+            elif fotocasa:
+                self._simulate_fotocasa_human_behavior()
+            else:
+                self._simulate_human_behavior()
+    
+    @instrumentation.timed('human_simulation')
+    def _simulate_light_behavior(self):
+        """Simulación mínima: un scroll y una pausa breve"""
+        try:
+            self.driver.execute_script(f"window.scrollTo(0, {random.randint(200, 900)});")
+            self._random_wait(0.3, 1.0)
+        except Exception as e:
+            self.logger.debug(f"Error simulando comportamiento ligero: {e}")
+    
+    @instrumentation.timed('human_simulation')
     def _simulate_human_behavior(self):
         """Simular comportamiento humano en la página"""
         try:
@@ -391,6 +607,7 @@ class SeleniumStealth:
         except Exception as e:
             self.logger.debug(f"Error simulando comportamiento: {e}")
     
+    @instrumentation.timed('human_simulation')
     def _simulate_fotocasa_human_behavior(self):
         """Simular comportamiento humano específico para Fotocasa"""
         try:
@@ -461,6 +678,55 @@ class SeleniumStealth:
         # Validación general - página debe tener contenido sustancial
         return len(soup.get_text()) > 5000
     
+    @staticmethod
+    def _normalize_url(url: str) -> str:
+        """URL sin query, fragmento ni barra final (para comparar la página cargada)"""
+        return (url or '').split('#')[0].split('?')[0].rstrip('/').lower()
+    
+    def is_on_page(self, url: str) -> bool:
+        """Comprobar si el driver tiene ya cargada la URL indicada"""
+        if not self.driver:
+            return False
+        try:
+            return self._normalize_url(self.driver.current_url) == self._normalize_url(url)
+        except Exception:
+            return False
+    
+    def reveal_on_current_page(self, button_selector: str, result_selector: str,
+                               timeout: float = 8) -> Optional[str]:
+        """
+        Hacer clic en un botón de la página ya cargada y leer el resultado, sin navegar
+        ni repetir la simulación humana (ya se hizo al cargar la página)
+        
+        Returns:
+            Texto del elemento resultado o None si no aparece
+        """
+        if not self.driver:
+            return None
+        
+        try:
+            from selenium.webdriver.common.by import By
+            from selenium.webdriver.support.ui import WebDriverWait
+            from selenium.webdriver.support import expected_conditions as EC
+            
+            button = WebDriverWait(self.driver, timeout).until(
+                EC.element_to_be_clickable((By.CSS_SELECTOR, button_selector))
+            )
+            self.driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", button)
+            time.sleep(random.uniform(0.3, 0.8))
+            button.click()
+            
+            result_element = WebDriverWait(self.driver, timeout).until(
+                EC.visibility_of_element_located((By.CSS_SELECTOR, result_selector))
+            )
+            content = result_element.text.strip()
+            self.logger.info(f"📞 Contenido extraído sin renavegar: {content}")
+            return content
+            
+        except Exception as e:
+            self.logger.debug(f"No se pudo revelar en la página actual ({button_selector}): {e}")
+            return None
+    
     def click_button_and_get_content(self, url: str, button_selector: str, result_selector: str, wait_time: tuple = (3, 7)) -> Optional[str]:
         """Hacer clic en un botón y extraer el contenido resultante"""
         try:
@@ -469,11 +735,14 @@ class SeleniumStealth:
             from selenium.webdriver.support import expected_conditions as EC
             from selenium.common.exceptions import TimeoutException, ElementNotInteractableException
             
+            # Página ya cargada en el driver: clic directo sin segunda navegación
+            if self.is_on_page(url):
+                return self.reveal_on_current_page(button_selector, result_selector)
+            
             # Navegar a la página si es necesario
-            if not self.driver or self.driver.current_url != url:
-                soup = self.human_navigation(url, wait_time)
-                if not soup or not self.driver:
-                    return None
+            soup = self.human_navigation(url, wait_time)
+            if not soup or not self.driver:
+                return None
             
             # Verificar que el driver está disponible
             if not self.driver:
@@ -488,7 +757,7 @@ class SeleniumStealth:
                 )
                 
                 # Simular comportamiento humano antes del clic
-                self._simulate_human_behavior()
+                self._simulate(url)
                 
                 # Hacer scroll al botón si es necesario
                 self.driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", button)
@@ -527,14 +796,329 @@ class SeleniumStealth:
             self.logger.error(f"❌ Error en click_button_and_get_content: {e}")
             return None
     
+    def fetch_many(self, urls: List[str], max_tabs: int = 3, per_tab_timeout: float = 30.0,
+                   domain_delay: tuple = (1.0, 3.0)) -> Dict[str, Optional[BeautifulSoup]]:
+        """
+        Descargar varias páginas en paralelo usando pestañas del mismo Chrome
+        
+        Las navegaciones se lanzan sin bloquear (location.href) y se recogen por
+        turnos a medida que cada pestaña termina de cargar, de modo que las esperas
+        de red se solapan dentro de un único proceso de navegador.
+        
+        Args:
+            urls: URLs a descargar
+            max_tabs: Pestañas simultáneas como máximo
+            per_tab_timeout: Segundos máximos de carga por pestaña
+            domain_delay: Intervalo aleatorio (min, max) entre navegaciones al mismo dominio
+            
+        Returns:
+            Dict url -> BeautifulSoup (None si la pestaña agotó el timeout o falló)
+        """
+        results = {}
+        if not urls:
+            return results
+        
+        if not self.driver and not self.setup_driver(**self._setup_kwargs):
+            return {url: None for url in urls}
+        
+        main_handle = self.driver.current_window_handle
+        pending = list(urls)
+        active = {}  # handle -> (url, inicio)
+        free_handles = []
+        next_allowed = {}  # dominio -> instante a partir del cual se puede volver a navegar
+        
+        try:
+            while pending or active:
+                # Lanzar navegaciones mientras haya pestañas libres y el dominio lo permita
+                while pending and len(active) < max_tabs:
+                    url = pending[0]
+                    domain = session_store.domain_key(url)
+                    if time.time() < next_allowed.get(domain, 0):
+                        break
+                    pending.pop(0)
+                    
+                    if free_handles:
+                        handle = free_handles.pop()
+                        self.driver.switch_to.window(handle)
+                    else:
+                        self.driver.switch_to.new_window('tab')
+                        handle = self.driver.current_window_handle
+                    
+                    # La marca desaparece cuando el documento nuevo sustituye al anterior
+                    self.driver.execute_script(
+                        "window.__tabFetchPending = true; window.location.href = arguments[0];", url
+                    )
+                    active[handle] = (url, time.time())
+                    next_allowed[domain] = time.time() + random.uniform(*domain_delay)
+                
+                # Recoger por turnos las pestañas que ya han terminado de cargar
+                for handle, (url, started) in list(active.items()):
+                    try:
+                        self.driver.switch_to.window(handle)
+                        ready = self.driver.execute_script(
+                            "return !window.__tabFetchPending && document.readyState === 'complete';"
+                        )
+                    except Exception as e:
+                        self.logger.debug(f"Pestaña no disponible para {url}: {e}")
+                        ready = None
+                    
+                    if ready:
+                        results[url] = BeautifulSoup(self.driver.page_source, 'html.parser')
+                    elif ready is None or time.time() - started > per_tab_timeout:
+                        self.logger.warning(f"⏰ Timeout de pestaña ({per_tab_timeout}s): {url}")
+                        results[url] = None
+                        try:
+                            self.driver.execute_script("window.stop();")
+                        except Exception:
+                            pass
+                    else:
+                        continue
+                    
+                    del active[handle]
+                    free_handles.append(handle)
+                
+                if active or pending:
+                    time.sleep(0.3)
+        
+        except Exception as e:
+            self.logger.error(f"ERROR: Error en descarga multipestaña: {e}")
+            for url in urls:
+                results.setdefault(url, None)
+        
+        finally:
+            # Cerrar las pestañas auxiliares y volver a la principal
+            for handle in free_handles + list(active):
+                if handle == main_handle:
+                    continue
+                try:
+                    self.driver.switch_to.window(handle)
+                    self.driver.close()
+                except Exception:
+                    pass
+            try:
+                self.driver.switch_to.window(main_handle)
+            except Exception:
+                pass
+        
+        loaded = sum(1 for soup in results.values() if soup is not None)
+        self.logger.info(f"🗂️ Descarga multipestaña: {loaded}/{len(urls)} páginas ({max_tabs} pestañas)")
+        return results
+    
+    def get_captured_json_responses(self, url_pattern: str) -> List[Dict]:
+        """
+        Obtener las respuestas JSON capturadas en los logs de rendimiento desde la última lectura
+        
+        Args:
+            url_pattern: Fragmento que debe contener la URL de la respuesta (p.ej. endpoint de la API)
+            
+        Returns:
+            Lista de dicts {'url': ..., 'data': <JSON decodificado>}
+        """
+        payloads = []
+        
+        if not self.driver or not self.network_capture:
+            return payloads
+        
+        try:
+            # get_log vacía el buffer: cada llamada devuelve solo las entradas nuevas
+            entries = self.driver.get_log('performance')
+        except Exception as e:
+            self.logger.debug(f"Logs de rendimiento no disponibles: {e}")
+            return payloads
+        
+        for entry in entries:
+            try:
+                message = json.loads(entry['message'])['message']
+                if message.get('method') != 'Network.responseReceived':
+                    continue
+                
+                params = message['params']
+                response = params['response']
+                if url_pattern not in response.get('url', '') or 'json' not in response.get('mimeType', ''):
+                    continue
+                
+                body = self.driver.execute_cdp_cmd('Network.getResponseBody', {'requestId': params['requestId']})
+                text = body.get('body', '')
+                if body.get('base64Encoded'):
+                    text = base64.b64decode(text).decode('utf-8', errors='replace')
+                
+                payloads.append({'url': response['url'], 'data': json.loads(text)})
+                
+            except Exception as e:
+                # Cuerpo no disponible (respuesta aún en vuelo o descartada) o JSON inválido
+                self.logger.debug(f"Respuesta de red descartada: {e}")
+                continue
+        
+        if payloads:
+            self.logger.info(f"📡 Capturadas {len(payloads)} respuestas JSON de '{url_pattern}'")
+        
+        return payloads
+    
+    def export_cookies(self) -> List[Dict]:
+        """Exportar todas las cookies del navegador (todos los dominios) vía CDP"""
+        if not self.driver:
+            return []
+        
+        try:
+            return self.driver.execute_cdp_cmd('Network.getAllCookies', {}).get('cookies', [])
+        except Exception as e:
+            self.logger.debug(f"No se pudieron exportar cookies por CDP: {e}")
+            try:
+                return self.driver.get_cookies()
+            except Exception:
+                return []
+    
+    def import_cookies(self, cookies: List[Dict]) -> int:
+        """Importar cookies en el navegador sin necesidad de navegar a cada dominio"""
+        if not self.driver or not cookies:
+            return 0
+        
+        allowed = ('name', 'value', 'domain', 'path', 'secure', 'httpOnly', 'sameSite', 'expires')
+        cdp_cookies = []
+        for cookie in cookies:
+            cdp_cookie = {key: cookie[key] for key in allowed if key in cookie}
+            # Formato Selenium (get_cookies) usa 'expiry' en lugar de 'expires'
+            if 'expiry' in cookie and 'expires' not in cdp_cookie:
+                cdp_cookie['expires'] = cookie['expiry']
+            cdp_cookies.append(cdp_cookie)
+        
+        try:
+            self.driver.execute_cdp_cmd('Network.setCookies', {'cookies': cdp_cookies})
+            return len(cdp_cookies)
+        except Exception as e:
+            self.logger.warning(f"No se pudieron importar cookies: {e}")
+            return 0
+    
+    def save_session_state(self, url: str, force: bool = False) -> bool:
+        """
+        Guardar cookies, localStorage y User-Agent del portal para la próxima ejecución
+        
+        Args:
+            url: URL del portal (el estado se guarda por dominio)
+            force: Ignorar el intervalo mínimo entre guardados
+        """
+        if not self.persist_sessions or not self.driver:
+            return False
+        
+        domain = session_store.domain_key(url)
+        now = time.time()
+        if not force and now - self._session_saved_at.get(domain, 0) < self.session_save_interval:
+            return False
+        
+        cookies = session_store.filter_cookies(self.export_cookies(), url)
+        if not cookies:
+            return False
+        
+        local_storage = {}
+        user_agent = self.user_agent
+        try:
+            # localStorage solo es accesible desde el propio origen
+            if session_store.domain_key(self.driver.current_url) == domain:
+                local_storage = self.driver.execute_script(
+                    "return Object.assign({}, window.localStorage);"
+                ) or {}
+            user_agent = self.driver.execute_script("return navigator.userAgent;") or user_agent
+        except Exception as e:
+            self.logger.debug(f"No se pudo leer localStorage/User-Agent: {e}")
+        
+        session_store.save(url, cookies, local_storage, user_agent)
+        self._session_saved_at[domain] = now
+        return True
+    
+    def restore_session_state(self, url: str) -> bool:
+        """
+        Restaurar la sesión guardada del portal en el driver actual
+        
+        Inyecta cookies por CDP, fija el User-Agent con el que se obtuvieron (las cookies
+        de clearance suelen ir ligadas a él) y repone localStorage antes de que carguen
+        los scripts de la página.
+        
+        Returns:
+            True si se restauró una sesión válida
+        """
+        if not self.persist_sessions or not self.driver:
+            return False
+        
+        state = session_store.load(url)
+        if not state or not state.get('cookies'):
+            return False
+        
+        restored = self.import_cookies(state['cookies'])
+        if not restored:
+            return False
+        
+        try:
+            saved_ua = state.get('user_agent')
+            if saved_ua and saved_ua != self.user_agent:
+                self.driver.execute_cdp_cmd('Network.setUserAgentOverride', {'userAgent': saved_ua})
+                self.user_agent = saved_ua
+            
+            local_storage = state.get('local_storage') or {}
+            if local_storage:
+                origin = '/'.join(url.split('/')[:3])
+                script = (
+                    "(function(){if(location.origin!==%s)return;var items=%s;"
+                    "for(var k in items){if(localStorage.getItem(k)===null)"
+                    "{localStorage.setItem(k,items[k]);}}})();"
+                ) % (json.dumps(origin), json.dumps(local_storage))
+                self.driver.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {'source': script})
+        except Exception as e:
+            self.logger.debug(f"Restauración parcial de la sesión: {e}")
+        
+        self.logger.info(f"🍪 Sesión restaurada para {state['domain']}: {restored} cookies, "
+                         f"{len(state.get('local_storage') or {})} claves localStorage")
+        return True
+    
+    def is_alive(self) -> bool:
+        """Comprobar si el driver sigue respondiendo"""
+        if not self.driver or not self.driver.session_id:
+            return False
+        
+        try:
+            _ = self.driver.current_window_handle
+            return True
+        except Exception:
+            return False
+    
+    def restart_driver(self, preserve_cookies: bool = True, cookies: Optional[List[Dict]] = None) -> bool:
+        """
+        Reiniciar el driver con la misma configuración, conservando las cookies
+        
+        Args:
+            preserve_cookies: Exportar las cookies del driver actual antes de cerrarlo
+            cookies: Cookies a restaurar si el driver ya no responde (p.ej. snapshot previo a un crash)
+        """
+        if preserve_cookies and self.is_alive():
+            cookies = self.export_cookies() or cookies
+        
+        self.close()
+        if not self.setup_driver(**self._setup_kwargs):
+            return False
+        
+        self.driver_restarts += 1
+        restored = self.import_cookies(cookies or [])
+        self.logger.info(f"🔄 Driver reiniciado (#{self.driver_restarts}) - {restored} cookies restauradas")
+        return True
+    
     def close(self):
         """Cerrar el driver"""
+        # Su presupuesto de simulación no debe pasar a otro navegador que reciba el mismo id()
+        behavior_policies.end_sessions(self)
         if self.driver:
+            # Guardar la sesión de los portales visitados antes de cerrar
+            if self.persist_sessions and self._warm_domains and self.is_alive():
+                for domain in list(self._warm_domains):
+                    self.save_session_state(f"https://{domain}", force=True)
+            
             try:
                 self.driver.quit()
                 self.logger.info("🔒 Selenium WebDriver cerrado")
             except Exception as e:
                 self.logger.warning(f"Warning cerrando driver: {e}")
+            finally:
+                self.driver = None
+                self.network_capture = False
+                self._release_profile_slot()
     
     def __del__(self):
         """Destructor - asegurar que el driver se cierre"""
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Almacén persistente de sesiones de navegador por portal
+Guarda cookies, localStorage y User-Agent para reutilizarlos entre ejecuciones
+y para traspasarlos desde Selenium a la sesión HTTP de requests.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+
+def portal_key(value: str) -> str:
+    """Clave corta de portal a partir de su nombre ('Idealista') o de una URL ('idealista')"""
+    value = (value or '').lower()
+    if '/' in value or '.' in value:
+        netloc = value.split('//')[-1].split('/')[0].replace('www.', '', 1)
+        return netloc.split('.')[0]
+    return value
+
+
+class SessionStore:
+    """Persistencia en disco del estado de sesión (cookies/localStorage) por dominio"""
+
+    def __init__(self, base_dir: str = os.path.join('data', 'sessions'), max_age_hours: float = 24.0):
+        """
+        Args:
+            base_dir: Directorio donde se guardan los ficheros de sesión
+            max_age_hours: Antigüedad máxima de una sesión guardada para considerarla reutilizable
+        """
+        self.base_dir = base_dir
+        self.max_age = max_age_hours * 3600
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def domain_key(url: str) -> str:
+        """Clave de portal a partir de una URL (dominio sin 'www.')"""
+        netloc = urlparse(url).netloc or url
+        return netloc.split(':')[0].lower().replace('www.', '', 1)
+
+    def _path(self, url: str) -> str:
+        return os.path.join(self.base_dir, f"{self.domain_key(url)}.json")
+
+    def save(self, url: str, cookies: List[Dict], local_storage: Optional[Dict] = None,
+             user_agent: Optional[str] = None):
+        """Guardar el estado de sesión del portal de forma atómica"""
+        state = {
+            'domain': self.domain_key(url),
+            'saved_at': time.time(),
+            'user_agent': user_agent,
+            'cookies': cookies,
+            'local_storage': local_storage or {},
+        }
+
+        path = self._path(url)
+        try:
+            with self._lock:
+                os.makedirs(self.base_dir, exist_ok=True)
+                tmp_path = f"{path}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(state, f, ensure_ascii=False)
+                os.replace(tmp_path, path)
+            self.logger.debug(f"Sesión guardada para {state['domain']}: {len(cookies)} cookies")
+        except OSError as e:
+            self.logger.warning(f"No se pudo guardar la sesión de {state['domain']}: {e}")
+
+    def load(self, url: str) -> Optional[Dict]:
+        """Cargar el estado de sesión del portal si existe y no ha caducado"""
+        path = self._path(url)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if time.time() - state.get('saved_at', 0) > self.max_age:
+            self.logger.debug(f"Sesión caducada para {self.domain_key(url)}")
+            return None
+
+        # Descartar cookies ya expiradas (formato Selenium 'expiry' o CDP 'expires', -1 = de sesión)
+        now = time.time()
+        state['cookies'] = [
+            cookie for cookie in state.get('cookies', [])
+            if (cookie.get('expiry') or cookie.get('expires') or -1) <= 0
+            or (cookie.get('expiry') or cookie.get('expires')) > now
+        ]
+        return state
+
+    @staticmethod
+    def filter_cookies(cookies: List[Dict], url: str) -> List[Dict]:
+        """Quedarse solo con las cookies que pertenecen al dominio del portal"""
+        domain = SessionStore.domain_key(url)
+        return [
+            cookie for cookie in cookies
+            if cookie.get('domain', '').lstrip('.').endswith(domain)
+        ]
+
+    def clear(self, url: str):
+        """Eliminar la sesión guardada (p.ej. tras detectar un bloqueo)"""
+        try:
+            os.remove(self._path(url))
+        except OSError:
+            pass
+
+
+# Instancia global para reutilizar
+session_store = SessionStore()